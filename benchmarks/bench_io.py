@@ -0,0 +1,217 @@
+"""Throughput and peak memory of the parsers, writers and store paths
+on synthetic files (see sfbox_utils.synthetic).
+
+Standalone, results are saved to benchmarks/results/bench_io_<time>.json:
+    python benchmarks/bench_io.py --calculations 200 --layers 200 --gradients 1
+
+With pytest-benchmark:
+    pytest benchmarks/bench_io.py --benchmark-json results.json
+"""
+import argparse
+import datetime
+import json
+import os
+import pathlib
+import platform
+import resource
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+import tracemalloc
+from typing import Callable, Dict, Optional, Tuple
+
+import logging
+
+ROOT = pathlib.Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(ROOT))
+
+from sfbox_utils import read_input, read_output, write_input, utils, synthetic
+from sfbox_utils.input_class import InputTemplate
+
+DEFAULT_CONFIG = dict(calculations = 100, layers = 100, gradients = 1, molecules = 2, vectors = 4)
+
+def prepare(workdir : pathlib.Path, config : Dict) -> Dict:
+    """Write the synthetic files every case reads"""
+    files = dict(
+        output = workdir / "synthetic.out",
+        input = workdir / "synthetic.in",
+        guess = workdir / "synthetic.ig",
+        )
+    synthetic.write_synthetic_output(
+        files["output"], config["calculations"], config["layers"],
+        config["gradients"], config["molecules"], config["vectors"],
+        )
+    synthetic.write_synthetic_input(
+        files["input"], config["calculations"], config["layers"],
+        config["gradients"], config["molecules"],
+        )
+    utils.write_initial_guess(
+        files["guess"],
+        synthetic.synthetic_initial_guess(config["layers"], config["gradients"], config["molecules"]),
+        )
+    return files
+
+#every case returns (bytes processed, calculations processed)
+
+def case_read_output(workdir, files, config) -> Tuple[int, int]:
+    n = sum(1 for _ in read_output.parse_file(files["output"]))
+    return files["output"].stat().st_size, n
+
+def case_read_output_columns(workdir, files, config) -> Tuple[int, int]:
+    columns, profiles = read_output.parse_to_columns(files["output"])
+    return files["output"].stat().st_size, len(next(iter(columns.values())))
+
+def case_read_input(workdir, files, config) -> Tuple[int, int]:
+    n = len(read_input.parse_file(files["input"]))
+    return files["input"].stat().st_size, n
+
+def case_write_input(workdir, files, config) -> Tuple[int, int]:
+    target = workdir / "written.in"
+    data = [
+        synthetic.synthetic_fields(i, config["layers"], config["gradients"], config["molecules"])
+        for i in range(config["calculations"])
+        ]
+    write_input.write_input_file(target, data)
+    return target.stat().st_size, len(data)
+
+def case_write_template(workdir, files, config) -> Tuple[int, int]:
+    target = workdir / "template.in"
+    base = synthetic.synthetic_fields(0, config["layers"], config["gradients"], config["molecules"])
+    variables = [k for k in base if k.endswith((":chi_S", ":theta"))]
+    template = InputTemplate(base, variables)
+    n = template.write(target, ([0.01*i]*len(variables) for i in range(config["calculations"])))
+    return target.stat().st_size, n
+
+def case_read_guess(workdir, files, config) -> Tuple[int, int]:
+    utils.read_initial_guess_file(files["guess"])
+    return files["guess"].stat().st_size, 1
+
+def case_write_guess(workdir, files, config) -> Tuple[int, int]:
+    target = workdir / "written.ig"
+    guess = synthetic.synthetic_initial_guess(config["layers"], config["gradients"], config["molecules"])
+    utils.write_initial_guess(target, guess)
+    return target.stat().st_size, 1
+
+def case_store(workdir, files, config) -> Tuple[int, int]:
+    from sfbox_utils import store
+    h5_dir = workdir / "h5_files"
+    shutil.rmtree(h5_dir, ignore_errors = True)
+    h5_dir.mkdir()
+    store.store_file_sequential(files["output"], dir = h5_dir, on_file_exist = "rewrite")
+    return files["output"].stat().st_size, config["calculations"]
+
+CASES : Dict[str, Callable] = {
+    name[len("case_"):] : func for name, func in list(globals().items()) if name.startswith("case_")
+    }
+
+def measure(case : Callable, workdir, files, config, repeat : int = 3) -> Dict:
+    """Best time of repeat runs and the peak traced memory of one more run"""
+    times = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        nbytes, n = case(workdir, files, config)
+        times.append(time.perf_counter() - start)
+    tracemalloc.start()
+    case(workdir, files, config)
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    best = min(times)
+    return dict(
+        seconds = best,
+        mb_per_s = nbytes/2**20/best,
+        calculations_per_s = n/best,
+        bytes = nbytes,
+        calculations = n,
+        peak_traced_mb = peak/2**20,
+        )
+
+def _git_revision() -> str:
+    try:
+        return subprocess.check_output(
+            ["git", "rev-parse", "--short", "HEAD"], cwd = ROOT, stderr = subprocess.DEVNULL
+            ).decode().strip()
+    except (OSError, subprocess.CalledProcessError):
+        return "unknown"
+
+def metadata(benchmark : str) -> Dict:
+    """Time, revision and platform of a benchmark run"""
+    return dict(
+        benchmark = benchmark,
+        time = datetime.datetime.now().isoformat(timespec = "seconds"),
+        revision = _git_revision(),
+        python = platform.python_version(),
+        machine = platform.machine(),
+        cpu_count = os.cpu_count(),
+        max_rss_mb = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss/1024,
+        )
+
+def save_report(report : Dict, output : Optional[pathlib.Path] = None) -> pathlib.Path:
+    """Save a report as json, by default to benchmarks/results/<benchmark>_<time>.json"""
+    if output is None:
+        stamp = datetime.datetime.now().strftime("%Y%m%d_%H%M%S")
+        output = pathlib.Path(__file__).parent / "results" / f"{report['benchmark']}_{stamp}.json"
+    output.parent.mkdir(parents = True, exist_ok = True)
+    output.write_text(json.dumps(report, indent = 2))
+    return output
+
+def run(config : Dict, cases = None, repeat : int = 3) -> Dict:
+    workdir = pathlib.Path(tempfile.mkdtemp(prefix = "sfbox_bench_"))
+    try:
+        files = prepare(workdir, config)
+        results = {}
+        for name, case in CASES.items():
+            if cases and name not in cases:
+                continue
+            results[name] = measure(case, workdir, files, config, repeat)
+            r = results[name]
+            print(
+                f"{name:<22}{r['seconds']:>10.4f} s{r['mb_per_s']:>10.1f} MB/s"
+                f"{r['calculations_per_s']:>12.1f} calc/s{r['peak_traced_mb']:>10.1f} MB peak"
+                )
+    finally:
+        shutil.rmtree(workdir, ignore_errors = True)
+    return dict(metadata("bench_io"), config = config, results = results)
+
+def main(argv = None):
+    parser = argparse.ArgumentParser(description = __doc__, formatter_class = argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--calculations", type = int, default = DEFAULT_CONFIG["calculations"])
+    parser.add_argument("--layers", type = int, default = DEFAULT_CONFIG["layers"])
+    parser.add_argument("--gradients", type = int, default = DEFAULT_CONFIG["gradients"], choices = [1, 2])
+    parser.add_argument("--molecules", type = int, default = DEFAULT_CONFIG["molecules"])
+    parser.add_argument("--vectors", type = int, default = DEFAULT_CONFIG["vectors"])
+    parser.add_argument("--repeat", type = int, default = 3)
+    parser.add_argument("--case", action = "append", choices = list(CASES), help = "run only these cases")
+    parser.add_argument("--output", type = pathlib.Path, help = "json file, defaults to benchmarks/results/")
+    args = parser.parse_args(argv)
+    logging.disable(logging.WARNING)
+    config = dict(
+        calculations = args.calculations, layers = args.layers, gradients = args.gradients,
+        molecules = args.molecules, vectors = args.vectors,
+        )
+    report = run(config, args.case, args.repeat)
+    output = save_report(report, args.output)
+    print(f"results are saved to {output}")
+
+#pytest-benchmark entry points, collected when the file is passed to pytest
+try:
+    import pytest
+    import pytest_benchmark
+
+    @pytest.fixture(scope = "module")
+    def bench_files(tmp_path_factory):
+        workdir = tmp_path_factory.mktemp("bench_io")
+        return workdir, prepare(workdir, DEFAULT_CONFIG)
+
+    @pytest.mark.parametrize("name", list(CASES))
+    def test_io(benchmark, bench_files, name):
+        workdir, files = bench_files
+        logging.disable(logging.WARNING)
+        nbytes, n = benchmark(CASES[name], workdir, files, DEFAULT_CONFIG)
+        benchmark.extra_info.update(bytes = nbytes, calculations = n, config = DEFAULT_CONFIG)
+except ModuleNotFoundError:
+    pass
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,173 @@
+"""Overhead of the sfbox pools (call.sfbox_calls) with a fake sfbox
+(sfbox_utils/scripts/fake_sfbox.py) sleeping a fixed time per job.
+
+For every path and number of jobs it reports
+    makespan            wall time of sfbox_calls
+    dispatch latency    time from a slot getting free (or from the call
+                        for the first cpu_count jobs) to the start of the next job
+    idle slot time      slot seconds without a job running, slots * makespan - busy time
+    python cpu          user + system time of this process, the children excluded
+The job start and end are read from the fake sfbox log, so the interpreter
+start up of the fake counts as dispatch latency.
+
+    python benchmarks/bench_scheduler.py --jobs 10 100 1000 --cpu-count 4 --sleep 0.05
+"""
+import argparse
+import os
+import pathlib
+import shutil
+import statistics
+import sys
+import tempfile
+import time
+from typing import Dict, List, Tuple
+
+import logging
+
+ROOT = pathlib.Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(ROOT))
+
+from sfbox_utils import call, synthetic
+from sfbox_utils.write_input import write_input_file
+from bench_io import metadata, save_report
+
+FAKE_SFBOX = ROOT / "sfbox_utils" / "scripts" / "fake_sfbox.py"
+PATHS = ["sh", "subprocess"]
+
+def prepare_jobs(dir : pathlib.Path, n_jobs : int, n_layers : int):
+    """One input file with one calculation per job"""
+    for i in range(n_jobs):
+        name = f"job_{i:05d}"
+        write_input_file(dir / f"{name}.in", [synthetic.synthetic_fields(i, n_layers, name = name)])
+
+def read_job_times(dir : pathlib.Path) -> List[Tuple[float, float]]:
+    """(start, end) wall clock times written by the fake sfbox to the logs"""
+    times = []
+    for log in sorted(dir.glob("*.log")):
+        start = end = None
+        with open(log) as f:
+            for line in f:
+                if line.startswith("fake_sfbox started"):
+                    start = float(line.split()[-1])
+                elif line.startswith("fake_sfbox finished"):
+                    end = float(line.split()[-1])
+        if start is not None and end is not None:
+            times.append((start, end))
+    return times
+
+def _percentile(values : List[float], q : float) -> float:
+    values = sorted(values)
+    return values[min(int(q*len(values)), len(values) - 1)]
+
+def schedule_metrics(begin : float, end : float, times : List[Tuple[float, float]], cpu_count : int) -> Dict:
+    """Makespan, dispatch latency and idle slot time of a pool run
+
+    Args:
+        begin (float): wall clock time the pool was called
+        end (float): wall clock time the pool returned
+        times (list): (start, end) of every job
+        cpu_count (int): slots of the pool
+    """
+    starts = sorted(start for start, _ in times)
+    ends = sorted(end for _, end in times)
+    #the k-th job takes the slot freed by the (k - cpu_count)-th finished job
+    latency = [
+        start - (begin if k < cpu_count else max(ends[k - cpu_count], begin))
+        for k, start in enumerate(starts)
+        ]
+    makespan = end - begin
+    busy = sum(e - s for s, e in times)
+    slots = min(cpu_count, len(times))
+    return dict(
+        jobs = len(times),
+        makespan = makespan,
+        busy_seconds = busy,
+        idle_slot_seconds = slots*makespan - busy,
+        utilization = busy/(slots*makespan) if makespan > 0 and slots else 0.0,
+        latency_mean = statistics.fmean(latency) if latency else 0.0,
+        latency_median = statistics.median(latency) if latency else 0.0,
+        latency_p95 = _percentile(latency, 0.95) if latency else 0.0,
+        latency_max = max(latency) if latency else 0.0,
+        )
+
+def run_pool(path : str, n_jobs : int, cpu_count : int, sleep : float, n_layers : int) -> Dict:
+    dir = pathlib.Path(tempfile.mkdtemp(prefix = "sfbox_bench_"))
+    #the settings of the caller are put back, e.g. when run from pytest
+    saved_conf = dict(call.conf)
+    saved_sleep = os.environ.get("FAKE_SFBOX_SLEEP")
+    try:
+        prepare_jobs(dir, n_jobs, n_layers)
+        call.set_executable_path(str(FAKE_SFBOX))
+        call.set_cpu_count(cpu_count)
+        os.environ["FAKE_SFBOX_SLEEP"] = str(sleep)
+        cpu_before = os.times()
+        begin = time.time()
+        call.sfbox_calls(path, dir = str(dir))
+        end = time.time()
+        cpu_after = os.times()
+        result = schedule_metrics(begin, end, read_job_times(dir), cpu_count)
+        if result["jobs"] != n_jobs:
+            logging.getLogger(__name__).warning(f"{path}: {result['jobs']} of {n_jobs} jobs finished")
+        result.update(
+            path = path,
+            cpu_count = cpu_count,
+            sleep = sleep,
+            ideal_makespan = -(-n_jobs//cpu_count)*sleep,
+            python_cpu_seconds = (cpu_after.user - cpu_before.user) + (cpu_after.system - cpu_before.system),
+            children_cpu_seconds = (cpu_after.children_user - cpu_before.children_user)
+                + (cpu_after.children_system - cpu_before.children_system),
+            )
+        return result
+    finally:
+        call.conf.update(saved_conf)
+        if saved_sleep is None:
+            os.environ.pop("FAKE_SFBOX_SLEEP", None)
+        else:
+            os.environ["FAKE_SFBOX_SLEEP"] = saved_sleep
+        shutil.rmtree(dir, ignore_errors = True)
+
+def main(argv = None):
+    parser = argparse.ArgumentParser(description = __doc__, formatter_class = argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--jobs", type = int, nargs = "+", default = [10, 100])
+    parser.add_argument("--cpu-count", type = int, default = 4)
+    parser.add_argument("--sleep", type = float, default = 0.05, help = "seconds per fake sfbox job")
+    parser.add_argument("--layers", type = int, default = 20)
+    parser.add_argument("--path", action = "append", choices = PATHS, help = "pools to run, defaults to all")
+    parser.add_argument("--output", type = pathlib.Path, help = "json file, defaults to benchmarks/results/")
+    args = parser.parse_args(argv)
+    #the pools log every job
+    logging.disable(logging.INFO)
+    results = []
+    for n_jobs in args.jobs:
+        for path in args.path or PATHS:
+            r = run_pool(path, n_jobs, args.cpu_count, args.sleep, args.layers)
+            results.append(r)
+            print(
+                f"{path:<12}{n_jobs:>7} jobs  makespan {r['makespan']:8.3f} s (ideal {r['ideal_makespan']:.3f})"
+                f"  latency {1e3*r['latency_median']:7.2f} ms median {1e3*r['latency_p95']:7.2f} ms p95"
+                f"  idle {r['idle_slot_seconds']:8.3f} slot s  python cpu {r['python_cpu_seconds']:.3f} s"
+                )
+    report = dict(
+        metadata("bench_scheduler"),
+        config = dict(cpu_count = args.cpu_count, sleep = args.sleep, layers = args.layers),
+        results = results,
+        )
+    output = save_report(report, args.output)
+    print(f"results are saved to {output}")
+
+#pytest-benchmark entry points, collected when the file is passed to pytest
+try:
+    import pytest
+    import pytest_benchmark
+
+    @pytest.mark.parametrize("path", PATHS)
+    def test_scheduler(benchmark, path):
+        logging.disable(logging.INFO)
+        result = benchmark.pedantic(run_pool, args = (path, 10, 2, 0.01, 10), rounds = 1)
+        benchmark.extra_info.update(result)
+        assert result["jobs"] == 10
+except ModuleNotFoundError:
+    pass
+
+if __name__ == "__main__":
+    main()
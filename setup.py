@@ -12,6 +12,6 @@ setup(
     author_email = 'miklakt@gmail.com',
     packages=['sfbox_utils'],
     install_requires=['numpy','pandas'],
-    scripts=['sfbox_utils/scripts/call_sfbox_multifile.sh', 'sfbox_utils/scripts/split_output.sh'],
+    scripts=['sfbox_utils/scripts/call_sfbox_multifile.sh', 'sfbox_utils/scripts/split_output.sh', 'sfbox_utils/scripts/fake_sfbox.py'],
     include_package_data=True,
 )
\ No newline at end of file
@@ -1,6 +1,9 @@
 from sfbox_utils.call import sfbox_call, sfbox_calls
-from sfbox_utils.call import set_executable_path, set_cpu_count
+from sfbox_utils.call import sfbox_call_async, sfbox_calls_async
+from sfbox_utils.call import set_executable_path, set_cpu_count, set_ledger
+from sfbox_utils.call import set_pinning, set_scratch_dir, set_cache
 from sfbox_utils import read_input, read_output, write_input
 from sfbox_utils import store
 from sfbox_utils.utils import read_initial_guess_file, write_initial_guess
-from sfbox_utils.input_class import InputItemClass, InputListClass
\ No newline at end of file
+from sfbox_utils.input_class import InputItemClass, InputListClass, InputTemplate
+from sfbox_utils.input_table import InputTable
@@ -0,0 +1,128 @@
+import os
+import pathlib
+from typing import List, Optional, Set
+
+import logging
+logger = logging.getLogger(__name__)
+
+pinning_parameters = [None, "core", "numa"]
+
+def available_cpus() -> Set[int]:
+    """CPUs the current process is allowed to run on"""
+    try:
+        return set(os.sched_getaffinity(0))
+    except AttributeError:
+        #not available on this platform
+        return set(range(os.cpu_count() or 1))
+
+def available_cpu_count() -> int:
+    """Number of CPUs the current process is allowed to run on"""
+    return len(available_cpus())
+
+def _parse_cpu_list(cpulist : str) -> Set[int]:
+    # '0-3,8,10-11' -> {0,1,2,3,8,10,11}
+    cpus = set()
+    for part in cpulist.strip().split(","):
+        if not part:
+            continue
+        if "-" in part:
+            first, last = part.split("-")
+            cpus.update(range(int(first), int(last)+1))
+        else:
+            cpus.add(int(part))
+    return cpus
+
+def numa_nodes() -> List[Set[int]]:
+    """Available CPUs grouped by NUMA node, read from sysfs.
+    All available CPUs form one node if the topology is unknown.
+    """
+    cpus = available_cpus()
+    nodes = []
+    node_dir = pathlib.Path("/sys/devices/system/node")
+    for cpulist in sorted(node_dir.glob("node*/cpulist")):
+        node = _parse_cpu_list(cpulist.read_text()) & cpus
+        if node:
+            nodes.append(node)
+    if not nodes:
+        nodes = [cpus]
+    return nodes
+
+def physical_cores() -> List[Set[int]]:
+    """Available CPUs grouped by physical core (hyperthread siblings together),
+    ordered so that consecutive cores alternate between NUMA nodes.
+    """
+    cpus = available_cpus()
+    cores = []
+    seen = set()
+    for cpu in sorted(cpus):
+        if cpu in seen:
+            continue
+        siblings_file = pathlib.Path(
+            f"/sys/devices/system/cpu/cpu{cpu}/topology/thread_siblings_list"
+            )
+        if siblings_file.is_file():
+            core = _parse_cpu_list(siblings_file.read_text()) & cpus
+        else:
+            core = {cpu}
+        seen.update(core)
+        cores.append(core)
+    #spread the jobs over the nodes
+    node_of = {cpu : i for i, node in enumerate(numa_nodes()) for cpu in node}
+    cores_by_node = {}
+    for core in cores:
+        cores_by_node.setdefault(node_of.get(min(core), 0), []).append(core)
+    interleaved = []
+    while any(cores_by_node.values()):
+        for node_cores in cores_by_node.values():
+            if node_cores:
+                interleaved.append(node_cores.pop(0))
+    return interleaved
+
+class CoreAllocator:
+    """Hands out CPU sets to child processes and takes them back when
+    the children exit. With 'core' pinning every child gets a physical core,
+    with 'numa' pinning a child gets the CPUs of the least occupied NUMA node.
+    """
+    def __init__(self, pinning : str = "core"):
+        if pinning not in pinning_parameters[1:]:
+            raise ValueError(f"Invalid pinning, possible values: {pinning_parameters}")
+        self.pinning = pinning
+        if pinning == "core":
+            self.slots = physical_cores()
+        else:
+            self.slots = numa_nodes()
+        #number of children using a slot
+        self.occupied = [0]*len(self.slots)
+
+    def acquire(self) -> Optional[Set[int]]:
+        """Reserve a CPU set for a child
+
+        Returns:
+            set or None: CPUs to pin to, None if all the cores are occupied
+        """
+        if self.pinning == "core":
+            for i, n in enumerate(self.occupied):
+                if n == 0:
+                    self.occupied[i] = 1
+                    return self.slots[i]
+            logger.warning("No free core left, the child is not pinned")
+            return None
+        i = min(range(len(self.slots)), key = lambda i_: self.occupied[i_]/len(self.slots[i_]))
+        self.occupied[i] = self.occupied[i] + 1
+        return self.slots[i]
+
+    def release(self, cpus : Optional[Set[int]]):
+        """Free the CPU set of an exited child"""
+        if cpus is None:
+            return
+        i = self.slots.index(cpus)
+        self.occupied[i] = self.occupied[i] - 1
+
+def pin_to(cpus : Optional[Set[int]]):
+    """Callable to be passed as preexec_fn to subprocess.Popen
+    to set CPU affinity of the child"""
+    if cpus is None:
+        return None
+    def set_affinity():
+        os.sched_setaffinity(0, cpus)
+    return set_affinity
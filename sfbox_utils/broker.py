@@ -0,0 +1,362 @@
+"""Work queue for running sfbox input files on several nodes.
+
+The broker serves the input files of a directory to agents over TCP,
+an agent runs up to cpu_count jobs and sends the created files back.
+The protocol is one json object per line, binary files are base64 encoded.
+
+Requests of an agent and replies of the broker:
+    {"op" : "lease", "agent" : id}
+        -> {"job" : name, "files" : {name : data}} or {"job" : null, "done" : bool}
+    {"op" : "heartbeat", "agent" : id, "jobs" : [name, ...]}
+        -> {"ok" : true, "lost" : [name, ...]}
+    {"op" : "complete", "agent" : id, "job" : name, "returncode" : int,
+        "files" : {...}, "ledger" : [record, ...]}
+        -> {"ok" : bool}
+    {"op" : "fail", "agent" : id, "job" : name, "error" : message}
+        -> {"ok" : bool}
+
+A job failing on an agent is queued again until it was leased max_attempts times.
+
+A lease expires if the agent does not send a heartbeat for lease_timeout
+seconds, then the job is queued again and a late result is ignored.
+
+Example on localhost:
+    broker = Broker("inputs", port = 0)
+    broker.serve_in_thread()
+    run_agent("localhost", broker.port, "work", cpu_count = 4)
+"""
+import pathlib
+import json
+import base64
+import shutil
+import tempfile
+import socket
+import socketserver
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, List, Optional, Union
+
+import logging
+logger = logging.getLogger(__name__)
+
+from .ledger import append_record, read_ledger
+
+PathType = Union[pathlib.Path, str]
+
+def _encode_files(dir : pathlib.Path, names : List[str]) -> Dict[str, str]:
+    return {
+        name : base64.b64encode((dir / name).read_bytes()).decode("ascii")
+        for name in names
+        }
+
+def _decode_files(dir : pathlib.Path, files : Dict[str, str]):
+    dir.mkdir(parents = True, exist_ok = True)
+    for name, data in files.items():
+        target = dir / pathlib.Path(name).name
+        target.write_bytes(base64.b64decode(data))
+
+def _input_dependencies(filename : pathlib.Path) -> List[str]:
+    from .read_input import parse_file
+    names = [filename.name]
+    for block in parse_file(filename):
+        for key, value in block.items():
+            if key.startswith("newton:") and key.endswith(":initial_guess_input_file"):
+                if (filename.parent / str(value)).is_file():
+                    names.append(str(value))
+    return names
+
+class Broker:
+    """Serves the '*.in' files of a directory to the agents and collects
+    the results into results_dir.
+
+    Args:
+        dir (PathType): directory with input files
+        results_dir (PathType, optional): where the files sent back are written.
+            Defaults to dir.
+        host (str, optional): interface to listen on. Defaults to "localhost".
+        port (int, optional): port to listen on, 0 for a free one. Defaults to 0.
+        lease_timeout (float, optional): seconds without heartbeat
+            after which a job is queued again. Defaults to 60.
+        max_attempts (int, optional): how many times a job is leased
+            before it is reported as lost or as an error. Defaults to 3.
+        ledger (str, optional): run ledger in results_dir the agents' records
+            are appended to. Defaults to "sfbox_runs.jsonl".
+    """
+    def __init__(
+            self,
+            dir : PathType,
+            results_dir : Optional[PathType] = None,
+            host : str = "localhost",
+            port : int = 0,
+            lease_timeout : float = 60,
+            max_attempts : int = 3,
+            ledger : Optional[str] = "sfbox_runs.jsonl",
+            ):
+        self.dir = pathlib.Path(dir)
+        self.ledger = ledger
+        self.results_dir = self.dir if results_dir is None else pathlib.Path(results_dir)
+        self.lease_timeout = lease_timeout
+        self.max_attempts = max_attempts
+        self.lock = threading.Lock()
+        self.queue = [f.name for f in sorted(self.dir.glob("*.in"))][::-1]
+        #job -> (agent, last heartbeat)
+        self.leases = {}
+        self.attempts = {}
+        #job -> returncode, 'lost' or 'error'
+        self.results = {}
+        self.finished = threading.Event()
+        if not self.queue:
+            self.finished.set()
+
+        broker = self
+        class Handler(socketserver.StreamRequestHandler):
+            def handle(self):
+                for line in self.rfile:
+                    if not line.strip():
+                        continue
+                    reply = broker.handle(json.loads(line))
+                    self.wfile.write((json.dumps(reply)+"\n").encode())
+                    self.wfile.flush()
+
+        class Server(socketserver.ThreadingTCPServer):
+            allow_reuse_address = True
+            daemon_threads = True
+
+        self.server = Server((host, port), Handler)
+        self.host, self.port = self.server.server_address[:2]
+
+    def _expire_leases(self):
+        now = time.monotonic()
+        for job, (agent, heartbeat) in list(self.leases.items()):
+            if now - heartbeat > self.lease_timeout:
+                del self.leases[job]
+                logger.warning(f"lease of {job} by agent {agent} expired")
+                if self.attempts[job] < self.max_attempts:
+                    self.queue.append(job)
+                else:
+                    self.results[job] = "lost"
+        self._check_finished()
+
+    def _check_finished(self):
+        if not self.queue and not self.leases:
+            self.finished.set()
+
+    def handle(self, message : Dict) -> Dict:
+        op = message.get("op")
+        agent = message.get("agent")
+        with self.lock:
+            self._expire_leases()
+            if op == "lease":
+                if not self.queue:
+                    return {"job" : None, "done" : self.finished.is_set()}
+                job = self.queue.pop()
+                self.leases[job] = (agent, time.monotonic())
+                self.attempts[job] = self.attempts.get(job, 0) + 1
+                logger.info(f"{job} is leased to agent {agent}")
+                return {
+                    "job" : job,
+                    "files" : _encode_files(self.dir, _input_dependencies(self.dir / job))
+                    }
+            if op == "heartbeat":
+                lost = []
+                for job in message.get("jobs", []):
+                    if job in self.leases and self.leases[job][0] == agent:
+                        self.leases[job] = (agent, time.monotonic())
+                    else:
+                        lost.append(job)
+                return {"ok" : True, "lost" : lost}
+            if op == "complete":
+                job = message["job"]
+                if job not in self.leases or self.leases[job][0] != agent:
+                    logger.warning(f"result of {job} from agent {agent} is ignored, the lease is lost")
+                    return {"ok" : False}
+                del self.leases[job]
+                _decode_files(self.results_dir, message.get("files", {}))
+                if message.get("ledger") and self.ledger is not None:
+                    for record in message["ledger"]:
+                        append_record(self.results_dir / self.ledger, record)
+                self.results[job] = message.get("returncode")
+                logger.info(f"{job} is completed by agent {agent}")
+                self._check_finished()
+                return {"ok" : True}
+            if op == "fail":
+                job = message["job"]
+                if job not in self.leases or self.leases[job][0] != agent:
+                    return {"ok" : False}
+                del self.leases[job]
+                logger.error(f"{job} failed on agent {agent}: {message.get('error')}")
+                if self.attempts[job] < self.max_attempts:
+                    self.queue.append(job)
+                else:
+                    self.results[job] = "error"
+                self._check_finished()
+                return {"ok" : True}
+        return {"error" : f"unknown operation {op}"}
+
+    def serve_in_thread(self) -> threading.Thread:
+        """Start serving in a daemon thread"""
+        thread = threading.Thread(target = self.server.serve_forever, daemon = True)
+        thread.start()
+        logger.info(f"broker listens on {self.host}:{self.port}, {len(self.queue)} jobs queued")
+        return thread
+
+    def wait(self, timeout : Optional[float] = None) -> Dict:
+        """Wait until all the jobs are completed or lost and stop serving
+
+        Args:
+            timeout (float, optional): seconds to wait, the jobs still queued
+                or leased then are reported as lost. Defaults to None.
+
+        Returns:
+            dict: return code of every job, 'lost' or 'error' for the jobs
+                that ran out of attempts or did not finish within timeout
+        """
+        #leases expire only when somebody talks to the broker
+        while not self.finished.wait(min(self.lease_timeout, 1.0)):
+            with self.lock:
+                self._expire_leases()
+            if timeout is not None:
+                timeout = timeout - min(self.lease_timeout, 1.0)
+                if timeout <= 0:
+                    break
+        self.server.shutdown()
+        self.server.server_close()
+        with self.lock:
+            for job in self.queue + list(self.leases):
+                logger.warning(f"{job} is not finished in time")
+                self.results[job] = "lost"
+            self.queue = []
+            self.leases = {}
+            #agents still connected are told there is nothing left
+            self.finished.set()
+            return dict(self.results)
+
+class _Connection:
+    def __init__(self, host, port):
+        self.lock = threading.Lock()
+        self.sock = socket.create_connection((host, port))
+        self.file = self.sock.makefile("rwb")
+
+    def request(self, message : Dict) -> Dict:
+        with self.lock:
+            self.file.write((json.dumps(message)+"\n").encode())
+            self.file.flush()
+            reply = self.file.readline()
+            if not reply:
+                raise ConnectionError("the broker closed the connection")
+            return json.loads(reply)
+
+    def close(self):
+        self.file.close()
+        self.sock.close()
+
+def run_agent(
+        host : str,
+        port : int,
+        dir : PathType,
+        cpu_count : Optional[int] = None,
+        heartbeat_interval : float = 10,
+        poll_interval : float = 1,
+        ):
+    """Lease jobs from a broker and run them with call.sfbox_call,
+    up to cpu_count at a time, until the broker has no jobs left.
+    All the files created by a job are sent back to the broker.
+
+    Args:
+        host (str): broker host
+        port (int): broker port
+        dir (PathType): local working directory, every lease runs in a new
+            subdirectory removed after the files are sent back
+        cpu_count (int, optional): number of parallel jobs. Defaults to conf['cpu_count'].
+        heartbeat_interval (float, optional): seconds between heartbeats,
+            must be smaller than the lease timeout of the broker. Defaults to 10.
+        poll_interval (float, optional): seconds to wait when no job is available.
+            Defaults to 1.
+    """
+    from .call import sfbox_call, conf
+    if cpu_count is None:
+        cpu_count = conf['cpu_count']
+    dir = pathlib.Path(dir)
+    agent = f"{socket.gethostname()}-{uuid.uuid4().hex[:8]}"
+    connection = _Connection(host, port)
+    running = set()
+    running_lock = threading.Lock()
+    stop = threading.Event()
+
+    def heartbeat():
+        while not stop.wait(heartbeat_interval):
+            with running_lock:
+                jobs = list(running)
+            if jobs:
+                try:
+                    reply = connection.request({"op" : "heartbeat", "agent" : agent, "jobs" : jobs})
+                except (ConnectionError, OSError):
+                    return
+                for job in reply.get("lost", []):
+                    logger.warning(f"lease of {job} is lost, its result will be ignored")
+
+    def work(job, files):
+        #a fresh directory for every lease, nothing is left from an earlier attempt
+        job_dir = pathlib.Path(tempfile.mkdtemp(prefix = pathlib.Path(job).stem+"_", dir = dir))
+        try:
+            _decode_files(job_dir, files)
+            returncode = sfbox_call(job_dir / job)
+            ledger = []
+            if conf['ledger'] is not None and (job_dir / conf['ledger']).is_file():
+                ledger = [dict(r, agent = agent) for r in read_ledger(job_dir / conf['ledger'])]
+            created = [
+                f.name for f in job_dir.iterdir()
+                if f.is_file() and f.name not in files and f.name != conf['ledger']
+                ]
+            connection.request({
+                "op" : "complete", "agent" : agent, "job" : job,
+                "returncode" : returncode, "files" : _encode_files(job_dir, created),
+                "ledger" : ledger,
+                })
+        except Exception as e:
+            logger.exception(f"{job} failed")
+            connection.request({"op" : "fail", "agent" : agent, "job" : job, "error" : repr(e)})
+        finally:
+            shutil.rmtree(job_dir, ignore_errors = True)
+            with running_lock:
+                running.discard(job)
+
+    def check(futures):
+        #errors that could not be reported to the broker stop the agent
+        for future in [f for f in futures if f.done()]:
+            futures.remove(future)
+            future.result()
+
+    dir.mkdir(parents = True, exist_ok = True)
+    heartbeat_thread = threading.Thread(target = heartbeat, daemon = True)
+    heartbeat_thread.start()
+    logger.info(f"agent {agent} connected to {host}:{port}")
+    futures = []
+    try:
+        with ThreadPoolExecutor(cpu_count) as executor:
+            while True:
+                check(futures)
+                with running_lock:
+                    n_running = len(running)
+                if n_running >= cpu_count:
+                    time.sleep(poll_interval/10)
+                    continue
+                reply = connection.request({"op" : "lease", "agent" : agent})
+                job = reply.get("job")
+                if job is None:
+                    if reply.get("done"):
+                        break
+                    time.sleep(poll_interval)
+                    continue
+                with running_lock:
+                    running.add(job)
+                futures.append(executor.submit(work, job, reply["files"]))
+        check(futures)
+    except ConnectionError as e:
+        logger.warning(f"agent {agent} stops: {e}")
+    finally:
+        stop.set()
+        connection.close()
+    logger.info(f"agent {agent} has no jobs left")
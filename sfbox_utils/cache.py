@@ -0,0 +1,219 @@
+import pathlib
+import os
+import json
+import gzip
+import shutil
+import hashlib
+from typing import Dict, List, Optional, Tuple, Union
+
+import logging
+logger = logging.getLogger(__name__)
+
+from .read_input import parse_file
+
+PathType = Union[pathlib.Path, str]
+
+def _canonical_value(value):
+    if isinstance(value, list):
+        return [_canonical_value(v) for v in value]
+    if isinstance(value, bool):
+        return str(value).lower()
+    if isinstance(value, (int, float)):
+        #1, 1.0 and 1e0 are the same for sfbox
+        return repr(float(value))
+    return str(value)
+
+def canonical_input(filename : PathType) -> List[Dict]:
+    """Canonical form of an input file used as the cache key.
+    The keys are sorted, numbers are normalized, output file names are
+    replaced by their order of appearance, the name of the initial guess
+    output file is ignored and the initial guess input file is replaced
+    by the hash of its content.
+
+    Args:
+        filename (PathType): sfbox input file
+
+    Returns:
+        list: canonical calculations
+    """
+    filename = pathlib.Path(filename)
+    outputs = {}
+    canonical = []
+    for block in parse_file(filename):
+        fields = {}
+        for key, value in block.items():
+            type_, name, parameter = key.split(":", 2)
+            if type_ == "output":
+                outputs.setdefault(name, len(outputs))
+                key = f"output:#{outputs[name]}:{parameter}"
+            elif type_ == "newton" and parameter == "initial_guess_output_file":
+                value = "#"
+            elif type_ == "newton" and parameter == "initial_guess_input_file":
+                guess = filename.parent / str(value)
+                if guess.is_file():
+                    value = hashlib.sha256(guess.read_bytes()).hexdigest()
+            fields[key] = _canonical_value(value)
+        canonical.append(dict(sorted(fields.items())))
+    return canonical
+
+def input_hash(filename : PathType) -> str:
+    """sha256 of the canonical input"""
+    canonical = json.dumps(canonical_input(filename), sort_keys = True)
+    return hashlib.sha256(canonical.encode()).hexdigest()
+
+def _result_files(filename : pathlib.Path) -> List[Tuple[str, pathlib.Path]]:
+    # (role, path) of the files a run produces, roles do not depend on file names
+    outputs = {}
+    guess = None
+    for block in parse_file(filename):
+        for key, value in block.items():
+            type_, name, parameter = key.split(":", 2)
+            if type_ == "output":
+                outputs.setdefault(name, len(outputs))
+            elif type_ == "newton" and parameter == "initial_guess_output_file":
+                guess = str(value)
+    files = [(f"output_{i}", filename.parent / name) for name, i in outputs.items()]
+    if guess is not None:
+        files.append(("guess", filename.parent / guess))
+    files.append(("log", filename.with_suffix(".log")))
+    return files
+
+def _open(filename : pathlib.Path, mode : str):
+    if filename.name.endswith(".gz"):
+        return gzip.open(filename, mode)
+    return open(filename, mode)
+
+def _copy_output(source : pathlib.Path, target : pathlib.Path, input_name : str):
+    # outputs name the run that produced them, a cached output is renamed to the job fetching it
+    names = {"inputfile" : input_name, "outputfile" : target.name.removesuffix(".gz")}
+    with _open(source, "rt") as src, _open(target, "wt") as dst:
+        for line in src:
+            if line.startswith("sys :"):
+                parts = line.split(" : ")
+                if len(parts) == 4 and parts[2] in names:
+                    line = " : ".join(parts[:3] + [names[parts[2]]]) + "\n"
+            dst.write(line)
+
+class RunCache:
+    """Cache of sfbox results keyed by the hash of the canonical input
+    (see canonical_input). Every entry is a directory with the output,
+    initial guess and log files of a run, gzip compressed files
+    (see call.set_scratch_dir) are kept and fetched compressed.
+    A run without any output file is not cached.
+    When the size of the cache exceeds max_bytes the least recently used entries are removed.
+
+    Example:
+        cache = RunCache("~/.sfbox_cache", max_bytes = 10*2**30)
+        set_cache(cache)
+        sfbox_calls_subprocess(dir)
+        print(cache.stats())
+    """
+    def __init__(self, dir : PathType, max_bytes : Optional[int] = None):
+        self.dir = pathlib.Path(dir).expanduser()
+        self.dir.mkdir(parents = True, exist_ok = True)
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def _entry(self, filename : pathlib.Path) -> pathlib.Path:
+        return self.dir / input_hash(filename)
+
+    def fetch(self, filename : PathType) -> bool:
+        """Copy cached results of an input file next to it,
+        the input and output file names in the outputs are set to the ones of this job
+
+        Args:
+            filename (PathType): sfbox input file
+
+        Returns:
+            bool: True if the results were found in the cache
+        """
+        filename = pathlib.Path(filename)
+        entry = self._entry(filename)
+        if not (entry / "files.json").is_file():
+            self.misses = self.misses + 1
+            return False
+        with open(entry / "files.json") as f:
+            stored = json.load(f)
+        if not any(role.startswith("output_") for role in stored):
+            #an entry without outputs can not stand for a run
+            self.misses = self.misses + 1
+            return False
+        for role, target in _result_files(filename):
+            if role not in stored:
+                continue
+            if stored[role].endswith(".gz"):
+                target = target.with_name(target.name+".gz")
+            if role.startswith("output_"):
+                _copy_output(entry / stored[role], target, filename.name)
+            else:
+                shutil.copy(entry / stored[role], target)
+        #mark as recently used
+        os.utime(entry)
+        self.hits = self.hits + 1
+        logger.info(f"results of {filename.name} are found in cache {entry.name}")
+        return True
+
+    def store(self, filename : PathType):
+        """Put the results of a finished run into the cache
+
+        Args:
+            filename (PathType): sfbox input file
+        """
+        filename = pathlib.Path(filename)
+        sources = {}
+        for role, source in _result_files(filename):
+            if source.is_file():
+                sources[role] = (source, role + source.suffix)
+            elif source.with_name(source.name+".gz").is_file():
+                sources[role] = (source.with_name(source.name+".gz"), role + source.suffix + ".gz")
+        if not any(role.startswith("output_") for role in sources):
+            logger.warning(f"{filename.name} has no output files, the run is not cached")
+            return
+        entry = self._entry(filename)
+        tmp = entry.with_name(entry.name+f".tmp{os.getpid()}")
+        tmp.mkdir(exist_ok = True)
+        stored = {}
+        for role, (source, name) in sources.items():
+            shutil.copy(source, tmp / name)
+            stored[role] = name
+        with open(tmp / "files.json", "w") as f:
+            json.dump(stored, f)
+        shutil.rmtree(entry, ignore_errors = True)
+        os.replace(tmp, entry)
+        self.evict()
+
+    def _entries(self):
+        entries = []
+        for entry in self.dir.iterdir():
+            if entry.is_dir() and (entry / "files.json").is_file():
+                size = sum(f.stat().st_size for f in entry.iterdir())
+                entries.append((entry.stat().st_mtime, size, entry))
+        return entries
+
+    def evict(self):
+        """Remove the least recently used entries until the cache fits max_bytes"""
+        if self.max_bytes is None:
+            return
+        entries = sorted(self._entries(), key = lambda e: e[0])
+        total = sum(e[1] for e in entries)
+        while entries and total > self.max_bytes:
+            _, size, entry = entries.pop(0)
+            shutil.rmtree(entry, ignore_errors = True)
+            total = total - size
+            self.evictions = self.evictions + 1
+            logger.debug(f"cache entry {entry.name} is evicted")
+
+    def stats(self) -> Dict:
+        """Hit and miss counts of this cache object and the cache size"""
+        entries = self._entries()
+        lookups = self.hits + self.misses
+        return dict(
+            hits = self.hits,
+            misses = self.misses,
+            hit_rate = self.hits/lookups if lookups else None,
+            evictions = self.evictions,
+            entries = len(entries),
+            bytes = sum(e[1] for e in entries),
+            )
@@ -2,14 +2,41 @@ import sys
 import os
 import subprocess
 import pathlib
+import asyncio
+import inspect
+import shlex
+import time
+import tempfile
+import multiprocessing as mp
+from datetime import datetime
+from typing import Callable, List, Optional
 
 import logging
 logger = logging.getLogger(__name__)
 logging.basicConfig(level = logging.INFO, stream = sys.stdout)
 
+from .read_input import output_files
+from .ledger import wait_rusage, run_record, append_record
+from .retry import relax_newton, neighbour_guess, rewrite_for_retry
+from .scratch import ScratchDir
+from .monitor import LogMonitor
+from .affinity import available_cpu_count, CoreAllocator, pin_to, pinning_parameters
+
 conf = {
     'exe_path' : 'sfbox',
-    'cpu_count' : 8
+    'cpu_count' : available_cpu_count(),
+    #pin sfbox children to a physical 'core' or a 'numa' node, None to not pin
+    'pinning' : None,
+    #run ledger file name, created next to the input files
+    'ledger' : 'sfbox_runs.jsonl',
+    #stage every job to a directory in scratch_dir, e.g. /dev/shm, None to run in place
+    'scratch_dir' : None,
+    #gzip the files copied back from the scratch directory
+    'scratch_compress' : False,
+    #cache.RunCache to reuse the results of identical inputs, None to not cache
+    'cache' : None,
+    #seconds to sleep in the pool loop when nothing happens
+    'poll_interval' : 0.05,
         }
 
 def set_executable_path(path):
@@ -28,7 +55,70 @@ def set_cpu_count(cpu_count : int):
     """
     conf['cpu_count'] = cpu_count
 
-def sfbox_call(filename : pathlib.Path, wait = True):
+def set_pinning(pinning : str):
+    """Set CPU affinity pinning of the sfbox children started by the pool.
+
+    Args:
+        pinning (str): 'core' to pin every child to its own physical core,
+            the pool then runs at most one child per physical core,
+            'numa' to pin a child to a NUMA node, None to leave it to the OS
+    """
+    if pinning not in pinning_parameters:
+        raise ValueError(f"Invalid pinning, possible values: {pinning_parameters}")
+    conf['pinning'] = pinning
+
+def set_scratch_dir(scratch_dir, compress = False):
+    """Set a scratch directory, e.g. /dev/shm or a local SSD, globally for the module.
+    Every job gets its own directory in it, the input and initial guess files
+    are copied there, sfbox runs there and the created files are copied back
+    next to the input file. The job directory is removed even if the job fails.
+
+    Args:
+        scratch_dir (path-like object): scratch directory, None to run the jobs in place
+        compress (bool, optional): gzip the files copied back. Defaults to False.
+    """
+    conf['scratch_dir'] = scratch_dir
+    conf['scratch_compress'] = compress
+
+def set_cache(cache):
+    """Set a run cache globally for the module. The results of an input
+    that was already calculated are copied from the cache instead of running sfbox.
+
+    Args:
+        cache (cache.RunCache): run cache, None to disable caching
+    """
+    conf['cache'] = cache
+
+def set_ledger(ledger):
+    """Set the file name of the run ledger globally for the module.
+    Wall time, cpu time and max RSS of every finished sfbox run
+    are appended to the ledger in the directory of the input file.
+
+    Args:
+        ledger (str): ledger file name, None to disable the ledger
+    """
+    conf['ledger'] = ledger
+
+def _record_run(filename, start, wall_time, rusage, returncode):
+    if conf['ledger'] is None:
+        return
+    record = run_record(filename, start, wall_time, rusage, returncode)
+    append_record(filename.parent / conf['ledger'], record)
+
+def _start_sfbox(filename : pathlib.Path, cpus = None):
+    executable_path = str(conf['exe_path'])
+    logger.info(f'subprocess call {executable_path} {filename.name}')
+    log = open(filename.with_suffix('.log'), 'w')
+    #no shell in between, so that killing the process kills sfbox
+    proc = subprocess.Popen(
+        [*shlex.split(executable_path), str(filename.name)],
+        stdout=log,
+        cwd = filename.parent,
+        preexec_fn = pin_to(cpus),
+        )
+    return proc, log
+
+def sfbox_call(filename : pathlib.Path, wait = True, cpus = None):
     """Start a child process of sfbox
 
     Args:
@@ -36,78 +126,399 @@ def sfbox_call(filename : pathlib.Path, wait = True):
         wait (bool, optional): If set to False
             python interpreter will not be locked,
             but log file has to be closed by the user manually.
+            The job is not staged to conf['scratch_dir']
+            and conf['cache'] is not used in this case.
             Defaults to True.
+        cpus (set, optional): CPUs to pin the child to. Defaults to None.
 
     Returns:
-        [(Popen, log) or None]: if wait is set to true function returns nothing,
-            otherwise a subprocess.Popen object
+        [(Popen, log) or int]: if wait is set to true function returns
+            the return code of sfbox, otherwise a subprocess.Popen object
             and opened log file is returned
     """
 
     if isinstance(filename, str):
         filename = pathlib.Path(filename)
 
-    executable_path = conf['exe_path']
-    logger.info(f'subprocess call {executable_path} {filename.name}')
-    log = open(filename.with_suffix('.log'), 'w')
-    proc = subprocess.Popen(
-        [executable_path+" "+str(filename.name)],
-        stdout=log,
-        shell=True,
-        cwd = filename.parent,
+    if not wait:
+        return _start_sfbox(filename, cpus)
+
+    cache = conf['cache']
+    if cache is not None and cache.fetch(filename):
+        return 0
+
+    scratch = None
+    run_filename = filename
+    if conf['scratch_dir'] is not None:
+        scratch = ScratchDir(filename, conf['scratch_dir'], conf['scratch_compress'])
+    try:
+        if scratch is not None:
+            run_filename = scratch.stage_in()
+        start = datetime.now()
+        start_monotonic = time.monotonic()
+        proc, log = _start_sfbox(run_filename, cpus)
+        rusage = wait_rusage(proc)
+        logger.info(f'process is done, {filename} is calculated')
+        log.close()
+        if scratch is not None:
+            scratch.stage_out()
+    finally:
+        if scratch is not None:
+            scratch.cleanup()
+    _record_run(filename, start, time.monotonic() - start_monotonic, rusage, proc.returncode)
+    if cache is not None and proc.returncode == 0:
+        cache.store(filename)
+    return proc.returncode
+
+async def sfbox_call_async(
+        filename : pathlib.Path,
+        log_lines : Optional[Callable[[pathlib.Path, str], None]] = None,
+        ) -> int:
+    """Start a child process of sfbox from a running event loop
+    and await its completion. The event loop is not blocked while sfbox works.
+    If the awaiting task is cancelled, sfbox is killed.
+
+    Args:
+        filename (str): path to an input file
+        log_lines (callable, optional): called as log_lines(filename, line)
+            for every line sfbox prints, may be a coroutine function.
+            The lines are still written to the log file.
+            If None, the output goes directly to the log file
+            without passing through Python. Defaults to None.
+
+    Returns:
+        int: return code of the sfbox process
+    """
+    filename = pathlib.Path(filename)
+
+    executable_path = str(conf['exe_path'])
+    logger.info(f'async subprocess call {executable_path} {filename.name}')
+    args = [*shlex.split(executable_path), str(filename.name)]
+    with open(filename.with_suffix('.log'), 'w') as log:
+        proc = await asyncio.create_subprocess_exec(
+            *args,
+            stdout=log if log_lines is None else asyncio.subprocess.PIPE,
+            cwd = filename.parent,
+            )
+        try:
+            if log_lines is not None:
+                async for line in proc.stdout:
+                    line = line.decode(errors = 'replace')
+                    log.write(line)
+                    result = log_lines(filename, line)
+                    if inspect.isawaitable(result):
+                        await result
+            returncode = await proc.wait()
+        except asyncio.CancelledError:
+            #do not leave sfbox running when the awaiting task is cancelled
+            if proc.returncode is None:
+                logger.warning(f'{filename.name} is cancelled, sfbox is killed')
+                proc.kill()
+            await proc.wait()
+            raise
+    logger.info(f'process is done, {filename} is calculated')
+    return returncode
+
+async def sfbox_calls_async(
+        files : Optional[List[pathlib.Path]] = None,
+        dir = None,
+        cpu_count : Optional[int] = None,
+        log_lines : Optional[Callable[[pathlib.Path, str], None]] = None,
+        return_exceptions = False,
+        ) -> List[int]:
+    """Await sfbox runs for many input files, at most cpu_count at a time.
+    Waiting jobs only hold a coroutine, so queueing thousands of them is cheap.
+
+    Args:
+        files (list, optional): input files to process.
+            Defaults to all '*.in' files in dir.
+        dir (str, optional): path to a directory with input files,
+            used if files are not provided. Defaults to the working directory.
+        cpu_count (int, optional): maximum number of sfbox instances
+            running at the same time. Defaults to conf['cpu_count'].
+        log_lines (callable, optional): see sfbox_call_async.
+        return_exceptions (bool, optional): passed to asyncio.gather.
+            Defaults to False.
+
+    Returns:
+        list: return codes in the order of files
+    """
+    if files is None:
+        if dir is None:
+            dir = os.getcwd()
+        files = sorted(pathlib.Path(dir).glob("*.in"))
+    if cpu_count is None:
+        cpu_count = conf['cpu_count']
+    semaphore = asyncio.Semaphore(cpu_count)
+
+    async def bounded_call(filename):
+        async with semaphore:
+            return await sfbox_call_async(filename, log_lines = log_lines)
+
+    logger.info(f'n of process to do: {len(files)}')
+    return await asyncio.gather(
+        *(bounded_call(filename) for filename in files),
+        return_exceptions = return_exceptions,
         )
-    while True:
-        if not wait:
-            return proc, log
-        if proc.poll() is not None:
-            logger.info(f'process is done, {filename} is calculated')
-            log.close()
-            break
-
-def sfbox_calls_subprocess(dir = None):
+
+def _ordered_input_files(dir, schedule = None, history = None):
+    files = sorted(pathlib.Path(dir).glob("*.in"))
+    if schedule is None:
+        return files
+    elif schedule == "longest_first":
+        from .schedule import order_longest_first
+        return order_longest_first(files, history)
+    else:
+        raise ValueError("invalid schedule, possible values: None, 'longest_first'")
+
+def sfbox_calls_subprocess(
+        dir = None,
+        schedule = None,
+        history = None,
+        timeout = None,
+        max_retries = 0,
+        relax_routine = relax_newton,
+        guess_routine = neighbour_guess,
+        ingest = None,
+        ingest_jobs = 1,
+        ingest_niceness = 10,
+        telemetry = None,
+        monitor = None,
+        monitor_interval = 5,
+        ):
     """Create a pool of task to process all sfbox input files in a directory.
     Number of of max sfbox instances that can work in parallel is defined in 
     conf['cpu_count'].
     The pool is created with Python subprocess package.
+    The children are pinned to CPUs according to conf['pinning'],
+    with 'core' pinning the pool size is limited to the number of physical cores.
+    The jobs run in a scratch directory if conf['scratch_dir'] is set.
+    The results of the inputs found in conf['cache'] are reused.
 
     Args:
         dir (str): path to a directory with input files. 
             Defaults to the working directory.
+        schedule (str, optional): order of dispatching, None for the file name
+            order or 'longest_first' to start the jobs with the longest
+            predicted run time first (see schedule.order_longest_first).
+            Defaults to None.
+        history (schedule.RuntimeHistory, optional): past run times used
+            to predict the run time, the run times of this pool are recorded
+            to it. Defaults to None.
+        timeout (float, optional): wall clock limit of a job in seconds,
+            a job exceeding it is killed. Defaults to None.
+        max_retries (int, optional): how many times a killed job is restarted.
+            Before a retry the input is rewritten with retry.rewrite_for_retry.
+            Defaults to 0.
+        relax_routine (callable, optional): relaxes the solver settings
+            for a retry, see retry.relax_newton. Defaults to relax_newton.
+        guess_routine (callable, optional): guess_routine(filename, converged)
+            returns an initial guess for a retry or None, converged is the list
+            of the inputs finished successfully so far.
+            Defaults to retry.neighbour_guess.
+        ingest (dict, optional): if given, the 'ana' outputs of every
+            successful job are stored to HDF5 as soon as the job finishes
+            with store.store_file_sequential called with these keyword arguments,
+            so that storing overlaps with the calculations. Defaults to None.
+        ingest_jobs (int, optional): number of ingest worker processes.
+            Defaults to 1.
+        ingest_niceness (int, optional): niceness increment of the ingest workers,
+            so that they do not take CPU time from sfbox. Defaults to 10.
+        telemetry (telemetry.PoolTelemetry, optional): collects queue depth,
+            running jobs, completion rate, ETA, failures and core utilization
+            of the pool. Defaults to None.
+        monitor (monitor.MonitorRules, optional): if given, the log of every
+            running job is parsed every monitor_interval seconds and the job is
+            killed when the Newton iterations diverge or stagnate.
+            Aborted jobs are retried as the timed out ones. Defaults to None.
+        monitor_interval (float, optional): seconds between the log checks.
+            Defaults to 5.
+
+    Returns:
+        list: outcome of every input, dicts with 'input', 'status'
+            ('done', 'cached', 'failed', 'timeout' or 'aborted'),
+            'attempts' and 'returncode'
     """    
     if dir is None:
         dir = os.getcwd()
     cpu_count = conf['cpu_count']
-    remained_files = list(pathlib.Path(dir).glob("*.in"))
-    proc_work = []
-    log_work = []
+    #files are popped from the end
+    remained_files = _ordered_input_files(dir, schedule, history)[::-1]
+    allocator = None
+    if conf['pinning'] is not None:
+        allocator = CoreAllocator(conf['pinning'])
+        if conf['pinning'] == 'core' and cpu_count > len(allocator.slots):
+            #hyperthread siblings share a slot, more children would run unpinned
+            logger.info(f"{len(allocator.slots)} jobs at a time, one per physical core")
+            cpu_count = len(allocator.slots)
+    ingest_pool = None
+    ingest_results = []
+    if ingest is not None:
+        from .store import store_file_sequential
+        ingest_pool = mp.Pool(ingest_jobs, initializer = os.nice, initargs = (ingest_niceness,))
+    cache = conf['cache']
+    work = []
+    attempts = {}
+    outcomes = {}
+    converged = []
+
+    def ingest_outputs(filename):
+        if ingest_pool is None:
+            return
+        for output in output_files(filename):
+            compressed = output.with_name(output.name+'.gz')
+            if not output.is_file() and compressed.is_file():
+                #copied back from conf['scratch_dir'] with compression
+                output = compressed
+            ingest_results.append((output, ingest_pool.apply_async(
+                store_file_sequential, (output,), ingest
+                )))
+    if telemetry is not None:
+        telemetry.begin(len(remained_files), cpu_count)
     event_show_msg = True
     logger.info(f'n of process to do: {len(remained_files)}')
-    while len(remained_files) or len(proc_work):
+    while len(remained_files) or len(work):
+        if telemetry is not None:
+            telemetry.tick()
 
         if event_show_msg:
             logger.info(
                 f'{len(remained_files)} processes waiting, '+\
-                f'{len(proc_work)} processes in work'
+                f'{len(work)} processes in work'
                 )
             event_show_msg = False
 
-        if (len(proc_work)<cpu_count) and len(remained_files):
-            new_proc, new_log = sfbox_call(remained_files.pop(), wait=False)
-            proc_work.append(new_proc)
-            log_work.append(new_log)
+        if (len(work)<cpu_count) and len(remained_files):
+            filename = remained_files.pop()
+            attempts[filename] = attempts.get(filename, 0) + 1
+            if attempts[filename] == 1 and cache is not None and cache.fetch(filename):
+                converged.append(filename)
+                outcomes[filename] = dict(
+                    input = filename.name, status = 'cached', attempts = 0, returncode = 0,
+                    )
+                if telemetry is not None:
+                    telemetry.finished(filename, 'cached')
+                ingest_outputs(filename)
+                event_show_msg = True
+                continue
+            cpus = None if allocator is None else allocator.acquire()
+            scratch = None
+            run_filename = filename
+            if conf['scratch_dir'] is not None:
+                scratch = ScratchDir(filename, conf['scratch_dir'], conf['scratch_compress'])
+                run_filename = scratch.stage_in()
+            start = datetime.now()
+            new_proc, new_log = sfbox_call(run_filename, wait=False, cpus=cpus)
+            work.append(dict(
+                proc = new_proc,
+                log = new_log,
+                filename = filename,
+                start = start,
+                start_monotonic = time.monotonic(),
+                cpus = cpus,
+                scratch = scratch,
+                monitor = None if monitor is None else LogMonitor(run_filename.with_suffix('.log'), monitor),
+                last_check = time.monotonic(),
+                ))
+            if telemetry is not None:
+                telemetry.started(filename)
             event_show_msg = True
 
-        for i, (proc, log) in enumerate(zip(proc_work, log_work)):
-            if proc.poll() is not None:
-                logger.info(f'{proc} is done')
-                log.close()
-                del proc_work[i]
-                del log_work[i]
-                event_show_msg = True
-    logger.info(f'Success.')
-    return
+        for job in list(work):
+            proc, filename = job['proc'], job['filename']
+            wall_time = time.monotonic() - job['start_monotonic']
+            timed_out = (timeout is not None) and (wall_time > timeout)
+            abort_reason = None
+            if job['monitor'] is not None and not timed_out:
+                if time.monotonic() - job['last_check'] > monitor_interval:
+                    job['last_check'] = time.monotonic()
+                    abort_reason = job['monitor'].poll()
+            if timed_out:
+                logger.warning(f'{filename.name} exceeded timeout of {timeout} s, killed')
+            if abort_reason is not None:
+                logger.warning(f'{filename.name} is killed, {abort_reason}')
+            if timed_out or abort_reason is not None:
+                proc.kill()
+                rusage = wait_rusage(proc)
+            else:
+                rusage = wait_rusage(proc, block = False)
+            if rusage is None:
+                continue
+
+            logger.info(f'{proc} is done')
+            job['log'].close()
+            work.remove(job)
+            if allocator is not None:
+                allocator.release(job['cpus'])
+            if job['scratch'] is not None:
+                try:
+                    job['scratch'].stage_out()
+                finally:
+                    job['scratch'].cleanup()
+            _record_run(filename, job['start'], wall_time, rusage, proc.returncode)
+            event_show_msg = True
+
+            if timed_out:
+                status = 'timeout'
+            elif abort_reason is not None:
+                status = 'aborted'
+            elif proc.returncode == 0:
+                status = 'done'
+                converged.append(filename)
+                if history is not None:
+                    from .schedule import estimate_cost
+                    history.record(filename.name, estimate_cost(filename), wall_time)
+                if cache is not None:
+                    cache.store(filename)
+                ingest_outputs(filename)
+            else:
+                status = 'failed'
+            outcomes[filename] = dict(
+                input = filename.name,
+                status = status,
+                attempts = attempts[filename],
+                returncode = proc.returncode,
+                )
+            if telemetry is not None:
+                telemetry.finished(filename, status)
+
+            if status in ('timeout', 'aborted') and attempts[filename] <= max_retries:
+                guess = None
+                if guess_routine is not None:
+                    guess = guess_routine(filename, converged)
+                rewrite_for_retry(filename, attempts[filename], relax_routine, guess)
+                #retried next
+                remained_files.append(filename)
+                if telemetry is not None:
+                    telemetry.requeued(filename)
+
+        if not event_show_msg:
+            time.sleep(conf['poll_interval'])
 
-def sfbox_calls_sh(dir = None , wait = True):
+    if ingest_pool is not None:
+        logger.info(f'waiting for ingest of the remaining outputs')
+        ingest_pool.close()
+        ingest_pool.join()
+        for output, result in ingest_results:
+            try:
+                result.get()
+            except Exception as e:
+                logger.error(f'{output.name} is not stored, {e}')
+
+    if telemetry is not None:
+        telemetry.close()
+
+    outcomes = list(outcomes.values())
+    summary = {}
+    for outcome in outcomes:
+        summary[outcome['status']] = summary.get(outcome['status'], 0) + 1
+    retried = sum(1 for outcome in outcomes if outcome['attempts'] > 1)
+    logger.info(f'Success. {summary}, {retried} retried')
+    if cache is not None:
+        logger.info(f'cache {cache.stats()}')
+    return outcomes
+
+def sfbox_calls_sh(dir = None , wait = True, schedule = None, history = None, telemetry = None):
     """Create a pool of task to process all sfbox input files in a directory.
     Number of of max sfbox instances that can work in parallel is defined in 
     conf['cpu_count'].
@@ -119,6 +530,14 @@ def sfbox_calls_sh(dir = None , wait = True):
         wait (bool, optional): If set to True
             python interpreter will be locked until all jobs are done.
             Defaults to True.
+        schedule (str, optional): order of dispatching, None for the order
+            of find command or 'longest_first', see sfbox_calls_subprocess.
+            Defaults to None.
+        history (schedule.RuntimeHistory, optional): past run times used
+            to predict the run time. Defaults to None.
+        telemetry (telemetry.PoolTelemetry, optional): collects the progress
+            from the script output if wait is set to True,
+            the exit status of the jobs is not known. Defaults to None.
 
     Returns:
         [(Popen, log) or None]: if wait is set to True function returns nothing,
@@ -132,18 +551,46 @@ def sfbox_calls_sh(dir = None , wait = True):
     script_dir = pathlib.Path(__file__).parent
     bash_script = str(script_dir / "scripts" / "call_sfbox_multifile.sh")
 
-    proc = subprocess.Popen(
-        [bash_script+f" {cpu_count}" + f" {exe_path}"],
-        shell =True,
-        stdout=subprocess.PIPE,
-        cwd = dir
-        )
-    while True:
-        if not wait:
-            return proc
-        if proc.poll() is not None:
-                logger.info(f'processes is done')
-                break
+    queue_arg = ""
+    queue = None
+    if schedule is not None:
+        #the script reads the queue from its standard input instead of find command,
+        #an anonymous temporary file leaves nothing behind in dir
+        queue = tempfile.TemporaryFile("w+")
+        files = _ordered_input_files(dir, schedule, history)
+        queue.write("".join(f"./{f.stem}\n" for f in files))
+        queue.seek(0)
+        queue_arg = " -"
+
+    try:
+        proc = subprocess.Popen(
+            [bash_script+f" {cpu_count}" + f" {exe_path}" + queue_arg],
+            shell =True,
+            stdin = queue,
+            stdout=subprocess.PIPE,
+            cwd = dir
+            )
+    finally:
+        #the child keeps its own descriptor
+        if queue is not None:
+            queue.close()
+    if not wait:
+        return proc
+    if telemetry is not None:
+        telemetry.begin(len(list(pathlib.Path(dir).glob("*.in"))), cpu_count)
+    #reading the output also keeps the pipe from filling up
+    for line in proc.stdout:
+        status, _, name = line.decode(errors = 'replace').strip().partition(" ")
+        if telemetry is not None:
+            if status == "started":
+                telemetry.started(name)
+            elif status == "done":
+                telemetry.finished(name, "done")
+            telemetry.tick()
+    proc.wait()
+    if telemetry is not None:
+        telemetry.close()
+    logger.info(f'processes is done')
 
 def sfbox_calls(parallel_execution = 'sh', **kwargs):
     """Wrapper function to call multiple sfbox instances. 
@@ -152,11 +599,16 @@ def sfbox_calls(parallel_execution = 'sh', **kwargs):
     Args:
         dir (str): parallel execution framework 'sh' or 'subprocess'. 
             Defaults to 'sh'.
+
+    Returns:
+        what the pool returns, for 'subprocess' the outcome of every input
+            including the retried, timed out and failed ones,
+            see sfbox_calls_subprocess
     """
     if parallel_execution == "sh":
-        sfbox_calls_sh(**kwargs)
+        return sfbox_calls_sh(**kwargs)
     elif parallel_execution == "subprocess":
-        sfbox_calls_subprocess(**kwargs)
+        return sfbox_calls_subprocess(**kwargs)
     else:
         raise ValueError("invalid argument")
 
@@ -0,0 +1,220 @@
+from typing import Callable, Dict, Iterable, Optional, Tuple, Union
+
+import numpy as np
+
+import logging
+logger = logging.getLogger(__name__)
+
+try:
+    import scipy.interpolate
+    _SCIPY_FOUND_ = True
+except ModuleNotFoundError:
+    _SCIPY_FOUND_ = False
+
+resample_methods = ["linear", "spline"]
+resample_modes = ["scale", "extend"]
+geometries = ["flat", "planar", "cylindrical", "spherical"]
+
+def _positions(n_old : int, n_new : int, mode : str, boundary : int) -> np.ndarray:
+    # positions of the new interior layers on the index axis of the old interior layers
+    interior_old = n_old - 2*boundary
+    interior_new = n_new - 2*boundary
+    if mode == "scale":
+        #the same box, layer centers are mapped
+        return (np.arange(interior_new) + 0.5)*interior_old/interior_new - 0.5
+    #the same spacing, the box grows or shrinks away from the first layer
+    return np.arange(interior_new, dtype = float)
+
+def _interpolate(values : np.ndarray, positions : np.ndarray, axis : int, method : str) -> np.ndarray:
+    n = values.shape[axis]
+    if n == 1:
+        return np.repeat(values, len(positions), axis = axis)
+    #constant continuation outside the old layers
+    positions = np.clip(positions, 0, n - 1)
+    if method == "spline":
+        if not _SCIPY_FOUND_:
+            raise ModuleNotFoundError("spline resampling requires scipy")
+        k = min(3, n - 1)
+        spline = scipy.interpolate.make_interp_spline(np.arange(n), values, k = k, axis = axis)
+        return spline(positions)
+    lower = np.minimum(np.floor(positions).astype(int), n - 2)
+    fraction = positions - lower
+    shape = [1]*values.ndim
+    shape[axis] = len(positions)
+    fraction = fraction.reshape(shape)
+    return np.take(values, lower, axis = axis)*(1 - fraction) + np.take(values, lower + 1, axis = axis)*fraction
+
+def _resample_axis(values : np.ndarray, n_new : int, axis : int, method : str, mode : str, boundary : int) -> np.ndarray:
+    n_old = values.shape[axis]
+    if n_old == n_new:
+        return values
+    if n_old <= 2*boundary or n_new <= 2*boundary:
+        raise ValueError("lattice is smaller than its boundary layers")
+    interior = np.take(values, np.arange(boundary, n_old - boundary), axis = axis)
+    resampled = _interpolate(interior, _positions(n_old, n_new, mode, boundary), axis, method)
+    lower = np.take(values, np.arange(boundary), axis = axis)
+    upper = np.take(values, np.arange(n_old - boundary, n_old), axis = axis)
+    return np.concatenate([lower, resampled, upper], axis = axis)
+
+def layer_volumes(n : int, geometry : str = "flat", boundary : int = 1) -> np.ndarray:
+    """Relative volume of the layers along a gradient,
+    the first interior layer is at distance 1 from the origin
+
+    Args:
+        n (int): number of layers, boundary layers included
+        geometry (str, optional): 'flat' (or 'planar'), 'cylindrical' or 'spherical'.
+            Defaults to "flat".
+        boundary (int, optional): boundary layers at each side. Defaults to 1.
+    """
+    if geometry not in geometries:
+        raise ValueError(f"Invalid geometry\n Possible values: {geometries}")
+    r = np.arange(n, dtype = float) - boundary + 1
+    r = np.clip(r, 0, None)
+    if geometry == "cylindrical":
+        volumes = r**2 - np.clip(r - 1, 0, None)**2
+    elif geometry == "spherical":
+        volumes = r**3 - np.clip(r - 1, 0, None)**3
+    else:
+        volumes = np.ones(n)
+    #boundary layers do not count
+    volumes[:boundary] = 0
+    volumes[n-boundary:] = 0
+    return volumes
+
+def _dimension(geometry : str) -> int:
+    return {"cylindrical" : 2, "spherical" : 3}.get(geometry, 1)
+
+def resample_state(
+        values : np.ndarray,
+        old_shape : Tuple[int, int],
+        new_shape : Tuple[int, int],
+        ngradients : int = 1,
+        method : str = "linear",
+        mode : str = "scale",
+        conserve : bool = False,
+        geometry : str = "flat",
+        boundary : int = 1,
+        ) -> np.ndarray:
+    """Resample one state of an initial guess to another lattice
+
+    Args:
+        values (np.ndarray): state, flat or of old_shape
+        old_shape (tuple): shape of the state, boundary layers included
+        new_shape (tuple): target shape
+        ngradients (int, optional): 1 resamples the first axis only. Defaults to 1.
+        method (str, optional): 'linear' or 'spline' (requires scipy). Defaults to "linear".
+        mode (str, optional): 'scale' maps the old box onto the new one, e.g. to refine
+            n_layers, 'extend' keeps the spacing and crops or continues the last layer.
+            Defaults to "scale".
+        conserve (bool, optional): rescale the values to keep the total amount,
+            sum over the layers weighted with their volumes. Defaults to False.
+        geometry (str, optional): geometry of the first gradient used for the volumes,
+            the second gradient is flat. Defaults to "flat".
+        boundary (int, optional): boundary layers at each side, copied as they are.
+            Defaults to 1.
+
+    Returns:
+        np.ndarray: flat resampled state
+    """
+    if method not in resample_methods:
+        raise ValueError(f"Invalid method\n Possible values: {resample_methods}")
+    if mode not in resample_modes:
+        raise ValueError(f"Invalid mode\n Possible values: {resample_modes}")
+    values = np.reshape(np.asarray(values, dtype = float), old_shape)
+    resampled = _resample_axis(values, new_shape[0], 0, method, mode, boundary)
+    if ngradients > 1:
+        resampled = _resample_axis(resampled, new_shape[1], 1, method, mode, boundary)
+    elif resampled.shape[1] != new_shape[1]:
+        raise ValueError("second dimension of a 1G guess can not change")
+    if conserve:
+        def amount(state, shape):
+            volumes = layer_volumes(shape[0], geometry, boundary)[:, None]
+            if ngradients > 1:
+                volumes = volumes*layer_volumes(shape[1], "flat", boundary)[None, :]
+            return np.sum(state*volumes)
+        target = amount(values, old_shape)
+        if mode == "scale":
+            #amount in the units of the new lattice spacing
+            target = target*((new_shape[0] - 2*boundary)/(old_shape[0] - 2*boundary))**_dimension(geometry)
+            if ngradients > 1:
+                target = target*(new_shape[1] - 2*boundary)/(old_shape[1] - 2*boundary)
+        current = amount(resampled, new_shape)
+        if current != 0:
+            resampled = resampled*(target/current)
+    return np.ravel(resampled)
+
+def resample_guess(
+        guess : Dict,
+        shape : Tuple[int, int],
+        method : str = "linear",
+        mode : str = "scale",
+        conserve : Union[bool, Iterable[str]] = False,
+        geometry : str = "flat",
+        boundary : int = 1,
+        ) -> Dict:
+    """Move an initial guess (see utils.read_initial_guess_file) onto another lattice,
+    the result can be written with utils.write_initial_guess
+
+    Args:
+        guess (dict): initial guess
+        shape (tuple): target shape as in the 'gradients' entry, boundary layers included
+        conserve (bool | iterable, optional): True to conserve the amount of every state
+            or the names of the states to conserve. Defaults to False.
+        method, mode, geometry, boundary: see resample_state
+
+    Returns:
+        dict: resampled initial guess
+    """
+    ngradients, *old_shape = guess["gradients"]
+    old_shape = tuple(old_shape)
+    shape = tuple(shape)
+    state = {}
+    for molecule, values in guess["state"].items():
+        conserve_ = conserve if isinstance(conserve, bool) else molecule in conserve
+        resampled = resample_state(
+            values, old_shape, shape, ngradients,
+            method = method, mode = mode, conserve = conserve_,
+            geometry = geometry, boundary = boundary,
+            )
+        if np.ndim(values) > 1:
+            resampled = resampled.reshape(shape)
+        state[molecule] = resampled
+    logger.debug(f"initial guess is resampled from {old_shape} to {shape}")
+    return dict(guess, state = state, gradients = (ngradients, *shape))
+
+def lattice_shape(fields : Dict, boundary : int = 1) -> Tuple[Tuple[int, int], str]:
+    """Shape of the initial guess of a calculation and the lattice geometry
+
+    Args:
+        fields (dict): parameters of a calculation with 'lat:<name>:n_layers'
+            or 'lat:<name>:n_layers_x' and 'lat:<name>:n_layers_y'
+
+    Returns:
+        tuple: (shape with boundary layers, geometry)
+    """
+    lattice = {key.split(":")[2] : value for key, value in fields.items() if key.startswith("lat:")}
+    geometry = lattice.get("geometry", "flat")
+    if "n_layers_x" in lattice:
+        shape = (int(lattice["n_layers_x"]) + 2*boundary, int(lattice["n_layers_y"]) + 2*boundary)
+    else:
+        shape = (int(lattice["n_layers"]) + 2*boundary, 1)
+    return shape, geometry
+
+def resampling_guess_routine(
+        method : str = "linear",
+        mode : str = "scale",
+        conserve : Union[bool, Iterable[str]] = False,
+        boundary : int = 1,
+        ) -> Callable[[Dict, Dict], Dict]:
+    """guess_routine for sweep.run_chain and sweep.continuation_sweep
+    resampling the previous solution to the lattice of the next point
+
+    Example:
+        continuation_sweep(base, path, guess_routine = resampling_guess_routine("spline"))
+    """
+    def guess_routine(guess : Dict, fields : Dict) -> Dict:
+        shape, geometry = lattice_shape(fields, boundary)
+        if tuple(guess["gradients"][1:]) == shape:
+            return guess
+        return resample_guess(guess, shape, method, mode, conserve, geometry, boundary)
+    return guess_routine
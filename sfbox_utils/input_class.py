@@ -1,6 +1,10 @@
-from typing import Dict, List, Callable
+import pathlib
+import itertools
+import multiprocessing as mp
+from typing import Dict, List, Callable, Iterable, Optional, Sequence, Union
 from collections import OrderedDict
 from .read_input import parse_file
+from .write_input import format_statements
 class InputItemClass(OrderedDict):
     def __init__(self, fields ={}, properties = {}):
         self.update(fields)
@@ -15,18 +19,7 @@ class InputItemClass(OrderedDict):
                 self.add_alias(prop_name, handlers)
 
     def __str__(self) -> str:
-        s = ""
-        for k, v in self.items():
-            if not isinstance(v, list): v = [v]
-            
-            for v_ in v:
-                #boolean to string
-                if v_ is False:
-                    v_ = 'false'
-                elif v_ is True:
-                    v_ = 'true'
-                s = s+ f'{k}:{v_}\n'
-        return s
+        return "".join(format_statements(k, v) for k, v in self.items())
             
     def add_property(
             self,
@@ -36,6 +29,16 @@ class InputItemClass(OrderedDict):
             deleter : str|Callable = None, 
             doc : str = None
             ):
+        #properties live on the class, set them once, not for every instance
+        handlers = (getter, setter, deleter, doc)
+        defined = self.__class__.__dict__.get("_defined_properties")
+        if defined is None:
+            defined = {}
+            setattr(self.__class__, "_defined_properties", defined)
+        if defined.get(name) == handlers:
+            return
+        defined[name] = handlers
+
         if isinstance(getter, str):
             def fget(self_):
                 return self_[getter]
@@ -115,9 +118,130 @@ class InputListClass(List):
             super().extend(InputItemClass(item, self.properties) for item in other)
 
     def __str__(self) -> str:
-        s = "start\n".join(f"{item}" for item in self) + "start\n"
-        return s
+        return "".join(f"{item}start\n" for item in self)
     
     def writefile(self, filename):
         with open(filename, "w") as f:
-            f.writelines(str(self))
\ No newline at end of file
+            for item in self:
+                f.write(f"{item}start\n")
+
+def _render_value(key : str, value):
+    # value part of the statements, the first 'key:' is in the template
+    if value is True or value is False or isinstance(value, list):
+        return format_statements(key, value)[len(key)+1:-1]
+    return value
+
+class InputTemplate:
+    """Compiled input block. The statements of the base fields are rendered
+    once, only the variable fields are formatted for every calculation.
+
+    Example:
+        template = InputTemplate(base, ["mol:pol:theta", "mon:S:chi"])
+        template.write("sweep.in", itertools.product(thetas, chis), delta = True)
+
+    Args:
+        base (dict): fields of a calculation, e.g. an InputItemClass
+        variables (list): keys changed from one calculation to the next,
+            keys missing in base are appended at the end of the block
+    """
+    def __init__(self, base : Dict, variables : Sequence[str]):
+        self.base = dict(base)
+        self.variables = list(variables)
+        variables = set(self.variables)
+        parts = []
+        for k, v in self.base.items():
+            if k in variables:
+                parts.append(k+":{}\n")
+            else:
+                parts.append(format_statements(k, v).replace("{", "{{").replace("}", "}}"))
+        #the positions of the variables in the format string
+        order = [k for k in self.base if k in variables]
+        for k in self.variables:
+            if k not in self.base:
+                parts.append(k+":{}\n")
+                order.append(k)
+        self.order = [self.variables.index(k) for k in order]
+        self.block = "".join(parts) + "start\n"
+        self.delta_block = "".join(k+":{}\n" for k in order) + "start\n"
+
+    def _values(self, values : Union[Dict, Sequence]) -> List[str]:
+        if isinstance(values, dict):
+            values = [values[k] for k in self.variables]
+        return [_render_value(self.variables[i], values[i]) for i in self.order]
+
+    def render(self, values : Union[Dict, Sequence], delta : bool = False) -> str:
+        """Statements of one calculation
+
+        Args:
+            values (dict | sequence): values of the variables, by key or in order
+            delta (bool, optional): render only the variables, sfbox keeps
+                the other settings from the previous calculation. Defaults to False.
+
+        Returns:
+            str: the block terminated with 'start'
+        """
+        return (self.delta_block if delta else self.block).format(*self._values(values))
+
+    def render_many(self, rows : Iterable, delta : bool = False) -> str:
+        """Statements of several calculations, with delta only the first one is full"""
+        rows = iter(rows)
+        s = []
+        if delta:
+            for values in itertools.islice(rows, 1):
+                s.append(self.render(values))
+        block = self.delta_block if delta else self.block
+        for values in rows:
+            s.append(block.format(*self._values(values)))
+        return "".join(s)
+
+    def _render_chunk(self, args) -> str:
+        rows, delta, first = args
+        if delta and not first:
+            return "".join(self.delta_block.format(*self._values(v)) for v in rows)
+        return self.render_many(rows, delta)
+
+    def write(
+            self,
+            filename : Union[str, pathlib.Path],
+            rows : Iterable,
+            delta : bool = False,
+            chunk_size : int = 10000,
+            processes : Optional[int] = None,
+            buffer_size : int = 2**20,
+            ) -> int:
+        """Write the calculations to an input file
+
+        Args:
+            filename (str | pathlib.Path): input file
+            rows (iterable): values of the variables of every calculation, may be a generator
+            delta (bool, optional): write the base fields only in the first block.
+                Defaults to False.
+            chunk_size (int, optional): calculations rendered at once. Defaults to 10000.
+            processes (int, optional): render the chunks in a process pool of this size,
+                the order of the calculations is kept. Defaults to None, no pool.
+            buffer_size (int, optional): file buffer in bytes. Defaults to 2**20.
+
+        Returns:
+            int: number of calculations written
+        """
+        rows = iter(rows)
+        sizes = []
+        def chunks():
+            first = True
+            while True:
+                chunk = list(itertools.islice(rows, chunk_size))
+                if not chunk:
+                    return
+                sizes.append(len(chunk))
+                yield chunk, delta, first
+                first = False
+
+        with open(filename, "w", buffering = buffer_size) as f:
+            if processes is None:
+                for args in chunks():
+                    f.write(self._render_chunk(args))
+            else:
+                with mp.Pool(processes) as pool:
+                    for text in pool.imap(self._render_chunk, chunks()):
+                        f.write(text)
+        return sum(sizes)
@@ -1,154 +1,401 @@
 #%%
-from typing import Any, Dict, List, Callable
-import inspect
+from typing import Any, Dict, List, Callable, Optional, Tuple, Union
+from collections import ChainMap
+import pathlib
+import itertools
+import graphlib
+
+import numpy as np
+
+import logging
+logger = logging.getLogger(__name__)
+
+class _Probe:
+    """Stands for any value while a rule is traced,
+    supports arithmetic, comparison and formatting"""
+    def _self(self, *args, **kwargs):
+        return self
+    __add__ = __radd__ = __sub__ = __rsub__ = __mul__ = __rmul__ = _self
+    __truediv__ = __rtruediv__ = __floordiv__ = __rfloordiv__ = _self
+    __mod__ = __rmod__ = __pow__ = __rpow__ = __neg__ = __pos__ = __abs__ = _self
+    __lt__ = __le__ = __gt__ = __ge__ = __eq__ = __ne__ = _self
+    __getitem__ = __call__ = _self
+    __hash__ = object.__hash__
+
+    def __getattr__(self, name):
+        return self
+
+    def __format__(self, spec):
+        return ""
+
+    def __str__(self):
+        return ""
+
+    def __bool__(self):
+        return True
 
-class AlwaysNoneIterable:
     def __iter__(self):
-        while True:
-            yield None
+        return iter(())
 
-class DictTracker:
-    def __init__(self):
-        self.accessed_keys = set()
-        self.set_keys = set()
+class RuleTracker:
+    """Records the names a rule reads and writes. Fields are accessed
+    as items, _['lat:1G:n_layers'], variables and aliases of fields as attributes,
+    _.chi_AS, every value read is a _Probe."""
+    def __init__(self, aliases : Optional[Dict[str, str]] = None):
+        object.__setattr__(self, "_aliases", aliases or {})
+        object.__setattr__(self, "_reads", set())
+        object.__setattr__(self, "_writes", set())
 
     def __getitem__(self, key):
-        self.accessed_keys.add(key)
-        return None
+        self._reads.add(key)
+        return _Probe()
 
     def __setitem__(self, key, value):
-        self.set_keys.add(key)
+        self._writes.add(key)
+
+    def __getattr__(self, name):
+        self._reads.add(self._aliases.get(name, name))
+        return _Probe()
 
-    def __delitem__(self, key):
-        del self.data[key]
+    def __setattr__(self, name, value):
+        self._writes.add(self._aliases.get(name, name))
 
-    def update(self, other_dict):
-        if isinstance(other_dict, DictTracker):
-            self.accessed_keys.update(other_dict.accessed_keys)
-            self.set_keys.update(other_dict.set_keys)
-        elif isinstance(other_dict, dict):
-            self.set_keys.update(other_dict.keys())
-        else:
-            raise TypeError("Unsupported type for update")
+def inspect_dependency(
+        dependency : Callable,
+        aliases : Optional[Dict[str, str]] = None,
+        ) -> Tuple[List[str], List[str]]:
+    """Trace a rule to find the fields and variables it writes and reads
 
-    def keys(self):
-        return list()
+    Args:
+        dependency (Callable): rule taking one argument, see TaskClass
+        aliases (dict, optional): attribute name -> field
 
-    def values(self):
-        return list()
+    Returns:
+        tuple: written names, read names
+    """
+    tracker = RuleTracker(aliases)
+    dependency(tracker)
+    return sorted(tracker._writes), sorted(tracker._reads - tracker._writes)
 
-    def items(self):
-        return list()
-    
-class AttributeTracker:
-    def __init__(self):
-        self.accessed_attributes = set()
+class _Namespace:
+    # values of one evaluation, fields as items, variables and aliases as attributes
+    def __init__(self, values, aliases : Dict[str, str]):
+        object.__setattr__(self, "_values", values)
+        object.__setattr__(self, "_aliases", aliases)
+
+    def __getitem__(self, key):
+        return self._values[key]
+
+    def __setitem__(self, key, value):
+        self._values[key] = value
 
     def __getattr__(self, name):
-        self.accessed_attributes.add(name)
-        return None
-
-    
-def inspect_dependency(dependency : Callable):
-    signature = inspect.signature(dependency)
-    arguments = {}
-    #dependent_fields= set()
-    #dependent_attr = set()
-    #precedent = []
-    for arg in signature.parameters.values():
-        if arg.name == "_field":
-            print("Dependency access fields")
-            _tracker = DictTracker()
-            dependency(_tracker, AlwaysNoneIterable())
-            dependent = list(_tracker.set_keys)
-        else:
-            val = arg.default
-            if val == inspect._empty: val = None
-            arguments.update({arg.name : val})
-    return dependent, arguments
+        try:
+            return self._values[self._aliases.get(name, name)]
+        except KeyError:
+            raise AttributeError(name) from None
+
+    def __setattr__(self, name, value):
+        self._values[self._aliases.get(name, name)] = value
+
+def _python_scalar(value):
+    return value.item() if isinstance(value, np.generic) else value
+
+def _unique_rows(columns : List[np.ndarray], n : int) -> Tuple[np.ndarray, np.ndarray]:
+    # first occurrence and inverse index of every combination of the column values
+    codes = np.zeros(n, dtype = np.int64)
+    for column in columns:
+        unique, inverse = np.unique(column, return_inverse = True)
+        #renumber to keep the codes small
+        _, codes = np.unique(codes*len(unique) + inverse.reshape(-1), return_inverse = True)
+    _, first, inverse = np.unique(codes, return_index = True, return_inverse = True)
+    return first, inverse.reshape(-1)
+
+class Evaluation:
+    """Values of the fields for every point of a parameter grid,
+    a field is either a constant or an array with one value per point"""
+    def __init__(self, fields : Dict[str, Any], variables : Dict[str, Any], n : int):
+        self.fields = fields
+        self.variables = variables
+        self.n = n
+
+    def __len__(self) -> int:
+        return self.n
+
+    def varying(self) -> List[str]:
+        """Fields that change from point to point"""
+        return [k for k, v in self.fields.items() if np.ndim(v) == 1]
 
-def _update_dict_no_None(main_dict, other_dict):
-    for key, value in other_dict.items():
-        if value is not None:
-            main_dict[key] = value
-        elif key not in main_dict:
-            main_dict[key] = None
+    def column(self, key : str) -> np.ndarray:
+        """Values of a field or a variable for every point"""
+        value = self.fields[key] if key in self.fields else self.variables[key]
+        if np.ndim(value) == 1:
+            return value
+        return np.full(self.n, value, dtype = object if isinstance(value, str) else None)
 
+    def _rows(self, keys : List[str]):
+        if not keys:
+            #only scalars, every point is the same calculation
+            return itertools.repeat((), self.n)
+        return zip(*[self.fields[k].tolist() for k in keys])
+
+    def blocks(self):
+        """Generate the fields of every point as dicts"""
+        varying = self.varying()
+        constant = {k : _python_scalar(v) for k, v in self.fields.items() if k not in varying}
+        for row in self._rows(varying):
+            block = dict(constant)
+            block.update(zip(varying, row))
+            yield block
+
+    def template(self):
+        """input_class.InputTemplate with the constant fields as the base"""
+        from .input_class import InputTemplate
+        varying = self.varying()
+        base = {k : _python_scalar(v) for k, v in self.fields.items()}
+        return InputTemplate(base, varying)
+
+    def to_table(self):
+        """input_table.InputTable of the fields, the constants are not copied"""
+        from .input_table import InputTable
+        return InputTable(self.fields, n = self.n)
+
+    def write(self, filename : Union[str, pathlib.Path], delta : bool = True, **kwargs) -> int:
+        """Write every point as a calculation of an input file,
+        see input_class.InputTemplate.write
+
+        Returns:
+            int: number of calculations written
+        """
+        logger.info(f"{self.n} calculations are written to {filename}")
+        return self.template().write(filename, self._rows(self.varying()), delta = delta, **kwargs)
 
 class TaskClass:
-    def __init__(self, fields = {}) -> None:
+    """Dependency graph of rules deriving input fields from variables.
+    A rule is a function of one argument '_', it reads and writes fields
+    as items, _['mon:pa:chi - S'], and variables or aliases of fields as attributes,
+    _.chi_AS. The rules are traced once to find their inputs and outputs,
+    sorted topologically and evaluated for a whole grid of variables at once
+    on numpy arrays. A rule that does not work on arrays (e.g. formats a string
+    or branches on a value) is evaluated once per unique combination of its inputs,
+    these results are memoized between evaluations.
+
+    Example:
+        task = TaskClass(fields, aliases)
+        task.add_dependency(set_chi_AS)
+        task.add_dependency(set_composition)
+        evaluation = task.evaluate(chi_AS = np.linspace(0, 1, 100), NA = [50, 100], NB = [50, 100])
+        evaluation.write("grid.in")
+
+    Args:
+        fields (dict): base fields, '_' marks a field to be set by a rule or the grid
+        aliases (dict, optional): attribute name -> field
+    """
+    def __init__(self, fields = {}, aliases : Optional[Dict[str, str]] = None) -> None:
         self.fields = fields
+        self.aliases = dict(aliases or {})
         self.user_dependencies = []
+        #rule -> (writes, reads), keyed by the function, rules may share a name
+        self.dependency_io = {}
         self.user_variables = {}
+        self._memo = {}
 
     def add_dependency(self, dependency : Callable):
-        dependent_field, variables = inspect_dependency(dependency)
-        _update_dict_no_None(self.user_variables, variables)
+        """Add a rule, its inputs not written by other rules are the user variables"""
+        writes, reads = inspect_dependency(dependency, self.aliases)
+        self.user_dependencies.append(dependency)
+        self.dependency_io[dependency] = (writes, reads)
+        self.user_variables = {k : None for k in self.free_variables()}
 
-    
-    
+    def free_variables(self) -> List[str]:
+        """Names read by the rules and written by none, fields included"""
+        written = set()
+        read = []
+        for writes, reads in self.dependency_io.values():
+            written.update(writes)
+            read.extend(reads)
+        return [k for k in dict.fromkeys(read) if k not in written]
 
+    def order(self) -> List[Callable]:
+        """Rules in an order where every rule runs after the rules it reads from
+
+        Raises:
+            graphlib.CycleError: the rules depend on each other
+        """
+        writers = {}
+        for rule in self.user_dependencies:
+            for name in self.dependency_io[rule][0]:
+                writers.setdefault(name, []).append(rule)
+        sorter = graphlib.TopologicalSorter()
+        for rule in self.user_dependencies:
+            predecessors = {
+                writer for name in self.dependency_io[rule][1]
+                for writer in writers.get(name, []) if writer is not rule
+                }
+            sorter.add(rule, *predecessors)
+        return list(sorter.static_order())
+
+    def _grid(self, grid : Dict[str, Any], product : bool) -> Tuple[Dict[str, Any], int]:
+        arrays = {self.aliases.get(k, k) : np.asarray(v) for k, v in grid.items()}
+        axes = {k : v for k, v in arrays.items() if v.ndim == 1}
+        scalars = {k : _python_scalar(v[()]) for k, v in arrays.items() if v.ndim == 0}
+        if not axes:
+            return scalars, 1
+        if product:
+            mesh = np.meshgrid(*axes.values(), indexing = "ij")
+            columns = {k : m.reshape(-1) for k, m in zip(axes, mesh)}
+        else:
+            if len({len(v) for v in axes.values()}) != 1:
+                raise ValueError("grid arrays must have the same length if product is False")
+            columns = axes
+        n = len(next(iter(columns.values())))
+        return {**scalars, **columns}, n
+
+    def _vectorized(self, rule : Callable, values, n : int) -> Optional[Dict]:
+        writes, reads = self.dependency_io[rule]
+        local = ChainMap({}, values)
+        try:
+            rule(_Namespace(local, self.aliases))
+        except Exception:
+            return None
+        result = local.maps[0]
+        array_input = any(np.ndim(values.get(k)) == 1 for k in reads)
+        for k, v in result.items():
+            if isinstance(v, np.ndarray):
+                if v.shape != (n,) and v.ndim != 0:
+                    return None
+            elif array_input and isinstance(v, (str, bytes, list, tuple, dict)):
+                #e.g. an f-string of whole arrays
+                return None
+        return result
+
+    def _per_combination(self, rule : Callable, values, n : int) -> Dict:
+        writes, reads = self.dependency_io[rule]
+        varying = [k for k in reads if np.ndim(values.get(k)) == 1]
+        first, inverse = _unique_rows([values[k] for k in varying], n)
+        outputs = {}
+        for j, i in enumerate(first):
+            point = {
+                k : _python_scalar(values[k][i]) if k in varying else values[k]
+                for k in reads if k in values
+                }
+            key = (rule, tuple(point.items()))
+            try:
+                result = self._memo[key]
+            except (KeyError, TypeError):
+                local = ChainMap({}, point)
+                rule(_Namespace(local, self.aliases))
+                result = dict(local.maps[0])
+                try:
+                    self._memo[key] = result
+                except TypeError:
+                    #unhashable inputs are not memoized
+                    pass
+            for k, v in result.items():
+                outputs.setdefault(k, [None]*len(first))[j] = v
+        return {k : np.asarray(v)[inverse] for k, v in outputs.items()}
+
+    def evaluate(self, grid : Optional[Dict[str, Any]] = None, product : bool = True, **variables) -> Evaluation:
+        """Evaluate the rules for every point of a grid
+
+        Args:
+            grid (dict, optional): variable, alias or field -> value or array of values
+            product (bool, optional): all the combinations of the arrays if True,
+                otherwise the arrays are zipped. Defaults to True.
+            **variables: added to grid
+
+        Returns:
+            Evaluation: fields for every point
+        """
+        grid = {**(grid or {}), **variables}
+        columns, n = self._grid(grid, product)
+        values = {k : v for k, v in self.fields.items() if not (isinstance(v, str) and v == "_")}
+        values.update(columns)
+        missing = [k for k in self.free_variables() if k not in values]
+        if missing:
+            raise KeyError(f"values of {missing} are required")
+        for rule in self.order():
+            result = self._vectorized(rule, values, n)
+            if result is None:
+                logger.debug(f"{rule.__name__} is evaluated per unique combination of its inputs")
+                result = self._per_combination(rule, values, n)
+            values.update(result)
+        fields = {k : values.get(k) for k in self.fields}
+        fields.update({k : v for k, v in values.items() if ":" in k and k not in fields})
+        unset = [k for k, v in fields.items() if v is None]
+        if unset:
+            logger.warning(f"fields {unset} are not set")
+        variables = {k : v for k, v in values.items() if k not in fields}
+        return Evaluation(fields, variables, n)
 
 #%%
-fields = {
-  'lat:1G:geometry': 'spherical',
-  'lat:1G:gradients': 1,
-  'lat:1G:lambda': 0.16666666666666666,
-  'lat:1G:n_layers': '_',
-  'mon:pao:freedom': 'free',
-  'mon:pa:freedom': 'free',
-  'mon:pae:freedom': 'free',
-  'mon:pbo:freedom': 'free',
-  'mon:pb:freedom': 'free',
-  'mon:pbe:freedom': 'free',
-  'mol:diblock:composition': '(pae)1(pa)98(pao)1(pbo)1(pb)98(pbe)1',
-  'mol:diblock:freedom': 'restricted',
-  'mol:diblock:theta': 0.1,
-  'mon:S:freedom': 'free',
-  'mol:solvent:freedom': 'solvent',
-  'mol:solvent:composition': 'S',
-  'mon:pao:chi - S': '_',
-  'mon:pa:chi - S': '_',
-  'mon:pae:chi - S': '_',
-  'mon:pbo:chi - S': '_',
-  'mon:pb:chi - S': '_',
-  'mon:pbe:chi - S': '_',
-  'newton:isaac:method': 'pseudohessian',
-  'newton:isaac:tolerance': 1e-08,
-  'output:filename.out:type': 'ana',
-  'output:filename.out:write_profiles': True,
-  'output:filename.out:append': False,
-  'output:filename.out:write_bounds': False
-}
-
-aliases = dict(
-        nlayers = "lat:1G:n_layers",
-        phibulk = "mol:diblock:phibulk",
-        method = "newton:isaac:method",
-        tolerance = 'newton:isaac:tolerance',
-        composition = 'mol:diblock:composition'
-    )
-
-def set_chi_AS(_):
-    _['mon:pao:chi - S'] = _.chi_AS
-    _['mon:pa:chi - S'] = _.chi_AS
-    _['mon:pae:chi - S'] = _.chi_AS
-
-def set_chi_BS(_):
-    _['mon:pbo:chi - S'] = _.chi_BS
-    _['mon:pb:chi - S'] = _.chi_BS
-    _['mon:pbe:chi - S'] = _.chi_BS
-
-def set_composition(_):
-   _.composition =  f"(pae)1(pa){_.NA-2}(pao)1(pbo)1(pb){_.NB-2}(pbe)1"
-
-def get_N(_):
-    _.N = _.NA + _.NB
-
-# properties = dict(
-#     chi_AS = [get_chi_AS, set_chi_AS, del_chi_AS]
-# )
-#%%
-inspect_dependency(set_chi_AS)
+if __name__ == "__main__":
+    fields = {
+      'lat:1G:geometry': 'spherical',
+      'lat:1G:gradients': 1,
+      'lat:1G:lambda': 0.16666666666666666,
+      'lat:1G:n_layers': '_',
+      'mon:pao:freedom': 'free',
+      'mon:pa:freedom': 'free',
+      'mon:pae:freedom': 'free',
+      'mon:pbo:freedom': 'free',
+      'mon:pb:freedom': 'free',
+      'mon:pbe:freedom': 'free',
+      'mol:diblock:composition': '(pae)1(pa)98(pao)1(pbo)1(pb)98(pbe)1',
+      'mol:diblock:freedom': 'restricted',
+      'mol:diblock:theta': 0.1,
+      'mon:S:freedom': 'free',
+      'mol:solvent:freedom': 'solvent',
+      'mol:solvent:composition': 'S',
+      'mon:pao:chi - S': '_',
+      'mon:pa:chi - S': '_',
+      'mon:pae:chi - S': '_',
+      'mon:pbo:chi - S': '_',
+      'mon:pb:chi - S': '_',
+      'mon:pbe:chi - S': '_',
+      'newton:isaac:method': 'pseudohessian',
+      'newton:isaac:tolerance': 1e-08,
+      'output:filename.out:type': 'ana',
+      'output:filename.out:write_profiles': True,
+      'output:filename.out:append': False,
+      'output:filename.out:write_bounds': False
+    }
+
+    aliases = dict(
+            nlayers = "lat:1G:n_layers",
+            phibulk = "mol:diblock:phibulk",
+            method = "newton:isaac:method",
+            tolerance = 'newton:isaac:tolerance',
+            composition = 'mol:diblock:composition'
+        )
+
+    def set_chi_AS(_):
+        _['mon:pao:chi - S'] = _.chi_AS
+        _['mon:pa:chi - S'] = _.chi_AS
+        _['mon:pae:chi - S'] = _.chi_AS
+
+    def set_chi_BS(_):
+        _['mon:pbo:chi - S'] = _.chi_BS
+        _['mon:pb:chi - S'] = _.chi_BS
+        _['mon:pbe:chi - S'] = _.chi_BS
+
+    def set_composition(_):
+       _.composition =  f"(pae)1(pa){_.NA-2}(pao)1(pbo)1(pb){_.NB-2}(pbe)1"
+
+    def get_N(_):
+        _.N = _.NA + _.NB
+
+    # properties = dict(
+    #     chi_AS = [get_chi_AS, set_chi_AS, del_chi_AS]
+    # )
 
-# %%
+    task = TaskClass(fields, aliases)
+    for rule in [set_chi_AS, set_chi_BS, set_composition, get_N]:
+        task.add_dependency(rule)
+    evaluation = task.evaluate(
+        chi_AS = np.linspace(0, 1, 11),
+        chi_BS = np.linspace(0, 1, 11),
+        NA = [50, 100],
+        NB = [50, 100],
+        nlayers = 200,
+        )
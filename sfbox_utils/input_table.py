@@ -0,0 +1,300 @@
+import pathlib
+import itertools
+from collections.abc import MutableMapping
+from typing import Any, Callable, Dict, Iterable, List, Optional, Union
+
+import numpy as np
+
+import logging
+logger = logging.getLogger(__name__)
+
+from .write_input import format_statements
+
+PathType = Union[pathlib.Path, str]
+
+def _as_column(values, n : int) -> np.ndarray:
+    column = np.asarray(values)
+    if column.ndim != 1 or len(column) != n:
+        raise ValueError(f"column of length {n} expected")
+    if column.dtype.kind in "US":
+        #fixed width strings take width*n, keep one object per unique string
+        unique, inverse = np.unique(column, return_inverse = True)
+        column = unique.astype(object)[inverse.reshape(-1)]
+    return column
+
+def _fit(column : np.ndarray, value) -> np.ndarray:
+    # column with a dtype the value can be assigned to without loss
+    if column.dtype == object:
+        return column
+    kind = np.asarray(value).dtype
+    if kind.kind in "USO" or (column.dtype.kind == "b") != (kind.kind == "b"):
+        #keep the python type, e.g. booleans are written as true/false
+        return column.astype(object)
+    if not np.can_cast(kind, column.dtype, "same_kind") or kind.kind != column.dtype.kind:
+        return column.astype(np.result_type(column.dtype, kind))
+    return column
+
+def _python_scalar(value):
+    return value.item() if isinstance(value, np.generic) else value
+
+class InputRow(MutableMapping):
+    """View of one calculation of an InputTable, behaves like InputItemClass.
+    Assigning a value writes to the table, aliases of the table are attributes."""
+    def __init__(self, table : "InputTable", index : int):
+        object.__setattr__(self, "_table", table)
+        object.__setattr__(self, "_index", index)
+
+    def __getitem__(self, key):
+        return self._table._value(key, self._index)
+
+    def __setitem__(self, key, value):
+        self._table._set_value(key, self._index, value)
+
+    def __delitem__(self, key):
+        raise TypeError("the keys are shared by all the rows of an InputTable")
+
+    def __iter__(self):
+        return iter(self._table.schema)
+
+    def __len__(self):
+        return len(self._table.schema)
+
+    def __getattr__(self, name):
+        aliases = self._table.aliases
+        if name in aliases:
+            return self[aliases[name]]
+        raise AttributeError(name)
+
+    def __setattr__(self, name, value):
+        if name in self._table.aliases:
+            self[self._table.aliases[name]] = value
+        else:
+            raise AttributeError(f"'{name}' is not an alias of the table")
+
+    def __str__(self) -> str:
+        return "".join(format_statements(k, v) for k, v in self.items())
+
+    def __repr__(self) -> str:
+        return f"InputRow({dict(self)})"
+
+    def to_item(self, properties : Dict = {}):
+        """Copy as an input_class.InputItemClass"""
+        from .input_class import InputItemClass
+        return InputItemClass(dict(self), properties)
+
+class InputTable:
+    """Columnar container of the calculations of a sweep. The keys are stored once,
+    constant fields as scalars and varying fields as numpy columns,
+    strings as object columns sharing one object per unique value.
+
+    Example:
+        table = InputTable.from_records(parse_file_resolved("sweep.in"))
+        table = table[table["lat:1G:n_layers"] > 100]
+        table.write("large.in")
+
+    Args:
+        columns (dict): key -> scalar or sequence with one value per calculation
+        n (int, optional): number of calculations, required if all the fields are constant
+        aliases (dict, optional): attribute name -> key, available on the rows
+    """
+    def __init__(
+            self,
+            columns : Dict[str, Any],
+            n : Optional[int] = None,
+            aliases : Optional[Dict[str, str]] = None,
+            ):
+        if n is None:
+            lengths = {len(v) for v in columns.values() if np.ndim(v) == 1}
+            if len(lengths) > 1:
+                raise ValueError("columns have different lengths")
+            n = lengths.pop() if lengths else 1
+        self.n = n
+        self.aliases = dict(aliases or {})
+        self.schema = list(columns.keys())
+        self.constants = {}
+        self.columns = {}
+        for k, v in columns.items():
+            if np.ndim(v) == 1 and not isinstance(v, str):
+                self.columns[k] = _as_column(v, n)
+            else:
+                self.constants[k] = _python_scalar(v)
+
+    @classmethod
+    def from_records(cls, records : Iterable[Dict], **kwargs) -> "InputTable":
+        """Table of a list of dicts, e.g. an InputListClass or parse_file result.
+        Keys missing in a record are None, a key with the same value in every
+        record is stored as a constant."""
+        records = list(records)
+        keys = {}
+        for record in records:
+            keys.update(dict.fromkeys(record))
+        columns = {}
+        for k in keys:
+            values = [record.get(k) for record in records]
+            first = values[0]
+            if all(v == first and type(v) is type(first) for v in values):
+                columns[k] = first
+            else:
+                kinds = {type(v) for v in values}
+                if kinds <= {int, float} or kinds == {bool}:
+                    column = np.asarray(values)
+                else:
+                    column = np.empty(len(values), dtype = object)
+                    column[:] = values
+                columns[k] = column
+        return cls(columns, n = len(records), **kwargs)
+
+    @classmethod
+    def from_grid(cls, dl : Dict, **kwargs) -> "InputTable":
+        """Table of all the combinations of the list valued parameters,
+        in itertools.product order"""
+        axes = {k : np.asarray(v) for k, v in dl.items() if isinstance(v, list)}
+        columns = dict(dl)
+        n = 1
+        if axes:
+            mesh = np.meshgrid(*axes.values(), indexing = "ij")
+            columns.update({k : m.reshape(-1) for k, m in zip(axes, mesh)})
+            n = mesh[0].size
+        return cls(columns, n = n, **kwargs)
+
+    def __len__(self) -> int:
+        return self.n
+
+    def keys(self) -> List[str]:
+        return list(self.schema)
+
+    def varying(self) -> List[str]:
+        """Keys stored as columns"""
+        return [k for k in self.schema if k in self.columns]
+
+    def column(self, key : str) -> np.ndarray:
+        """Values of a key for every calculation"""
+        if key in self.columns:
+            return self.columns[key]
+        value = self.constants[key]
+        if isinstance(value, (bool, int, float)):
+            return np.full(self.n, value)
+        column = np.empty(self.n, dtype = object)
+        column[:] = value
+        return column
+
+    def _value(self, key : str, index : int):
+        if key in self.columns:
+            return _python_scalar(self.columns[key][index])
+        return self.constants[key]
+
+    def _set_value(self, key : str, index : int, value):
+        if key not in self.schema:
+            self.schema.append(key)
+            self.constants[key] = None
+        if key not in self.columns:
+            if self.constants[key] == value:
+                return
+            self.columns[key] = self.column(key)
+            del self.constants[key]
+        self.columns[key] = _fit(self.columns[key], value)
+        self.columns[key][index] = value
+
+    def __getitem__(self, index):
+        """key -> column, int -> InputRow, slice, indices or boolean mask -> InputTable"""
+        if isinstance(index, str):
+            return self.column(index)
+        if isinstance(index, (int, np.integer)):
+            if index < 0:
+                index = index + self.n
+            if not 0 <= index < self.n:
+                raise IndexError("calculation index out of range")
+            return InputRow(self, int(index))
+        if isinstance(index, slice):
+            n = len(range(*index.indices(self.n)))
+        else:
+            index = np.asarray(index)
+            n = int(index.sum()) if index.dtype == bool else len(index)
+        columns = {
+            k : self.columns[k][index] if k in self.columns else self.constants[k]
+            for k in self.schema
+            }
+        return InputTable(columns, n = n, aliases = self.aliases)
+
+    def __setitem__(self, key : str, value):
+        """Set a column or a constant"""
+        if key not in self.schema:
+            self.schema.append(key)
+        self.columns.pop(key, None)
+        self.constants.pop(key, None)
+        if np.ndim(value) == 1 and not isinstance(value, str):
+            self.columns[key] = _as_column(value, self.n)
+        else:
+            self.constants[key] = _python_scalar(value)
+
+    def __iter__(self):
+        for i in range(self.n):
+            yield InputRow(self, i)
+
+    def filter(self, condition : Callable[["InputTable"], np.ndarray]) -> "InputTable":
+        """Calculations where condition(table) is True
+
+        Example:
+            table.filter(lambda t: (t["mol:pol:theta"] > 1) & (t["lat:1G:n_layers"] == 100))
+        """
+        return self[np.asarray(condition(self), dtype = bool)]
+
+    def _rows(self, keys : List[str]):
+        if not keys:
+            #all the fields are constant, every calculation is the base
+            return itertools.repeat((), self.n)
+        return zip(*[self.columns[k].tolist() for k in keys])
+
+    def template(self):
+        """input_class.InputTemplate with the constants and the first row as the base,
+        constants equal to None are left out"""
+        from .input_class import InputTemplate
+        base = {k : self._value(k, 0) for k in self.schema if self.constants.get(k, 0) is not None}
+        return InputTemplate(base, self.varying())
+
+    def write(self, filename : PathType, delta : bool = True, **kwargs) -> int:
+        """Write the calculations to an sfbox input file,
+        see input_class.InputTemplate.write
+
+        Args:
+            filename (PathType): input file
+            delta (bool, optional): write the constants only in the first calculation.
+                Defaults to True.
+
+        Raises:
+            ValueError: a column has missing (None) values
+
+        Returns:
+            int: number of calculations written
+        """
+        missing = [
+            k for k, column in self.columns.items()
+            if column.dtype == object and any(v is None for v in column)
+            ]
+        if missing:
+            raise ValueError(f"columns {missing} have missing values, use read_input.ResolvedInput records")
+        logger.info(f"{self.n} calculations are written to {filename}")
+        return self.template().write(filename, self._rows(self.varying()), delta = delta, **kwargs)
+
+    def to_records(self) -> List[Dict]:
+        """List of dicts, one per calculation"""
+        columns = [
+            self.columns[k].tolist() if k in self.columns else itertools.repeat(self.constants[k], self.n)
+            for k in self.schema
+            ]
+        return [dict(zip(self.schema, row)) for row in zip(*columns)]
+
+    def to_dataframe(self):
+        """pandas DataFrame with one row per calculation"""
+        import pandas as pd
+        return pd.DataFrame({k : self.column(k) for k in self.schema})
+
+    def memory_usage(self) -> int:
+        """Bytes held by the columns, objects shared by several rows counted once"""
+        total = 0
+        for column in self.columns.values():
+            total = total + column.nbytes
+            if column.dtype == object:
+                unique = {id(v) : v for v in column}
+                total = total + sum(v.__sizeof__() for v in unique.values())
+        return total
@@ -0,0 +1,74 @@
+import pathlib
+import json
+import os
+from datetime import datetime
+from typing import Dict, List, Optional, Union
+
+PathType = Union[pathlib.Path, str]
+
+ledger_fields = [
+    "input", "start", "wall_time", "user_time", "system_time", "max_rss", "returncode"
+    ]
+
+def wait_rusage(proc, block = True):
+    """Wait for a child process with os.wait4 to collect its resource usage.
+    The return code is set to the Popen object,
+    the usage includes the processes the child waited for (e.g. sfbox started by sh).
+
+    Args:
+        proc (subprocess.Popen): child process
+        block (bool, optional): If set to False returns immediately
+            if the child is still running. Defaults to True.
+
+    Returns:
+        resource.struct_rusage or None: resource usage of a finished child,
+            None if it is still running
+    """
+    pid, status, rusage = os.wait4(proc.pid, 0 if block else os.WNOHANG)
+    if pid == 0:
+        return None
+    proc.returncode = os.waitstatus_to_exitcode(status)
+    return rusage
+
+def run_record(
+        filename : PathType,
+        start : datetime,
+        wall_time : float,
+        rusage = None,
+        returncode : Optional[int] = None,
+        **extra
+        ) -> Dict:
+    """Create a ledger record of a finished sfbox run
+
+    Args:
+        filename (PathType): input file
+        start (datetime): time the run started
+        wall_time (float): wall time in seconds
+        rusage (resource.struct_rusage, optional): resource usage of the child
+        returncode (int, optional): return code of the child
+        **extra: additional fields to store
+
+    Returns:
+        dict: record, max_rss is in kilobytes
+    """
+    record = dict(
+        input = pathlib.Path(filename).name,
+        start = start.isoformat(),
+        wall_time = wall_time,
+        user_time = None if rusage is None else rusage.ru_utime,
+        system_time = None if rusage is None else rusage.ru_stime,
+        max_rss = None if rusage is None else rusage.ru_maxrss,
+        returncode = returncode,
+        )
+    record.update(extra)
+    return record
+
+def append_record(ledger : PathType, record : Dict):
+    """Append a record to a json lines ledger"""
+    with open(ledger, "a") as f:
+        f.write(json.dumps(record)+"\n")
+
+def read_ledger(ledger : PathType) -> List[Dict]:
+    """Read all records from a json lines ledger"""
+    with open(ledger) as f:
+        return [json.loads(line) for line in f if line.strip()]
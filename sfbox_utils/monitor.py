@@ -0,0 +1,124 @@
+import pathlib
+import re
+from typing import List, Optional, Tuple, Union
+
+import logging
+logger = logging.getLogger(__name__)
+
+PathType = Union[pathlib.Path, str]
+
+_NUMBER = r"([-+]?(?:\d+\.?\d*|\.\d+)(?:[eEdD][-+]?\d+)?)"
+
+class MonitorRules:
+    """Rules to abort a running sfbox job from its Newton progress.
+    A job is considered diverging if the residual grows divergence_factor
+    times above the best residual reached, stagnating if the best residual
+    did not improve by stagnation_ratio during stagnation_iterations iterations.
+    The rules are applied after min_iterations.
+
+    Args:
+        max_iterations (int, optional): abort after this iteration. Defaults to None.
+        divergence_factor (float, optional): Defaults to 1e3.
+        stagnation_iterations (int, optional): Defaults to 1000.
+        stagnation_ratio (float, optional): Defaults to 0.9.
+        min_iterations (int, optional): Defaults to 50.
+    """
+    def __init__(
+            self,
+            max_iterations : Optional[int] = None,
+            divergence_factor : Optional[float] = 1e3,
+            stagnation_iterations : Optional[int] = 1000,
+            stagnation_ratio : float = 0.9,
+            min_iterations : int = 50,
+            ):
+        self.max_iterations = max_iterations
+        self.divergence_factor = divergence_factor
+        self.stagnation_iterations = stagnation_iterations
+        self.stagnation_ratio = stagnation_ratio
+        self.min_iterations = min_iterations
+
+    def check(self, history : List[Tuple[int, float]]) -> Optional[str]:
+        """Check the progress of a job
+
+        Args:
+            history (list): (iteration, residual) pairs of the current calculation
+                in the order they were printed
+
+        Returns:
+            str or None: reason to abort the job, None to let it run
+        """
+        if not history:
+            return None
+        iteration, residual = history[-1]
+        if self.max_iterations is not None and iteration > self.max_iterations:
+            return f"iteration {iteration} exceeds {self.max_iterations}"
+        if iteration < self.min_iterations:
+            return None
+        _, best = min(history, key = lambda h: abs(h[1]))
+        if self.divergence_factor is not None and abs(residual) > self.divergence_factor*abs(best):
+            return f"residual {residual:g} at iteration {iteration} diverged from {best:g}"
+        if self.stagnation_iterations is not None:
+            #the best residual before the stagnation window
+            earlier = [abs(r) for i, r in history if i <= iteration - self.stagnation_iterations]
+            if earlier and abs(best) > self.stagnation_ratio*min(earlier):
+                return f"residual stagnates at {best:g} for {self.stagnation_iterations} iterations"
+        return None
+
+class LogMonitor:
+    """Tails the log of a running sfbox job and parses iteration number and residual
+    from the lines printed by the Newton solver. The patterns are regular expressions
+    with one group each, both must be found in a line. The history starts again
+    when the iteration number goes down, at the next calculation of the input file.
+
+    Args:
+        log (PathType): log file being written by sfbox
+        rules (MonitorRules, optional): rules to apply. Defaults to MonitorRules().
+        iteration_pattern (str, optional): pattern of the iteration number.
+        residual_pattern (str, optional): pattern of the residual.
+    """
+    def __init__(
+            self,
+            log : PathType,
+            rules : Optional[MonitorRules] = None,
+            iteration_pattern : str = r"\b(?:iterations?|iter|it|i)\s*[=:]\s*(\d+)",
+            residual_pattern : str = r"(?:\|g\||residual|resid|accuracy|error)\s*[=:]\s*"+_NUMBER,
+            ):
+        self.log = pathlib.Path(log)
+        self.rules = MonitorRules() if rules is None else rules
+        self.iteration_pattern = re.compile(iteration_pattern, re.IGNORECASE)
+        self.residual_pattern = re.compile(residual_pattern, re.IGNORECASE)
+        self.offset = 0
+        self.partial = ""
+        self.history = []
+
+    def read(self):
+        """Parse the lines appended to the log since the last call"""
+        try:
+            with open(self.log, "rb") as f:
+                f.seek(self.offset)
+                data = f.read()
+        except FileNotFoundError:
+            return
+        self.offset = self.offset + len(data)
+        lines = (self.partial + data.decode(errors = "replace")).split("\n")
+        #the last line may be incomplete
+        self.partial = lines.pop()
+        for line in lines:
+            iteration = self.iteration_pattern.search(line)
+            residual = self.residual_pattern.search(line)
+            if iteration and residual:
+                value = float(residual.group(1).replace("d", "e").replace("D", "e"))
+                number = int(iteration.group(1))
+                if self.history and number < self.history[-1][0]:
+                    #the next calculation of the input file
+                    self.history = []
+                self.history.append((number, value))
+
+    def poll(self) -> Optional[str]:
+        """Read the new lines and apply the rules
+
+        Returns:
+            str or None: reason to abort the job, None to let it run
+        """
+        self.read()
+        return self.rules.check(self.history)
@@ -0,0 +1,258 @@
+import pathlib
+import os
+import json
+import heapq
+from typing import Dict, List, Optional, Tuple, Union
+
+import logging
+logger = logging.getLogger(__name__)
+
+from .read_input import parse_file
+from .write_input import write_input_file
+from .schedule import RuntimeHistory, estimate_cost
+
+PathType = Union[pathlib.Path, str]
+
+def pack_jobs(
+        files : List[PathType],
+        n_batches : int,
+        history : Optional[RuntimeHistory] = None,
+        max_cost : Optional[float] = None,
+        ) -> List[List[pathlib.Path]]:
+    """Distribute input files into n_batches with balanced predicted run time,
+    the longest job is assigned to the least loaded batch first.
+    Jobs with schedule.estimate_cost above max_cost are not packed,
+    every one of them gets a batch of its own.
+
+    Args:
+        files (list): sfbox input files
+        n_batches (int): number of batches of the small jobs
+        history (RuntimeHistory, optional): past run times used for prediction
+        max_cost (float, optional): largest estimated cost of a packed job,
+            None to pack all jobs. Defaults to None.
+
+    Returns:
+        list: batches, lists of input files, empty batches are dropped
+    """
+    if history is None:
+        history = RuntimeHistory()
+    predicted = []
+    large = []
+    for filename in files:
+        filename = pathlib.Path(filename)
+        cost = estimate_cost(filename)
+        if max_cost is not None and cost > max_cost:
+            large.append([filename])
+            continue
+        predicted.append((history.predict(filename.name, cost), filename))
+    predicted.sort(key = lambda p: p[0], reverse = True)
+
+    batches = large + [[] for _ in range(max(1, n_batches))]
+    #(load, batch index)
+    loads = [(0.0, i) for i in range(len(large), len(batches))]
+    for cost, filename in predicted:
+        load, i = heapq.heappop(loads)
+        batches[i].append(filename)
+        heapq.heappush(loads, (load + cost, i))
+    return [batch for batch in batches if batch]
+
+def write_batch(
+        files : List[PathType],
+        batch_filename : PathType,
+        ) -> Dict:
+    """Concatenate the calculations of several input files into one input file.
+    The output statements are redirected to batch output files with the name
+    of the batch and the suffix of the original output, every job appends
+    to them. A manifest to split
+    the batch output back is written next to the batch with '.json' suffix.
+    sfbox keeps settings from one calculation to the next, a warning is logged
+    if a job does not set a parameter set by an earlier job of the batch.
+
+    Args:
+        files (list): sfbox input files of the jobs
+        batch_filename (PathType): batch input file to create
+
+    Returns:
+        dict: manifest
+    """
+    batch_filename = pathlib.Path(batch_filename)
+    blocks = []
+    jobs = []
+    batch_keys = set()
+    for filename in files:
+        filename = pathlib.Path(filename)
+        job_blocks = parse_file(filename)
+        job_keys = set()
+        outputs = {}
+        for block in job_blocks:
+            job_keys.update(block)
+            redirected = {}
+            appended = []
+            for key, value in block.items():
+                type_, name, parameter = key.split(":", 2)
+                if type_ == "output":
+                    outputs[name] = None
+                    batch_output = f"{batch_filename.stem}{pathlib.Path(name).suffix}"
+                    key = f"output:{batch_output}:{parameter}"
+                    if parameter == "append":
+                        value = True
+                    appended.append(batch_output)
+                redirected[key] = value
+            #the next job must not overwrite the outputs of the previous ones
+            for batch_output in appended:
+                redirected[f"output:{batch_output}:append"] = True
+            blocks.append(redirected)
+        leaked = {
+            k for k in batch_keys - job_keys if not k.startswith("output:")
+            }
+        if leaked:
+            logger.warning(f"{filename.name} inherits {sorted(leaked)} from the previous jobs in the batch")
+        batch_keys.update(job_keys)
+        jobs.append(dict(
+            input = str(filename),
+            outputs = [str(filename.parent / name) for name in outputs],
+            calculations = len(job_blocks),
+            ))
+    write_input_file(batch_filename, blocks)
+    manifest = dict(batch = str(batch_filename), jobs = jobs)
+    with open(batch_filename.with_suffix(".json"), "w") as f:
+        json.dump(manifest, f, indent = 1)
+    return manifest
+
+def _output_sections(batch_output : pathlib.Path, n : int) -> Tuple[List[str], List[List[str]]]:
+    # (shared header, output of every calculation) of an output appended by n calculations
+    with open(batch_output) as f:
+        lines = f.readlines()
+    if not lines:
+        return [], []
+    if batch_output.suffix == ".out":
+        #'ana' output, every calculation is terminated by 'system delimiter'
+        sections = [[]]
+        for line in lines:
+            sections[-1].append(line)
+            if line.rstrip('\r\n') == "system delimiter":
+                sections.append([])
+        return [], [section for section in sections if section]
+    #other outputs repeat their header for every calculation, or ('kal')
+    #have a single header and a row per calculation
+    header = lines[0]
+    starts = [i for i, line in enumerate(lines) if line == header]
+    if len(starts) > 1 or n == 1:
+        return [], [lines[i:j] for i, j in zip(starts, starts[1:] + [len(lines)])]
+    return [header], [[row] for row in lines[1:]]
+
+def split_batch_output(manifest : Dict, suffix : Optional[str] = None):
+    """Split the outputs of a batch back into the outputs of the jobs.
+    The calculations are assigned to the jobs in order. sfbox keeps writing
+    an output once it is set, so an output gets the calculations from the first
+    job setting it on, the calculations of the jobs without it are dropped.
+
+    Args:
+        manifest (dict): manifest returned by write_batch
+        suffix (str, optional): output suffix to split, e.g. '.out'.
+            Defaults to all suffixes of the job outputs.
+
+    Returns:
+        list: job outputs written
+    """
+    if suffix is None:
+        suffixes = list(dict.fromkeys(
+            pathlib.Path(o).suffix for job in manifest["jobs"] for o in job["outputs"]
+            ))
+    else:
+        suffixes = [suffix]
+    written = []
+    for suffix in suffixes:
+        batch_output = pathlib.Path(manifest["batch"]).with_suffix(suffix)
+        if not batch_output.is_file():
+            continue
+        declared = [
+            any(pathlib.Path(o).suffix == suffix for o in job["outputs"]) for job in manifest["jobs"]
+            ]
+        if not any(declared):
+            continue
+        n = sum(job["calculations"] for job in manifest["jobs"][declared.index(True):])
+        header, sections = _output_sections(batch_output, n)
+        sections = iter(sections)
+        started = False
+        for job in manifest["jobs"]:
+            targets = [pathlib.Path(o) for o in job["outputs"] if pathlib.Path(o).suffix == suffix]
+            if not (targets or started):
+                continue
+            started = True
+            job_sections = [section for _, section in zip(range(job["calculations"]), sections)]
+            if len(job_sections) < job["calculations"]:
+                logger.warning(f"Batch output {batch_output.name} ended before {job['input']} was complete")
+                break
+            for target in targets:
+                with open(target, "w") as f:
+                    f.writelines(header)
+                    for section in job_sections:
+                        f.writelines(section)
+                written.append(target)
+    return written
+
+def sfbox_calls_packed(
+        files : Optional[List[PathType]] = None,
+        dir : PathType = None,
+        n_batches : Optional[int] = None,
+        history : Optional[RuntimeHistory] = None,
+        max_cost : Optional[float] = 1e6,
+        **kwargs,
+        ) -> List[Dict]:
+    """Run many small jobs packed into n_batches batch input files,
+    one sfbox process per batch instead of one per job, and split
+    the outputs back, so that every job still gets its own output file.
+    The batches are written to 'batches' subdirectory and processed with
+    call.sfbox_calls_subprocess.
+
+    Args:
+        files (list, optional): input files. Defaults to all '*.in' files in dir.
+        dir (PathType, optional): directory with input files.
+            Defaults to the working directory.
+        n_batches (int, optional): number of batches. Defaults to conf['cpu_count'].
+        history (RuntimeHistory, optional): past run times used for balancing
+        max_cost (float, optional): jobs with schedule.estimate_cost above it
+            run in batches of their own, None to pack all jobs. Defaults to 1e6,
+            e.g. a 1G lattice of 1000 layers with 1000 segments.
+        **kwargs: passed to call.sfbox_calls_subprocess
+
+    Returns:
+        list: outcome of every job, dicts with 'input', 'batch', 'status', 'outputs'
+    """
+    from .call import sfbox_calls_subprocess, conf
+    if dir is None:
+        dir = os.getcwd()
+    dir = pathlib.Path(dir)
+    if files is None:
+        files = sorted(dir.glob("*.in"))
+    if n_batches is None:
+        n_batches = conf['cpu_count']
+    batch_dir = dir / "batches"
+    batch_dir.mkdir(exist_ok = True)
+    #the whole directory is run, nothing may be left from an earlier packing
+    for stale in batch_dir.glob("batch_*"):
+        if stale.is_file():
+            stale.unlink()
+
+    manifests = {}
+    for i, batch in enumerate(pack_jobs(files, n_batches, history, max_cost)):
+        batch_filename = batch_dir / f"batch_{i:04d}.in"
+        manifests[batch_filename.name] = write_batch(batch, batch_filename)
+    logger.info(f"{len(files)} jobs are packed into {len(manifests)} batches")
+
+    batch_outcomes = sfbox_calls_subprocess(batch_dir, **kwargs)
+
+    outcomes = []
+    for batch_outcome in batch_outcomes:
+        manifest = manifests[batch_outcome["input"]]
+        outputs = split_batch_output(manifest)
+        for job in manifest["jobs"]:
+            job_outputs = [o for o in job["outputs"] if pathlib.Path(o) in outputs]
+            outcomes.append(dict(
+                input = pathlib.Path(job["input"]).name,
+                batch = batch_outcome["input"],
+                status = batch_outcome["status"],
+                outputs = job_outputs,
+                ))
+    return outcomes
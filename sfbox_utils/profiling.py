@@ -0,0 +1,198 @@
+"""Timing and byte counters of the stages of an ingest.
+
+Code marks a stage with
+    with profiling.stage("hdf5_write") as s:
+        ...
+        if s: s.nbytes = size
+and every registered hook receives an event
+    hook(stage, seconds, nbytes, calculation, calls).
+With no hook registered stage() returns a shared no-op object.
+
+Example:
+    with profiling.profile() as p:
+        store_files_parallel(files)
+    print(p.report())
+"""
+import time
+import itertools
+import contextlib
+from typing import Callable, Dict, List, Optional, Tuple
+
+import logging
+logger = logging.getLogger(__name__)
+
+HookType = Callable[[str, float, int, Optional[str], int], None]
+
+_hooks : List[HookType] = []
+#label of the calculation the events belong to
+_calculation : Optional[str] = None
+
+def enabled() -> bool:
+    """True if any hook is registered"""
+    return bool(_hooks)
+
+def register_hook(hook : HookType):
+    _hooks.append(hook)
+
+def unregister_hook(hook : HookType):
+    _hooks.remove(hook)
+
+def set_calculation(label : Optional[str]):
+    """Label the following events with a calculation, None to clear"""
+    global _calculation
+    _calculation = label
+
+def record(stage : str, seconds : float = 0.0, nbytes : int = 0, calls : int = 1):
+    """Send an event to the hooks, calls = 0 adds bytes or time to a stage without counting a call"""
+    for hook in _hooks:
+        hook(stage, seconds, nbytes, _calculation, calls)
+
+class _NullStage:
+    __slots__ = ()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        return False
+
+    def __bool__(self):
+        return False
+
+    def __setattr__(self, name, value):
+        pass
+
+_NULL_STAGE = _NullStage()
+
+class _Stage:
+    __slots__ = ("name", "nbytes", "start")
+
+    def __init__(self, name : str, nbytes : int):
+        self.name = name
+        self.nbytes = nbytes
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *args):
+        record(self.name, time.perf_counter() - self.start, self.nbytes)
+        return False
+
+def stage(name : str, nbytes : int = 0):
+    """Context manager timing a stage, a no-op if profiling is disabled.
+    The object it returns is true only if profiling is enabled,
+    its nbytes attribute can be set inside the block."""
+    if not _hooks:
+        return _NULL_STAGE
+    return _Stage(name, nbytes)
+
+def timed_iter(iterable, name : str, label : Optional[Callable[[int], str]] = None):
+    """Iterate recording the time every item takes to produce as stage name.
+    label(i) sets the calculation label before item i is produced."""
+    if not _hooks:
+        yield from iterable
+        return
+    iterator = iter(iterable)
+    for i in itertools.count():
+        if label is not None:
+            set_calculation(label(i))
+        start = time.perf_counter()
+        try:
+            item = next(iterator)
+        except StopIteration:
+            set_calculation(None)
+            return
+        record(name, time.perf_counter() - start)
+        yield item
+
+class Recorder:
+    """Hook keeping the events in a list, e.g. to send them from a worker process"""
+    def __init__(self):
+        self.events = []
+
+    def __call__(self, stage, seconds, nbytes, calculation, calls):
+        self.events.append((stage, seconds, nbytes, calculation, calls))
+
+def replay(events : List[Tuple]):
+    """Send events recorded elsewhere to the hooks of this process"""
+    for stage, seconds, nbytes, calculation, calls in events:
+        for hook in _hooks:
+            hook(stage, seconds, nbytes, calculation, calls)
+
+def call_recorded(func : Callable, *args, **kwargs) -> Tuple:
+    """Run func in a worker process with a Recorder as the only hook
+
+    Returns:
+        tuple: (result of func, events)
+    """
+    global _hooks
+    saved = _hooks
+    recorder = Recorder()
+    _hooks = [recorder]
+    try:
+        result = func(*args, **kwargs)
+    finally:
+        _hooks = saved
+    return result, recorder.events
+
+class Profile:
+    """Hook aggregating the events per stage and optionally per calculation
+
+    Args:
+        per_calculation (bool, optional): keep seconds by stage for every
+            calculation label. Defaults to False.
+    """
+    def __init__(self, per_calculation : bool = False):
+        self.per_calculation = per_calculation
+        #stage -> [calls, seconds, bytes, max seconds]
+        self.stages = {}
+        #calculation -> stage -> seconds
+        self.calculations = {}
+
+    def __call__(self, stage, seconds, nbytes, calculation, calls):
+        s = self.stages.get(stage)
+        if s is None:
+            s = self.stages[stage] = [0, 0.0, 0, 0.0]
+        s[0] = s[0] + calls
+        s[1] = s[1] + seconds
+        s[2] = s[2] + nbytes
+        if seconds > s[3]:
+            s[3] = seconds
+        if self.per_calculation and calculation is not None:
+            c = self.calculations.setdefault(calculation, {})
+            c[stage] = c.get(stage, 0.0) + seconds
+
+    def stats(self) -> Dict[str, Dict]:
+        """calls, seconds, bytes and max_seconds of every stage"""
+        return {
+            stage : dict(calls = s[0], seconds = s[1], bytes = s[2], max_seconds = s[3])
+            for stage, s in self.stages.items()
+            }
+
+    def report(self) -> str:
+        """Table of the stages sorted by the time spent"""
+        total = sum(s[1] for s in self.stages.values())
+        lines = [f"{'stage':<20}{'calls':>10}{'total s':>12}{'mean ms':>12}{'max ms':>12}{'MB':>10}{'share':>8}"]
+        for stage, (calls, seconds, nbytes, max_seconds) in sorted(self.stages.items(), key = lambda s: -s[1][1]):
+            mean = 1e3*seconds/calls if calls else 0.0
+            share = seconds/total if total else 0.0
+            lines.append(
+                f"{stage:<20}{calls:>10}{seconds:>12.3f}{mean:>12.3f}{1e3*max_seconds:>12.3f}"
+                f"{nbytes/2**20:>10.2f}{share:>8.1%}"
+                )
+        return "\n".join(lines)
+
+@contextlib.contextmanager
+def profile(per_calculation : bool = False):
+    """Enable profiling inside the block
+
+    Yields:
+        Profile: the aggregated events
+    """
+    p = Profile(per_calculation)
+    register_hook(p)
+    try:
+        yield p
+    finally:
+        unregister_hook(p)
@@ -1,11 +1,18 @@
 import pathlib
+import itertools
+import bisect
+from collections import ChainMap
+from collections.abc import Mapping, Sequence
 
-from typing import List
+from typing import Dict, List, Optional
 from typing import Union
 
+import logging
+logger = logging.getLogger(__name__)
+
 from enum import Enum, auto
 
-from .utils import try_cast_to_numeric, ld_to_dl
+from .utils import try_cast_to_numeric, ld_to_dl, dl_to_ld
 
 class ParseError(ValueError):
     pass
@@ -163,3 +170,198 @@ def parse_file(
         blocks = ld_to_dl(blocks)
     return blocks
 #%%
+
+def _normalize_parameter(key : str) -> str:
+    return ":".join(word.strip() for word in key.split(":"))
+
+def _normalize_value(value):
+    if isinstance(value, list):
+        return [_normalize_value(v) for v in value]
+    if value is False:
+        value = 'false'
+    elif value is True:
+        value = 'true'
+    return try_cast_to_numeric(str(value))
+
+def verify_input_file(
+        file : Union[str, pathlib.Path],
+        data : Union[Dict, List[Dict]],
+        product = False,
+        ) -> bool:
+    """Verify that the parameters sfbox reconstructs from an input file,
+    keeping the settings from one calculation to the next, are the same
+    as the ones of the data it was written from (e.g. in delta mode
+    by write_input.write_input_file).
+
+    Args:
+        file (str | pathlib.Path): sfbox input file
+        data (dict | list[dict]): statements the file was written from
+        product (bool, optional): see write_input.write_input_file
+
+    Returns:
+        bool: True if every calculation has the same parameters in effect
+    """
+    if isinstance(data, Dict):
+        data = dl_to_ld(data, product=product, repeat_keys=False)
+    from_file = {}
+    from_data = {}
+    n = 0
+    for i, (block, d) in enumerate(itertools.zip_longest(parse_file(file), data)):
+        if block is None or d is None:
+            logger.warning(f"Number of calculations differ, {i} are compared")
+            return False
+        from_file.update(block)
+        from_data.update({_normalize_parameter(k) : _normalize_value(v) for k, v in d.items()})
+        if from_file != from_data:
+            keys = {
+                k for k in from_file.keys() | from_data.keys()
+                if from_file.get(k) != from_data.get(k)
+                }
+            logger.warning(f"Calculation {i} differs in {sorted(keys)}")
+            return False
+        n = i + 1
+    logger.debug(f"{n} calculations are verified")
+    return True
+
+def output_files(
+        file : Union[str, pathlib.Path],
+        types : List[str] = ("ana",),
+        ) -> List[pathlib.Path]:
+    """Output files declared in an input file with
+    'output : filename : type : ...' statements.
+    An input without output statements gets the default '<input>.out' output.
+
+    Args:
+        file (str | pathlib.Path): sfbox input file
+        types (list, optional): output types to return, None for all.
+            Defaults to ("ana",).
+
+    Returns:
+        list: paths of the output files relative to the input file directory
+    """
+    file = pathlib.Path(file)
+    outputs = []
+    declared = False
+    for block in parse_file(file):
+        for key, value in block.items():
+            type_, name, parameter = key.split(":", 2)
+            if type_ != "output":
+                continue
+            declared = True
+            if parameter != "type":
+                continue
+            if isinstance(value, list):
+                value = value[-1]
+            if types is not None and value not in types:
+                continue
+            output = file.parent / name
+            if output not in outputs:
+                outputs.append(output)
+    if not declared and (types is None or "ana" in types):
+        outputs.append(file.with_suffix(".out"))
+    return outputs
+
+
+class _Resolved(Mapping):
+    # parameters in effect for one calculation, looked up in the blocks
+    def __init__(self, resolved : "ResolvedInput", index : int):
+        self._resolved = resolved
+        self._index = index
+
+    def __getitem__(self, key):
+        changes = self._resolved.changes.get(key)
+        if changes is None:
+            raise KeyError(key)
+        i = bisect.bisect_right(changes, self._index) - 1
+        if i < 0:
+            raise KeyError(key)
+        return self._resolved.blocks[changes[i]][key]
+
+    def __iter__(self):
+        return (k for k, changes in self._resolved.changes.items() if changes[0] <= self._index)
+
+    def __len__(self) -> int:
+        return sum(1 for _ in self)
+
+class ResolvedInput(Sequence):
+    """Parameters in effect for every calculation of an input file.
+    sfbox keeps the settings from one calculation to the next, only the
+    statements written are kept with the blocks where every parameter changes,
+    item k looks a parameter up in the last block up to k that sets it.
+    The memory is proportional to the statements written, a lookup takes
+    O(log n) for n changes of the parameter.
+
+    Example:
+        resolved = parse_file_resolved("sweep.in")
+        resolved[1000]["lat:1G:n_layers"]
+        df = resolved.to_dataframe()
+
+    Args:
+        blocks (list): parsed blocks, see parse_file
+    """
+    def __init__(self, blocks : List[Dict]):
+        self.blocks = blocks
+        #key -> indices of the blocks setting it, in order of appearance
+        self.changes = {}
+        for i, block in enumerate(blocks):
+            for k in block:
+                self.changes.setdefault(k, []).append(i)
+
+    def __len__(self) -> int:
+        return len(self.blocks)
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            return [self[i] for i in range(*index.indices(len(self)))]
+        if index < 0:
+            index = index + len(self)
+        if not 0 <= index < len(self):
+            raise IndexError("calculation index out of range")
+        #writes go to a new map, the parsed blocks are shared
+        return ChainMap({}, _Resolved(self, index))
+
+    def changed(self, index : int) -> Dict:
+        """Statements written explicitly in calculation index"""
+        return self.blocks[index]
+
+    def keys(self) -> List[str]:
+        """Every parameter set in the file, in order of appearance"""
+        return list(self.changes)
+
+    def columns(self) -> Dict[str, List]:
+        """Effective value of every parameter for every calculation,
+        None before a parameter is set for the first time"""
+        n = len(self.blocks)
+        columns = {}
+        for k, changes in self.changes.items():
+            column = [None]*changes[0]
+            for start, stop in zip(changes, changes[1:] + [n]):
+                column.extend([self.blocks[start][k]]*(stop - start))
+            columns[k] = column
+        return columns
+
+    def to_dataframe(self, columns : Optional[List[str]] = None):
+        """pandas DataFrame with one row per calculation and one column per parameter
+
+        Args:
+            columns (list, optional): parameters to export. Defaults to all.
+        """
+        import pandas as pd
+        data = self.columns()
+        if columns is not None:
+            data = {k : data.get(k, [None]*len(self)) for k in columns}
+        return pd.DataFrame(data)
+
+def parse_file_resolved(
+        file : Union[str, pathlib.Path],
+        **kwargs) -> ResolvedInput:
+    """Parse an input file and resolve the parameters in effect
+    for every calculation, see ResolvedInput
+
+    Args:
+        file (str | pathlib.Path): sfbox input file
+
+    Returns:
+        ResolvedInput: effective parameters by calculation index
+    """
+    return ResolvedInput(parse_file(file, **kwargs))
@@ -1,7 +1,10 @@
 import pathlib
-from typing import List, Union
+import gzip
+from typing import Dict, Iterable, List, Tuple, Union
 from enum import Enum, auto
 
+import numpy as np
+
 import logging
 logger = logging.getLogger(__name__)
 
@@ -173,7 +176,11 @@ def parse_file(
 
     __SKIP__ = True
 
-    f = open(file)
+    #outputs copied back from a scratch directory may be gzip compressed
+    if str(file).endswith(".gz"):
+        f = gzip.open(file, "rt")
+    else:
+        f = open(file)
     #to collect all lines of current block
     lines = []
     #to store vector name
@@ -274,4 +281,132 @@ def parse_file(
     if lines:
         if to_dict:
             lines = dict((key, val) for k in lines for key, val in k.items())
-        yield lines
\ No newline at end of file
+        yield lines
+
+
+class _ColumnBuffer:
+    # growing typed column, the values are converted when appended
+    def __init__(self):
+        self.data = None
+        self.present = np.zeros(0, dtype = bool)
+
+    def _kind(self, value) -> str:
+        if isinstance(value, (bool, np.bool_)):
+            return "b"
+        if isinstance(value, (int, np.integer)):
+            return "i"
+        if isinstance(value, (float, np.floating)):
+            return "f"
+        return "O"
+
+    def _grow(self, size : int):
+        capacity = max(size, 2*len(self.present), 64)
+        data = np.empty(capacity, dtype = self.data.dtype)
+        data[:len(self.data)] = self.data
+        present = np.zeros(capacity, dtype = bool)
+        present[:len(self.present)] = self.present
+        self.data, self.present = data, present
+
+    def append(self, row : int, value):
+        kind = self._kind(value)
+        if self.data is None:
+            self.data = np.empty(0, dtype = {"b" : bool, "i" : np.int64, "f" : float, "O" : object}[kind])
+        elif kind != self.data.dtype.kind and self.data.dtype.kind != "O":
+            #an int fits a float column as it is, only an int column is upcast, once
+            if kind == "f" and self.data.dtype.kind == "i":
+                self.data = self.data.astype(float)
+            elif not (kind == "i" and self.data.dtype.kind == "f"):
+                self.data = self.data.astype(object)
+        if row >= len(self.present):
+            self._grow(row + 1)
+        self.data[row] = value
+        self.present[row] = True
+
+    def finish(self, n : int) -> np.ndarray:
+        if len(self.present) < n:
+            self._grow(n)
+        data, present = self.data[:n], self.present[:n]
+        if present.all():
+            return data
+        if data.dtype.kind in "if":
+            data = data.astype(float)
+            data[~present] = np.nan
+        else:
+            data = data.astype(object)
+            data[~present] = None
+        return data
+
+def parse_to_columns(
+        calculations : Union[Iterable[Dict], str, pathlib.Path],
+        profiles : str = "padded",
+        fill_value = np.nan,
+        **kwargs,
+        ) -> Tuple[Dict[str, np.ndarray], Dict]:
+    """Collect parsed calculations column by column, without a list of dicts.
+    Scalars go to typed numpy columns (numbers missing in a calculation are NaN,
+    other values None), vectors and profiles are stacked per key.
+
+    Args:
+        calculations (iterable | path): parse_file iterator or an output file to parse
+        profiles (str, optional): 'padded' gives a 2d array per key padded with fill_value,
+            'ragged' gives a tuple (values, offsets), the values of calculation i
+            are values[offsets[i]:offsets[i+1]]. Defaults to "padded".
+        fill_value (optional): padding of the shorter profiles. Defaults to np.nan.
+        **kwargs: passed to parse_file if a file is given
+
+    Returns:
+        tuple: (scalar columns, profiles)
+    """
+    if profiles not in ("padded", "ragged"):
+        raise ValueError("profiles must be 'padded' or 'ragged'")
+    if isinstance(calculations, (str, pathlib.Path)):
+        calculations = parse_file(calculations, **kwargs)
+    scalars = {}
+    #key -> (rows, arrays)
+    vectors = {}
+    n = 0
+    for row, calculation in enumerate(calculations):
+        for key, value in calculation.items():
+            if isinstance(value, (np.ndarray, list)):
+                rows, arrays = vectors.setdefault(key, ([], []))
+                rows.append(row)
+                arrays.append(np.asarray(value, dtype = float))
+            else:
+                try:
+                    scalars[key].append(row, value)
+                except KeyError:
+                    scalars[key] = _ColumnBuffer()
+                    scalars[key].append(row, value)
+        n = row + 1
+    columns = {key : buffer.finish(n) for key, buffer in scalars.items()}
+    stacked = {}
+    for key, (rows, arrays) in vectors.items():
+        lengths = np.zeros(n, dtype = np.int64)
+        lengths[rows] = [len(a) for a in arrays]
+        values = np.concatenate(arrays) if arrays else np.zeros(0)
+        if profiles == "ragged":
+            offsets = np.zeros(n + 1, dtype = np.int64)
+            np.cumsum(lengths, out = offsets[1:])
+            stacked[key] = (values, offsets)
+        else:
+            padded = np.full((n, lengths.max(initial = 0)), fill_value, dtype = float)
+            padded[np.arange(padded.shape[1]) < lengths[:, None]] = values
+            stacked[key] = padded
+    logger.debug(f"{n} calculations are collected to {len(columns)} columns and {len(stacked)} profiles")
+    return columns, stacked
+
+def parse_to_dataframe(
+        calculations : Union[Iterable[Dict], str, pathlib.Path],
+        profiles : str = "padded",
+        fill_value = np.nan,
+        **kwargs,
+        ):
+    """pandas DataFrame of the scalars of parsed calculations and the stacked profiles,
+    see parse_to_columns
+
+    Returns:
+        tuple: (pd.DataFrame, profiles)
+    """
+    import pandas as pd
+    columns, stacked = parse_to_columns(calculations, profiles, fill_value, **kwargs)
+    return pd.DataFrame(columns, copy = False), stacked
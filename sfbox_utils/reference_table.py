@@ -73,6 +73,28 @@ try:
     def create_reference_table(storage_dir):        
         dataframe = pd.DataFrame(create_reference_dict(storage_dir))
         return dataframe
+
+    def join_ledger(
+            dataframe : pd.DataFrame,
+            ledger : Union[pathlib.Path, str],
+            on : str = "sys:noname:inputfile",
+        ):
+        """Join the run ledger written by sfbox_call onto a reference table
+        by the input file name. The last run of each input is used.
+
+        Args:
+            dataframe (pd.DataFrame): reference table
+            ledger (path-like object): run ledger file
+            on (str, optional): column with the input file name.
+                Defaults to "sys:noname:inputfile".
+
+        Returns:
+            pd.DataFrame: reference table with the ledger columns
+        """
+        from .ledger import read_ledger
+        ledger_df = pd.DataFrame(read_ledger(ledger)).drop_duplicates("input", keep="last")
+        input_name = dataframe[on].map(lambda x: pathlib.Path(str(x)).name)
+        return dataframe.assign(input = input_name).merge(ledger_df, on="input", how="left")
             
 except ModuleNotFoundError:
     pass
\ No newline at end of file
@@ -0,0 +1,142 @@
+import pathlib
+import shutil
+from typing import Callable, Dict, List, Optional, Union
+
+import logging
+logger = logging.getLogger(__name__)
+
+from .read_input import parse_file
+from .write_input import write_input_file
+from .utils import read_initial_guess_file, write_initial_guess, newton_names
+from .guess import lattice_shape
+
+PathType = Union[pathlib.Path, str]
+RelaxRoutineArgType = Optional[Callable[[Dict, int], Dict]]
+GuessRoutineArgType = Optional[Callable[[pathlib.Path, List[pathlib.Path]], Optional[Dict]]]
+
+def relax_newton(fields : Dict, attempt : int) -> Dict:
+    """Default relaxation of the solver settings for a retry:
+    the tolerance is increased tenfold and deltamax is halved
+    (0.05 is set if deltamax was not given).
+
+    Args:
+        fields (dict): parameters of a calculation
+        attempt (int): number of the retry, starting from 1
+
+    Returns:
+        dict: relaxed parameters
+    """
+    for name in newton_names(fields):
+        tolerance = f"newton:{name}:tolerance"
+        if isinstance(fields.get(tolerance), (int, float)):
+            fields[tolerance] = fields[tolerance]*10
+        deltamax = f"newton:{name}:deltamax"
+        if isinstance(fields.get(deltamax), (int, float)):
+            fields[deltamax] = fields[deltamax]/2
+        else:
+            fields[deltamax] = 0.05
+    return fields
+
+def _guess_output_file(filename : pathlib.Path, blocks : List[Dict]) -> Optional[pathlib.Path]:
+    guess_file = None
+    for block in blocks:
+        for key, value in block.items():
+            if key.startswith("newton:") and key.endswith(":initial_guess_output_file"):
+                guess_file = filename.parent / str(value)
+    return guess_file
+
+def _distance(a : Dict, b : Dict) -> float:
+    shared = [
+        k for k in a.keys() & b.keys()
+        if isinstance(a[k], (int, float)) and isinstance(b[k], (int, float))
+        and not isinstance(a[k], bool)
+        ]
+    distance = 0.0
+    for k in shared:
+        scale = max(abs(a[k]), abs(b[k]), 1e-12)
+        distance = distance + ((a[k]-b[k])/scale)**2
+    #different non numeric parameters make a point far away
+    distance = distance + sum(
+        1.0 for k in a.keys() & b.keys() if k not in shared and a[k] != b[k]
+        )
+    return distance
+
+def neighbour_guess(
+        filename : PathType,
+        converged : List[PathType]
+        ) -> Optional[Dict]:
+    """Initial guess of the converged calculation closest in parameters
+    to the given one. The converged inputs must have written
+    an initial guess output file (newton:...:initial_guess_output_file).
+    Only guesses on the same lattice are returned.
+
+    Args:
+        filename (PathType): input file to find a guess for
+        converged (list): input files of the converged calculations
+
+    Returns:
+        dict or None: initial guess as read by utils.read_initial_guess_file
+    """
+    filename = pathlib.Path(filename)
+    target = {}
+    for block in parse_file(filename):
+        target.update(block)
+    candidates = []
+    for other in converged:
+        other = pathlib.Path(other)
+        blocks = parse_file(other)
+        guess_file = _guess_output_file(other, blocks)
+        if guess_file is None or not guess_file.is_file():
+            continue
+        fields = {}
+        for block in blocks:
+            fields.update(block)
+        candidates.append((_distance(target, fields), guess_file))
+    shape = None
+    if any(k.startswith("lat:") and ":n_layers" in k for k in target):
+        #the guess shape includes the boundary layers
+        shape, _ = lattice_shape(target)
+    for _, guess_file in sorted(candidates, key = lambda c: c[0]):
+        guess = read_initial_guess_file(guess_file)
+        if shape is None or tuple(guess["gradients"][1:]) == shape:
+            logger.info(f"{guess_file.name} is used as initial guess for {filename.name}")
+            return guess
+    return None
+
+def rewrite_for_retry(
+        filename : PathType,
+        attempt : int,
+        relax_routine : RelaxRoutineArgType = relax_newton,
+        guess : Optional[Dict] = None,
+        ):
+    """Rewrite an input file for a retry. The original file is kept
+    with '.orig' suffix appended. Every calculation in the file
+    is relaxed with relax_routine, the guess is written next to the input
+    with utils.write_initial_guess and set as the initial guess
+    of the first calculation.
+
+    Args:
+        filename (PathType): input file
+        attempt (int): number of the retry, starting from 1
+        relax_routine (callable, optional): relax_routine(fields, attempt)
+            returns relaxed parameters of a calculation. Defaults to relax_newton.
+        guess (dict, optional): initial guess. Defaults to None.
+    """
+    filename = pathlib.Path(filename)
+    original = filename.with_name(filename.name+".orig")
+    if not original.is_file():
+        shutil.copy(filename, original)
+    blocks = parse_file(filename)
+    if relax_routine is not None:
+        blocks = [relax_routine(block, attempt) for block in blocks]
+    if guess is not None:
+        guess_file = filename.with_suffix(".retry.ig")
+        write_initial_guess(guess_file, guess)
+        fields = {}
+        for block in blocks:
+            fields.update(block)
+        for name in newton_names(fields, "isaac"):
+            blocks[0][f"newton:{name}:initial_guess"] = "file"
+            blocks[0][f"newton:{name}:initial_guess_input_file"] = guess_file.name
+    write_input_file(filename, blocks)
+    logger.info(f"{filename.name} is rewritten for retry {attempt}")
@@ -0,0 +1,178 @@
+import pathlib
+import json
+import math
+from typing import Dict, List, Optional, Union
+
+import logging
+logger = logging.getLogger(__name__)
+
+from .read_input import parse_file
+
+PathType = Union[pathlib.Path, str]
+
+def composition_length(composition : str) -> int:
+    """Count segments in sfbox composition string,
+    e.g. '(pae)1(pa)98(pao)1' -> 100, '((A)1(B)2)10' -> 30.
+    Side chains in square brackets are counted as written.
+
+    Args:
+        composition (str): composition of a molecule
+
+    Returns:
+        int: number of segments
+    """
+    stack = [0]
+    i = 0
+    n = len(composition)
+    while i < n:
+        c = composition[i]
+        i = i + 1
+        if c == '(':
+            stack.append(0)
+        elif c == ')':
+            j = i
+            while j < n and composition[j].isdigit():
+                j = j + 1
+            count = int(composition[i:j]) if j > i else 1
+            i = j
+            if len(stack) < 2:
+                raise ValueError(f"Unbalanced brackets in composition {composition}")
+            inner = stack.pop()
+            #a group without nested groups is a monomer
+            stack[-1] = stack[-1] + (inner or 1)*count
+    return stack[0]
+
+def _last(value):
+    if isinstance(value, list):
+        return value[-1]
+    return value
+
+def calculation_features(fields : Dict) -> Dict:
+    """Extract the features affecting sfbox run time from the parameters
+    of a calculation, as returned by read_input.parse_file
+
+    Args:
+        fields (dict): calculation parameters
+
+    Returns:
+        dict: 'cells' - number of lattice sites,
+            'segments' - total number of segments in all molecules,
+            'molecules' - number of molecules,
+            'gradients' - lattice dimensionality
+    """
+    cells = 1
+    segments = 0
+    molecules = 0
+    gradients = 1
+    for key, value in fields.items():
+        type_, _, parameter = key.split(":", 2)
+        value = _last(value)
+        if type_ == "lat":
+            if parameter.startswith("n_layers"):
+                cells = cells*int(value)
+            elif parameter == "gradients":
+                gradients = int(value)
+        elif type_ == "mol" and parameter == "composition":
+            segments = segments + composition_length(str(value))
+            molecules = molecules + 1
+    return dict(cells = cells, segments = segments, molecules = molecules, gradients = gradients)
+
+def estimate_cost(filename : PathType) -> float:
+    """Estimate relative cost of an sfbox input file.
+    The cost of one Newton iteration scales as the number of lattice sites
+    times the number of segments to propagate, the file cost is a sum
+    over all the calculations in the file. Settings are inherited
+    from the previous calculations as sfbox does.
+
+    Args:
+        filename (PathType): sfbox input file
+
+    Returns:
+        float: cost in arbitrary units
+    """
+    cost = 0
+    fields = {}
+    for block in parse_file(filename):
+        fields.update(block)
+        features = calculation_features(fields)
+        cost = cost + features["cells"]*max(features["segments"], 1)
+    return float(cost)
+
+class RuntimeHistory:
+    """Past sfbox run times stored as json lines
+    {"name" : input file name, "cost" : estimated cost, "runtime" : seconds}.
+    The run time of a new job is predicted with a power law
+    runtime = a*cost**b fitted to the history,
+    the last run time is used for the inputs that were already run.
+    """
+    def __init__(self, filename : Optional[PathType] = None):
+        self.filename = None if filename is None else pathlib.Path(filename)
+        self.records = []
+        if self.filename is not None and self.filename.is_file():
+            with open(self.filename) as f:
+                self.records = [json.loads(line) for line in f if line.strip()]
+        self._fit = None
+
+    def record(self, name : str, cost : float, runtime : float):
+        record = dict(name = str(name), cost = cost, runtime = runtime)
+        self.records.append(record)
+        self._fit = None
+        if self.filename is not None:
+            with open(self.filename, "a") as f:
+                f.write(json.dumps(record)+"\n")
+
+    def fit(self):
+        if self._fit is not None:
+            return self._fit
+        points = [
+            (math.log(r["cost"]), math.log(r["runtime"]))
+            for r in self.records if r["cost"]>0 and r["runtime"]>0
+            ]
+        if not points:
+            self._fit = (1.0, 1.0)
+        else:
+            n = len(points)
+            mean_x = sum(p[0] for p in points)/n
+            mean_y = sum(p[1] for p in points)/n
+            var_x = sum((p[0]-mean_x)**2 for p in points)
+            if var_x == 0:
+                b = 1.0
+            else:
+                b = sum((p[0]-mean_x)*(p[1]-mean_y) for p in points)/var_x
+            a = math.exp(mean_y - b*mean_x)
+            self._fit = (a, b)
+        return self._fit
+
+    def predict(self, name : str, cost : float) -> float:
+        for r in reversed(self.records):
+            if r["name"] == str(name):
+                return r["runtime"]
+        a, b = self.fit()
+        return a*cost**b
+
+def order_longest_first(
+        files : List[PathType],
+        history : Optional[RuntimeHistory] = None
+        ) -> List[pathlib.Path]:
+    """Sort input files by their predicted run time, longest first.
+    Dispatching the longest jobs first reduces the makespan of a pool.
+    Files that can not be parsed are placed first.
+
+    Args:
+        files (list): sfbox input files
+        history (RuntimeHistory, optional): past run times used for prediction
+
+    Returns:
+        list: sorted files
+    """
+    if history is None:
+        history = RuntimeHistory()
+    predicted = {}
+    for filename in files:
+        filename = pathlib.Path(filename)
+        try:
+            predicted[filename] = history.predict(filename.name, estimate_cost(filename))
+        except Exception as e:
+            logger.warning(f"Can not estimate the cost of {filename.name}, {e}")
+            predicted[filename] = math.inf
+    return sorted(predicted, key = predicted.get, reverse = True)
@@ -0,0 +1,89 @@
+import pathlib
+import shutil
+import tempfile
+import gzip
+from typing import Union
+
+import logging
+logger = logging.getLogger(__name__)
+
+from .read_input import parse_file
+
+PathType = Union[pathlib.Path, str]
+
+class ScratchDir:
+    """Per-job scratch directory, e.g. on /dev/shm or a local SSD.
+    The input file and the initial guess files it reads are copied
+    into the scratch directory, sfbox runs there and the files it creates
+    are copied (or gzip compressed, except the '.ig' initial guesses)
+    back next to the input file.
+
+    Example:
+        with ScratchDir(filename, "/dev/shm") as scratch:
+            sfbox_call(scratch.input)
+    """
+    def __init__(self, filename : PathType, root : PathType, compress : bool = False):
+        self.filename = pathlib.Path(filename)
+        self.root = pathlib.Path(root)
+        self.compress = compress
+        self.dir = None
+        self.input = None
+        self.staged = set()
+
+    def stage_in(self) -> pathlib.Path:
+        """Create the scratch directory and copy the input files into it
+
+        Returns:
+            pathlib.Path: input file in the scratch directory
+        """
+        self.root.mkdir(parents = True, exist_ok = True)
+        self.dir = pathlib.Path(tempfile.mkdtemp(prefix = self.filename.stem+"_", dir = self.root))
+        files = [self.filename.name]
+        for block in parse_file(self.filename):
+            for key, value in block.items():
+                if key.startswith("newton:") and key.endswith(":initial_guess_input_file"):
+                    files.append(str(value))
+        for name in files:
+            source = self.filename.parent / name
+            if pathlib.Path(name).is_absolute() or not source.is_file():
+                continue
+            target = self.dir / name
+            target.parent.mkdir(parents = True, exist_ok = True)
+            shutil.copy(source, target)
+            self.staged.add(target)
+        self.input = self.dir / self.filename.name
+        logger.debug(f"{self.filename.name} is staged to {self.dir}")
+        return self.input
+
+    def stage_out(self):
+        """Copy the files created in the scratch directory back
+        next to the input file"""
+        if self.dir is None:
+            return
+        for source in self.dir.rglob("*"):
+            if not source.is_file() or source in self.staged:
+                continue
+            target = self.filename.parent / source.relative_to(self.dir)
+            target.parent.mkdir(parents = True, exist_ok = True)
+            #initial guesses are read by the next runs, they are not compressed
+            if self.compress and source.suffix != ".ig":
+                with open(source, "rb") as f_in, gzip.open(target.with_name(target.name+".gz"), "wb") as f_out:
+                    shutil.copyfileobj(f_in, f_out)
+            else:
+                shutil.copy(source, target)
+
+    def cleanup(self):
+        """Remove the scratch directory"""
+        if self.dir is not None:
+            shutil.rmtree(self.dir, ignore_errors = True)
+            self.dir = None
+
+    def __enter__(self):
+        self.stage_in()
+        return self
+
+    def __exit__(self, *args):
+        try:
+            self.stage_out()
+        finally:
+            self.cleanup()
@@ -2,11 +2,19 @@
 
 # The script runs up to 'cpu_count' sfbox processes in parallel, 
 # until all files with mask '*.in' are processed.
+# If the third argument is given, the file names (without extension)
+# are read from this file ('-' for the standard input) in the given order
+# instead of find command.
 
 cpu_count=$1
 executable=$2
+queue=$3
 echo "running sfbox with multiple input files"
 echo "max processes: $cpu_count"
 echo "executable path: $executable"
-find . -type f -iname "*.in" -execdir sh -c 'printf "%s\n" "${0%.*}"' {} ';' | xargs -I{} -P $cpu_count sh -c "echo started {}; $executable {}.in > {}.log; echo done {};"
+if [ -n "$queue" ]; then
+    cat "$queue"
+else
+    find . -type f -iname "*.in" -execdir sh -c 'printf "%s\n" "${0%.*}"' {} ';'
+fi | xargs -I{} -P $cpu_count sh -c "echo started {}; $executable {}.in > {}.log; echo done {};"
 echo "Done!"
\ No newline at end of file
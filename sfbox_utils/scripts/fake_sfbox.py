@@ -0,0 +1,102 @@
+#!/usr/bin/env python3
+"""Stand-in for sfbox to test and benchmark the pools without solver time.
+
+    fake_sfbox.py [--sleep SECONDS] input.in
+
+For every calculation of the input it prints Newton iteration lines
+spread over the sleep time and writes a calculation with random profiles
+(the layout of sfbox_utils.synthetic) to the 'ana' output files of the input.
+The first and the last lines printed carry the wall clock time,
+'fake_sfbox started <time>' and 'fake_sfbox finished <time>'.
+Only the standard library is used, so the start up time stays low.
+
+Environment variables, --sleep takes precedence:
+    FAKE_SFBOX_SLEEP        seconds to sleep per input file, default 0
+    FAKE_SFBOX_ITERATIONS   iteration lines per calculation, default 10
+    FAKE_SFBOX_RETURNCODE   exit status, default 0
+    FAKE_SFBOX_OUTPUT       0 to not write the output files, default 1
+"""
+import time
+STARTED = time.time()
+
+import os
+import sys
+import random
+
+def parse_input(filename):
+    """Calculations of an input file as lists of (type, name, parameter, value),
+    the statements of the previous calculations are kept as sfbox does"""
+    calculations = []
+    current = {}
+    with open(filename) as f:
+        for line in f:
+            line = line.strip()
+            if line == "start":
+                calculations.append(list(current.values()))
+                continue
+            parts = [part.strip() for part in line.split(":")]
+            if len(parts) < 4:
+                continue
+            type_, name, parameter = parts[:3]
+            current[(type_, name, parameter)] = (type_, name, parameter, ":".join(parts[3:]))
+    return calculations
+
+def lattice_size(statements):
+    values = {parameter : value for type_, _, parameter, value in statements if type_ == "lat"}
+    if "n_layers_x" in values:
+        return (int(values["n_layers_x"]) + 2)*(int(values["n_layers_y"]) + 2)
+    return int(values.get("n_layers", 10)) + 2
+
+def calculation_text(index, statements, input_name):
+    lines = [f"sys : noname : inputfile : {input_name}", f"sys : noname : calculation : {index}"]
+    for type_, name, parameter, value in statements:
+        #read_output takes lines with 'profile' for vector names
+        if type_ != "output":
+            lines.append(f"{type_} : {name} : {parameter} : {value}")
+    lines.append(f"newton : isaac : iterations : {random.randint(10, 1000)}")
+    lines.append(f"newton : isaac : accuracy : {random.uniform(1e-9, 1e-7):.6e}")
+    lines.append(f"sys : noname : free energy : {random.gauss(0, 1):.12e}")
+    size = lattice_size(statements)
+    monomers = sorted({name for type_, name, _, _ in statements if type_ == "mon"})
+    for monomer in monomers:
+        lines.append(f"mon : {monomer} : phi : profile")
+        lines.extend(f"{random.random():.12e}" for _ in range(size))
+    lines.append("system delimiter")
+    return "\n".join(lines) + "\n"
+
+def main(argv):
+    sleep = float(os.environ.get("FAKE_SFBOX_SLEEP", 0))
+    if len(argv) > 2 and argv[0] == "--sleep":
+        sleep = float(argv[1])
+        argv = argv[2:]
+    if len(argv) != 1:
+        print(__doc__, file = sys.stderr)
+        return 2
+    iterations = int(os.environ.get("FAKE_SFBOX_ITERATIONS", 10))
+    returncode = int(os.environ.get("FAKE_SFBOX_RETURNCODE", 0))
+    write_output = os.environ.get("FAKE_SFBOX_OUTPUT", "1") != "0"
+
+    print(f"fake_sfbox started {STARTED:.6f}", flush = True)
+    filename = argv[0]
+    calculations = parse_input(filename)
+    step = sleep/max(len(calculations)*iterations, 1)
+    outputs = {}
+    for index, statements in enumerate(calculations):
+        for iteration in range(1, iterations + 1):
+            if step > 0:
+                time.sleep(step)
+            print(f"i = {iteration} |g| = {10.0**(-iteration):.6e}", flush = True)
+        if not write_output:
+            continue
+        for type_, name, parameter, value in statements:
+            if type_ == "output" and parameter == "type" and value == "ana":
+                text = calculation_text(index, statements, filename)
+                outputs.setdefault(name, []).append(text)
+    for name, texts in outputs.items():
+        with open(name, "w") as f:
+            f.writelines(texts)
+    print(f"fake_sfbox finished {time.time():.6f}", flush = True)
+    return returncode
+
+if __name__ == "__main__":
+    sys.exit(main(sys.argv[1:]))
@@ -43,6 +43,8 @@ except ModuleNotFoundError:
 
 from .read_output import parse_file
 from .utils import get_number_of_calculations_in_file, split_calculations
+from .utils import read_initial_guess_file, write_initial_guess
+from . import profiling
 
 ProcessRoutineArgType = Optional[Callable[[Dict[str, Any]], Dict[str, Any]]]
 NamingRoutineArgType = Optional[Callable[[Dict[str, Any]], str]]
@@ -59,7 +61,8 @@ def store_calculation(
     naming_routine :  NamingRoutineArgType = None,
     on_file_exist : str = "rename",
     on_process_error : str = "raise",
-    suffix : str = ".h5"
+    suffix : str = ".h5",
+    initial_guess : Optional[Dict] = None,
         ):
     
     if on_file_exist not in on_file_exist_parameters:
@@ -73,33 +76,37 @@ def store_calculation(
         dir = pathlib.Path(dir)
 
     if process_routine is not None:
-        if on_process_error == "ignore":
-            try:
+        with profiling.stage("process_routine"):
+            if on_process_error == "ignore":
+                try:
+                    data = process_routine(data)
+                except Exception as e:
+                    log.error(f"Process routine raised an error {e}, the calculation is skipped")
+                    return False
+            else:
                 data = process_routine(data)
-            except Exception as e:
-                log.error(f"Process routine raised an error {e}, the calculation is skipped")
-                return False
-        else:
-            data = process_routine(data)
 
-    if naming_routine is not None:
-        filename = naming_routine(data)+suffix
-    else:
-        #if no naming routine provided fallback to uuid
-        filename = str(uuid.uuid4())+suffix
+    with profiling.stage("naming_routine"):
+        if naming_routine is not None:
+            filename = naming_routine(data)+suffix
+        else:
+            #if no naming routine provided fallback to uuid
+            filename = str(uuid.uuid4())+suffix
     filename = pathlib.Path(filename)
 
-    is_file_exists = (dir/filename).is_file()
+    with profiling.stage("exists_check"):
+        is_file_exists = (dir/filename).is_file()
     mode = "w"
     if is_file_exists:
         msg_header = f"File {filename} already exists"
         
         if on_file_exist == "rename":
             i = 0
-            while is_file_exists:
-                filename = filename.with_stem(str(filename.stem)+f"_{i}")
-                i = i+1
-                is_file_exists = (dir/filename).is_file()
+            with profiling.stage("exists_check"):
+                while is_file_exists:
+                    filename = filename.with_stem(str(filename.stem)+f"_{i}")
+                    i = i+1
+                    is_file_exists = (dir/filename).is_file()
             log.warning(f"{msg_header}, the file will be renamed to {filename}")
 
         elif on_file_exist=="add_timestamp":
@@ -119,22 +126,110 @@ def store_calculation(
             log.warning(f"{msg_header}, previous version will be kept")
             return True
 
-    h5file = h5py.File(dir/filename, mode = mode)
-    log.info(f"File {filename} is created")
+    with profiling.stage("hdf5_write") as stage:
+        h5file = h5py.File(dir/filename, mode = mode)
+        log.info(f"File {filename} is created")
 
 
-    scalars = {k : v for k, v in data.items() if not isinstance(v, np.ndarray)}
-    datasets = {k : v for k, v in data.items() if isinstance(v, np.ndarray)}
-    
-    for k, v in scalars.items():
-        h5file.attrs.create(k,v)
+        scalars = {k : v for k, v in data.items() if not isinstance(v, np.ndarray)}
+        datasets = {k : v for k, v in data.items() if isinstance(v, np.ndarray)}
+        
+        for k, v in scalars.items():
+            h5file.attrs.create(k,v)
+
+        for k, v in datasets.items():
+            h5file.create_dataset(name=k, data=v)
 
-    for k, v in datasets.items():
-        h5file.create_dataset(name=k, data=v)
-    h5file.close()
+        if initial_guess is not None:
+            store_initial_guess(h5file, initial_guess)
+        h5file.close()
+        if stage:
+            stage.nbytes = (dir/filename).stat().st_size
     return True
 
 
+def store_initial_guess(h5file : h5py.File, initial_guess : Dict, name : str = "initial_guess"):
+    """Save an initial guess (see utils.read_initial_guess_file) to a group
+    of an opened HDF5 file, the states are stored as datasets"""
+    group = h5file.require_group(name)
+    group.attrs.create("gradients", np.array(initial_guess["gradients"]))
+    group.attrs.create("phibulk solvent", initial_guess["phibulk solvent"])
+    state = group.require_group("state")
+    #keep the order of the molecules in the file
+    state.attrs.create("order", np.array(list(initial_guess["state"].keys()), dtype = h5py.string_dtype()))
+    for molecule, values in initial_guess["state"].items():
+        state.create_dataset(name = molecule, data = np.ravel(values))
+    alphabulk = group.require_group("alphabulk")
+    for molecule, value in initial_guess["alphabulk"].items():
+        alphabulk.attrs.create(molecule, value)
+
+
+def load_initial_guess(h5file : Union[PathType, h5py.File], name : str = "initial_guess", reshape = False) -> Dict:
+    """Initial guess saved with the calculation, the same dict
+    as utils.read_initial_guess_file returns
+
+    Args:
+        h5file (PathType | h5py.File): stored calculation
+        name (str, optional): group name. Defaults to "initial_guess".
+        reshape (bool, optional): reshape the states to 2d. Defaults to False.
+
+    Raises:
+        KeyError: no initial guess in the file
+    """
+    close_before_exit = not isinstance(h5file, h5py.File)
+    if close_before_exit:
+        h5file = h5py.File(h5file, mode = "r")
+    try:
+        group = h5file[name]
+        gradients = tuple(int(i) for i in group.attrs["gradients"])
+        state = group["state"]
+        molecules = {}
+        for molecule in state.attrs["order"]:
+            molecule = molecule.decode() if isinstance(molecule, bytes) else str(molecule)
+            values = state[molecule][()]
+            if reshape:
+                values = np.reshape(values, gradients[1:])
+            molecules[molecule] = values
+        alphabulk = {k : float(v) for k, v in group["alphabulk"].attrs.items()}
+        return {
+            "state" : molecules,
+            "phibulk solvent" : float(group.attrs["phibulk solvent"]),
+            "alphabulk" : alphabulk,
+            "gradients" : gradients,
+            }
+    finally:
+        if close_before_exit:
+            h5file.close()
+
+
+def rebuild_initial_guess_file(h5file : Union[PathType, h5py.File], filename : PathType, name : str = "initial_guess"):
+    """Write the initial guess saved with a calculation to an sfbox initial guess file"""
+    write_initial_guess(filename, load_initial_guess(h5file, name))
+
+
+def _initial_guess_file(calculation : Dict, dir : pathlib.Path) -> Optional[pathlib.Path]:
+    # initial guess file written by sfbox at the end of the calculation
+    for k, v in calculation.items():
+        if k.startswith("newton:") and k.endswith(":initial_guess_output_file"):
+            return dir / str(v)
+    return None
+
+
+def _with_initial_guesses(reader, guess_dir : pathlib.Path):
+    # sfbox rewrites the initial guess file after every calculation, only the last
+    # calculation writing to a file can be paired with it
+    previous = None
+    for calculation in reader:
+        if previous is not None:
+            guess = _initial_guess_file(previous, guess_dir)
+            if guess == _initial_guess_file(calculation, guess_dir):
+                guess = None
+            yield previous, guess
+        previous = calculation
+    if previous is not None:
+        yield previous, _initial_guess_file(previous, guess_dir)
+
+
 def store_file_sequential(
     file : PathType,
     dir : PathType = None, 
@@ -143,40 +238,62 @@ def store_file_sequential(
     reader_kwargs : dict = {},
     on_file_exist : str = "rename",
     on_process_error : str = "raise",
-    suffix : str = ".h5"
+    suffix : str = ".h5",
+    store_guess : bool = False,
+    guess_dir : PathType = None,
     ):
+    """Store every calculation of an sfbox output file to its own HDF5 file.
+    With store_guess the initial guess file written by sfbox
+    ('newton : ... : initial_guess_output_file') is saved with the calculation,
+    see load_initial_guess. sfbox rewrites this file after every calculation,
+    so it is saved only with the last calculation that writes to it.
+    guess_dir is where the initial guess files are, defaults to the output file directory."""
     file = pathlib.Path(file)
     if dir is None:
         dir = (file.parent / "h5_files")
         dir.mkdir(parents=True, exist_ok=True)
     else:
         dir = pathlib.Path(dir)
-    reader = parse_file(file, **reader_kwargs)
+    guess_dir = file.parent if guess_dir is None else pathlib.Path(guess_dir)
+    reader = profiling.timed_iter(parse_file(file, **reader_kwargs), "parse", label = lambda i: f"{file.name}#{i}")
+    if store_guess:
+        reader = _with_initial_guesses(reader, guess_dir)
+    else:
+        reader = ((calculation, None) for calculation in reader)
+
+    if profiling.enabled():
+        #bytes parsed, not a call
+        profiling.record("parse", nbytes = file.stat().st_size, calls = 0)
+
+    def store(calculation, guess):
+        initial_guess = None
+        if guess is not None:
+            if guess.is_file():
+                with profiling.stage("initial_guess_read", guess.stat().st_size if profiling.enabled() else 0):
+                    initial_guess = read_initial_guess_file(guess)
+            else:
+                log.warning(f"Initial guess file {guess.name} is not found")
+        store_calculation(
+            data = calculation, 
+            dir = dir, 
+            process_routine = process_routine, 
+            naming_routine = naming_routine,
+            on_file_exist = on_file_exist,
+            on_process_error = on_process_error,
+            suffix = suffix,
+            initial_guess = initial_guess,
+            )
+
     n_calculations = get_number_of_calculations_in_file(file)
     if n_calculations>1:
         with logging_redirect_tqdm():
             log.info(f"{n_calculations} calculation(s) in {file.name}...")
-            for calculation in _TQDM_TRY_(reader, total = n_calculations, position=0, leave=True):
-                store_calculation(
-                    data = calculation, 
-                    dir = dir, 
-                    process_routine = process_routine, 
-                    naming_routine = naming_routine,
-                    on_file_exist = on_file_exist,
-                    on_process_error = on_process_error,
-                    suffix = suffix
-                    )
+            for calculation, guess in _TQDM_TRY_(reader, total = n_calculations, position=0, leave=True):
+                store(calculation, guess)
     else:
-        for calculation in reader:
-                store_calculation(
-                    data = calculation, 
-                    dir = dir, 
-                    process_routine = process_routine, 
-                    naming_routine = naming_routine,
-                    on_file_exist = on_file_exist,
-                    on_process_error = on_process_error,
-                    suffix = suffix
-                    )
+        for calculation, guess in reader:
+                store(calculation, guess)
+    profiling.set_calculation(None)
 
 
 def store_files_parallel(
@@ -189,6 +306,8 @@ def store_files_parallel(
         on_file_exist : str = "rename",
         on_process_error : str = "raise",
         suffix : str = ".h5",
+        store_guess : bool = False,
+        guess_dir : PathType = None,
     ):
 
     file = pathlib.Path(files[0])
@@ -205,12 +324,20 @@ def store_files_parallel(
         reader_kwargs = reader_kwargs,
         on_file_exist = on_file_exist,
         on_process_error = on_process_error,
-        suffix = suffix
+        suffix = suffix,
+        store_guess = store_guess,
+        guess_dir = guess_dir,
         )
+    worker = functools.partial(store_file_sequential, **partial_kwargs)
+    if profiling.enabled():
+        #the events of the workers are sent back to the hooks of this process
+        worker = functools.partial(profiling.call_recorded, worker)
     if _TQDM_FOUND_: pbar = tqdm.autonotebook.tqdm(total=len(files), leave=True)
     with logging_redirect_tqdm():
         with mp.Pool(n_jobs) as pool:
-            for _ in pool.imap_unordered(functools.partial(store_file_sequential, **partial_kwargs), files):
+            for result in pool.imap_unordered(worker, files):
+                if profiling.enabled():
+                    profiling.replay(result[1])
                 if _TQDM_FOUND_: pbar.update(1)
     if _TQDM_FOUND_: pbar.close()
         
@@ -226,6 +353,8 @@ def store_file_parallel(
         on_file_exist : str = "rename",
         on_process_error : str = "raise",
         suffix : str = ".h5",
+        store_guess : bool = False,
+        guess_dir : PathType = None,
     ):
     file = pathlib.Path(file)
     if dir is None:
@@ -233,6 +362,8 @@ def store_file_parallel(
         dir.mkdir(parents=True, exist_ok=True)
     else:
         dir = pathlib.Path(dir)
+    #the pieces are split to a temporary directory, the guess is next to the output file
+    guess_dir = file.parent if guess_dir is None else pathlib.Path(guess_dir)
     
     n_calculations = get_number_of_calculations_in_file(file)
     log.info(f"{n_calculations} calculation(s) in {file.name}...")
@@ -240,19 +371,38 @@ def store_file_parallel(
     split_calculations(file)
     
     temp_dir= file.parent / (file.stem+"_tmp")
-    files = list(temp_dir.glob("*.out"))
-
-    store_files_parallel(
-        files=files, 
-        dir=dir, 
-        process_routine = process_routine, 
-        naming_routine = naming_routine, 
-        n_jobs = n_jobs, 
-        reader_kwargs = reader_kwargs,
-        on_file_exist = on_file_exist,
-        on_process_error = on_process_error,
-        suffix = suffix,
-        )
+    #csplit leaves an empty piece after the last delimiter,
+    #the pieces are ordered by number, _1000 sorts before _101 as a string
+    files = sorted(temp_dir.glob("*.out"), key = lambda f: int(f.stem.rsplit("_", 1)[1]))
+    files = [f for f in files if f.stat().st_size > 0]
+
+    parallel_files = files[:-1] if store_guess else files
+    if parallel_files:
+        store_files_parallel(
+            files=parallel_files, 
+            dir=dir, 
+            process_routine = process_routine, 
+            naming_routine = naming_routine, 
+            n_jobs = n_jobs, 
+            reader_kwargs = reader_kwargs,
+            on_file_exist = on_file_exist,
+            on_process_error = on_process_error,
+            suffix = suffix,
+            )
+    if store_guess and files:
+        #the initial guess file is left by the last calculation
+        store_file_sequential(
+            files[-1],
+            dir = dir,
+            process_routine = process_routine,
+            naming_routine = naming_routine,
+            reader_kwargs = reader_kwargs,
+            on_file_exist = on_file_exist,
+            on_process_error = on_process_error,
+            suffix = suffix,
+            store_guess = True,
+            guess_dir = guess_dir,
+            )
 
     shutil.rmtree(temp_dir)
 
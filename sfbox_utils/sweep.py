@@ -0,0 +1,309 @@
+import pathlib
+import os
+import json
+import itertools
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, Dict, Iterable, Iterator, List, Optional, Tuple, Union
+
+import logging
+logger = logging.getLogger(__name__)
+
+from .call import sfbox_call, conf
+from .affinity import CoreAllocator
+from .write_input import write_input_file
+from .utils import read_initial_guess_file, write_initial_guess, newton_names
+
+PathType = Union[pathlib.Path, str]
+GuessRoutineArgType = Optional[Callable[[Dict, Dict], Dict]]
+
+def split_path(path : List, n_chains : int) -> List[List]:
+    """Split an ordered path into n_chains contiguous chains
+    with lengths differing by at most one.
+
+    Args:
+        path (list): ordered points
+        n_chains (int): number of chains
+
+    Returns:
+        list: chains, list of lists
+    """
+    n_chains = max(1, min(n_chains, len(path)))
+    size, remainder = divmod(len(path), n_chains)
+    chains = []
+    start = 0
+    for i in range(n_chains):
+        stop = start + size + (1 if i < remainder else 0)
+        chains.append(path[start:stop])
+        start = stop
+    return chains
+
+def _point_fields(base : Dict, point : Dict, stem : str) -> Dict:
+    fields = {}
+    for key, value in {**base, **point}.items():
+        type_, _, parameter = key.split(":", 2)
+        if type_ == "output":
+            #every point writes to its own output
+            key = f"output:{stem}.out:{parameter}"
+        fields[key] = value
+    for name in newton_names(fields, "isaac"):
+        fields[f"newton:{name}:initial_guess_output_file"] = f"{stem}.ig"
+    return fields
+
+def run_chain(
+        base : Dict,
+        chain : List[Dict],
+        dir : PathType,
+        name : str = "sweep",
+        start_index : int = 0,
+        guess_routine : GuessRoutineArgType = None,
+        cpus = None,
+        ) -> List[Dict]:
+    """Run the points of a chain one after another, every point starts
+    from the solution of the previous converged point.
+    The guess written by sfbox is read with utils.read_initial_guess_file,
+    optionally modified with guess_routine and written as the initial guess
+    of the next point with utils.write_initial_guess.
+
+    Args:
+        base (dict): parameters shared by all the points
+        chain (list): ordered list of dicts with the parameters of every point
+        dir (PathType): working directory
+        name (str, optional): prefix of the file names. Defaults to "sweep".
+        start_index (int, optional): index of the first point
+            in the whole path, used in the file names. Defaults to 0.
+        guess_routine (callable, optional): guess_routine(guess, fields)
+            returns the guess to use for a point with the given parameters.
+            Defaults to None.
+        cpus (set, optional): CPUs to pin the chain to. Defaults to None.
+
+    Returns:
+        list: dicts with 'index', 'input', 'returncode' and 'warm_start'
+    """
+    dir = pathlib.Path(dir)
+    guess = None
+    results = []
+    for i, point in enumerate(chain):
+        index = start_index + i
+        stem = f"{name}_{index:05d}"
+        fields = _point_fields(base, point, stem)
+        if guess is not None:
+            if guess_routine is not None:
+                guess = guess_routine(guess, fields)
+            write_initial_guess(dir / f"{stem}_in.ig", guess)
+            for newton in newton_names(fields, "isaac"):
+                fields[f"newton:{newton}:initial_guess"] = "file"
+                fields[f"newton:{newton}:initial_guess_input_file"] = f"{stem}_in.ig"
+        filename = dir / f"{stem}.in"
+        write_input_file(filename, [fields])
+        returncode = sfbox_call(filename, cpus = cpus)
+        results.append(dict(
+            index = index, input = filename.name,
+            returncode = returncode, warm_start = guess is not None
+            ))
+        guess_file = dir / f"{stem}.ig"
+        if returncode == 0 and guess_file.is_file():
+            guess = read_initial_guess_file(guess_file)
+        elif returncode == 0:
+            logger.warning(f"{filename.name} did not write {guess_file.name}, the next point is not warm started from it")
+        else:
+            #the next point starts from the last converged one
+            logger.warning(f"{filename.name} did not converge")
+    return results
+
+def continuation_sweep(
+        base : Dict,
+        path : List[Dict],
+        n_chains : Optional[int] = None,
+        dir : PathType = None,
+        name : str = "sweep",
+        guess_routine : GuessRoutineArgType = None,
+        ) -> List[Dict]:
+    """Run an ordered parameter path split into n_chains contiguous chains
+    working in parallel. Within a chain every point is seeded
+    with the solution of the previous one (see run_chain).
+
+    Example:
+        continuation_sweep(
+            base,
+            [{"mol:pol:theta" : theta} for theta in np.linspace(1, 10, 100)],
+            n_chains = 8,
+            )
+
+    Args:
+        base (dict): parameters shared by all the points
+        path (list): ordered list of dicts with the parameters of every point
+        n_chains (int, optional): number of chains. Defaults to conf['cpu_count'],
+            with 'core' pinning at most the number of physical cores.
+        dir (PathType, optional): working directory. Defaults to the working directory.
+        name (str, optional): prefix of the file names. Defaults to "sweep".
+        guess_routine (callable, optional): see run_chain. Defaults to None.
+
+    Returns:
+        list: results of every point in the path order, see run_chain
+    """
+    if dir is None:
+        dir = os.getcwd()
+    if n_chains is None:
+        n_chains = conf['cpu_count']
+    allocator = None
+    if conf['pinning'] is not None:
+        allocator = CoreAllocator(conf['pinning'])
+        if conf['pinning'] == 'core':
+            #one chain per physical core
+            n_chains = min(n_chains, len(allocator.slots))
+    chains = split_path(path, n_chains)
+    cpus = [None]*len(chains)
+    if allocator is not None:
+        cpus = [allocator.acquire() for _ in chains]
+
+    def chain_worker(chain, start_index, cpus_):
+        return run_chain(base, chain, dir, name, start_index, guess_routine, cpus_)
+
+    logger.info(f"{len(path)} points in {len(chains)} chains")
+    starts = [sum(len(c) for c in chains[:i]) for i in range(len(chains))]
+    with ThreadPoolExecutor(len(chains)) as executor:
+        results = executor.map(chain_worker, chains, starts, cpus)
+    return [r for chain_results in results for r in chain_results]
+
+def sweep_size(dl : Dict) -> int:
+    """Number of calculations in a grid sweep, the product of the lengths
+    of the list valued parameters"""
+    n = 1
+    for v in dl.values():
+        if isinstance(v, list):
+            n = n*len(v)
+    return n
+
+def sweep_point(dl : Dict, linear_index : int) -> Dict:
+    """Calculation number linear_index of a grid sweep in itertools.product order,
+    the last list valued parameter changes fastest.
+
+    Args:
+        dl (dict): parameters, lists are the grid axes, scalars are shared
+        linear_index (int): position in the sweep
+
+    Returns:
+        dict: parameters of the calculation
+    """
+    point = {}
+    axes = [(k, v) for k, v in dl.items() if isinstance(v, list)]
+    coords = {}
+    for k, v in reversed(axes):
+        linear_index, coords[k] = divmod(linear_index, len(v))
+    for k, v in dl.items():
+        point[k] = v[coords[k]] if k in coords else v
+    return point
+
+def iter_sweep(dl : Dict, indices : Optional[Iterable[int]] = None) -> Iterator[Dict]:
+    """Lazily generate the calculations of a grid sweep, the full list
+    of combinations is never created.
+
+    Args:
+        dl (dict): parameters, lists are the grid axes, scalars are shared
+        indices (iterable, optional): linear indices of the calculations to generate.
+            Defaults to all in itertools.product order.
+
+    Yields:
+        dict: parameters of a calculation
+    """
+    if indices is None:
+        keys = list(dl.keys())
+        axes = [v if isinstance(v, list) else [v] for v in dl.values()]
+        for values in itertools.product(*axes):
+            yield dict(zip(keys, values))
+    else:
+        for linear_index in indices:
+            yield sweep_point(dl, linear_index)
+
+def _shard_indices(n : int, n_files : int, layout : str) -> List[range]:
+    if layout == "contiguous":
+        size, remainder = divmod(n, n_files)
+        ranges = []
+        start = 0
+        for i in range(n_files):
+            stop = start + size + (1 if i < remainder else 0)
+            ranges.append(range(start, stop))
+            start = stop
+        return ranges
+    elif layout == "interleaved":
+        return [range(i, n, n_files) for i in range(n_files)]
+    raise ValueError("invalid layout, possible values: 'contiguous', 'interleaved'")
+
+def _to_json(value):
+    #numpy scalars and arrays
+    if hasattr(value, "tolist"):
+        return value.tolist()
+    return value
+
+def write_sweep(
+        basename : PathType,
+        dl : Dict,
+        n_files : int,
+        layout : str = "contiguous",
+        delta : bool = True,
+        ) -> Dict:
+    """Write a grid sweep to n_files input files with balanced number
+    of calculations, streaming the combinations instead of building
+    the list of all of them. A compact index '<basename>_index.json' is written,
+    see locate_in_sweep.
+
+    Args:
+        basename (PathType): files are named '<basename>_<i>.in'
+        dl (dict): parameters, lists are the grid axes, scalars are shared
+        n_files (int): number of input files, e.g. one per worker
+        layout (str, optional): 'contiguous' gives every file a continuous
+            range of the sweep, which makes delta writing compact,
+            'interleaved' deals the calculations round robin,
+            which mixes cheap and expensive points. Defaults to "contiguous".
+        delta (bool, optional): see write_input.write_input_file. Defaults to True.
+
+    Returns:
+        dict: index
+    """
+    basename = pathlib.Path(basename)
+    n = sweep_size(dl)
+    n_files = max(1, min(n_files, n))
+    shards = _shard_indices(n, n_files, layout)
+    files = []
+    #the contiguous shards consume one generator in order
+    points = iter_sweep(dl)
+    for i, indices in enumerate(shards):
+        filename = basename.with_name(f"{basename.name}_{i}.in")
+        if layout == "contiguous":
+            data = itertools.islice(points, len(indices))
+        else:
+            data = iter_sweep(dl, indices)
+        write_input_file(filename, data, delta = delta)
+        files.append(filename.name)
+    index = dict(
+        axes = {k : [_to_json(v_) for v_ in v] for k, v in dl.items() if isinstance(v, list)},
+        layout = layout,
+        files = files,
+        counts = [len(indices) for indices in shards],
+        )
+    with open(basename.with_name(f"{basename.name}_index.json"), "w") as f:
+        json.dump(index, f)
+    return index
+
+def locate_in_sweep(index : Dict, point : Dict) -> Tuple[str, int]:
+    """Find the input file and the calculation (block) number of a grid point
+
+    Args:
+        index (dict): index returned by write_sweep or read from '<basename>_index.json'
+        point (dict): value of every grid axis
+
+    Returns:
+        tuple: (file name, block number starting from 0)
+    """
+    linear_index = 0
+    for k, values in index["axes"].items():
+        linear_index = linear_index*len(values) + values.index(_to_json(point[k]))
+    n_files = len(index["files"])
+    if index["layout"] == "interleaved":
+        return index["files"][linear_index % n_files], linear_index // n_files
+    start = 0
+    for filename, count in zip(index["files"], index["counts"]):
+        if linear_index < start + count:
+            return filename, linear_index - start
+        start = start + count
+    raise IndexError("point is out of the sweep")
@@ -0,0 +1,155 @@
+"""Synthetic sfbox files for benchmarks and for running without sfbox.
+The files have the layout sfbox writes, the numbers are not a solution."""
+import pathlib
+from typing import Dict, Union
+
+import numpy as np
+
+import logging
+logger = logging.getLogger(__name__)
+
+from .write_input import write_input_file
+
+PathType = Union[pathlib.Path, str]
+
+def _lattice_size(n_layers : int, gradients : int) -> int:
+    # values of a profile, boundary layers included
+    return (n_layers + 2)**gradients
+
+def synthetic_fields(
+        index : int = 0,
+        n_layers : int = 100,
+        gradients : int = 1,
+        n_molecules : int = 2,
+        name : str = "synthetic",
+        ) -> Dict:
+    """Input parameters of a synthetic calculation"""
+    fields = {"lat:flat:gradients" : gradients, "lat:flat:geometry" : "flat"}
+    if gradients == 1:
+        fields["lat:flat:n_layers"] = n_layers
+    else:
+        fields["lat:flat:n_layers_x"] = n_layers
+        fields["lat:flat:n_layers_y"] = n_layers
+    fields["lat:flat:lambda"] = 0.16666666666666666
+    for m in range(n_molecules):
+        fields[f"mon:M{m}:freedom"] = "free"
+        fields[f"mon:M{m}:chi_S"] = round(0.1*m + 0.01*index, 6)
+        fields[f"mol:P{m}:composition"] = f"(M{m}){10*(m+1)}"
+        fields[f"mol:P{m}:freedom"] = "restricted"
+        fields[f"mol:P{m}:theta"] = round(1.0 + 0.1*index, 6)
+    fields["mon:S:freedom"] = "free"
+    fields["mol:S:composition"] = "S"
+    fields["mol:S:freedom"] = "solvent"
+    fields["newton:isaac:method"] = "pseudohessian"
+    fields["newton:isaac:tolerance"] = 1e-7
+    fields[f"output:{name}.out:type"] = "ana"
+    fields[f"output:{name}.out:write_profiles"] = True
+    fields[f"newton:isaac:initial_guess_output_file"] = f"{name}.ig"
+    return fields
+
+def _calculation_text(
+        rng : np.random.Generator,
+        index : int,
+        n_layers : int,
+        gradients : int,
+        n_molecules : int,
+        n_vectors : int,
+        name : str,
+        ) -> str:
+    lines = [f"sys : noname : inputfile : {name}.in", f"sys : noname : calculation : {index}"]
+    for key, value in synthetic_fields(index, n_layers, gradients, n_molecules, name).items():
+        if key.startswith("output:"):
+            #read_output takes lines with 'profile' for vector names
+            continue
+        if value is True:
+            value = "true"
+        lines.append(" : ".join(key.split(":", 2)) + f" : {value}")
+    lines.append(f"newton : isaac : iterations : {int(rng.integers(10, 1000))}")
+    lines.append(f"newton : isaac : accuracy : {rng.uniform(1e-9, 1e-7):.6e}")
+    lines.append(f"sys : noname : free energy : {rng.normal():.12e}")
+    for m in range(n_molecules):
+        lines.append(f"mol : P{m} : phibulk : {rng.uniform(0, 1e-3):.12e}")
+        lines.append(f"mol : P{m} : n : {rng.uniform(1, 10):.12e}")
+    size = _lattice_size(n_layers, gradients)
+    profiles = ["phi", "phi", "u", "alpha"]
+    for v in range(n_vectors):
+        owner = f"M{v % max(n_molecules, 1)}" if v % 2 == 0 else f"P{v % max(n_molecules, 1)}"
+        kind = "mon" if v % 2 == 0 else "mol"
+        lines.append(f"{kind} : {owner} : {profiles[v % len(profiles)]}{v} : profile")
+        values = rng.random(size).tolist()
+        lines.append(("%.12e\n"*size % tuple(values)).rstrip("\n"))
+    lines.append("system delimiter")
+    return "\n".join(lines) + "\n"
+
+def write_synthetic_output(
+        filename : PathType,
+        n_calculations : int = 10,
+        n_layers : int = 100,
+        gradients : int = 1,
+        n_molecules : int = 2,
+        n_vectors : int = 4,
+        seed : int = 0,
+        ) -> int:
+    """Write an sfbox output file with synthetic calculations
+
+    Args:
+        filename (PathType): output file
+        n_calculations (int, optional): number of calculations. Defaults to 10.
+        n_layers (int, optional): layers along every gradient. Defaults to 100.
+        gradients (int, optional): 1 or 2. Defaults to 1.
+        n_molecules (int, optional): number of molecules besides the solvent. Defaults to 2.
+        n_vectors (int, optional): profiles per calculation. Defaults to 4.
+        seed (int, optional): random seed. Defaults to 0.
+
+    Returns:
+        int: bytes written
+    """
+    filename = pathlib.Path(filename)
+    rng = np.random.default_rng(seed)
+    nbytes = 0
+    with open(filename, "w") as f:
+        for i in range(n_calculations):
+            text = _calculation_text(rng, i, n_layers, gradients, n_molecules, n_vectors, filename.stem)
+            f.write(text)
+            nbytes = nbytes + len(text)
+    logger.debug(f"{n_calculations} synthetic calculations are written to {filename}")
+    return nbytes
+
+def write_synthetic_input(
+        filename : PathType,
+        n_calculations : int = 10,
+        n_layers : int = 100,
+        gradients : int = 1,
+        n_molecules : int = 2,
+        delta : bool = False,
+        ) -> int:
+    """Write an sfbox input file with synthetic calculations
+    differing in chi and theta
+
+    Returns:
+        int: bytes written
+    """
+    filename = pathlib.Path(filename)
+    data = (
+        synthetic_fields(i, n_layers, gradients, n_molecules, filename.stem)
+        for i in range(n_calculations)
+        )
+    write_input_file(filename, data, delta = delta)
+    return filename.stat().st_size
+
+def synthetic_initial_guess(
+        n_layers : int = 100,
+        gradients : int = 1,
+        n_molecules : int = 2,
+        seed : int = 0,
+        ) -> Dict:
+    """Initial guess dict as read by utils.read_initial_guess_file"""
+    rng = np.random.default_rng(seed)
+    shape = (n_layers + 2, n_layers + 2 if gradients == 2 else 1)
+    names = [f"M{m}" for m in range(n_molecules)] + ["S"]
+    return {
+        "state" : {name : rng.random(shape[0]*shape[1]) for name in names},
+        "phibulk solvent" : float(rng.uniform(0.9, 1.0)),
+        "alphabulk" : {name : float(rng.uniform(0.5, 1.5)) for name in names},
+        "gradients" : (gradients, *shape),
+        }
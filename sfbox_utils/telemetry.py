@@ -0,0 +1,164 @@
+import pathlib
+import os
+import time
+from collections import deque
+from typing import Dict, Optional, Union
+
+import logging
+logger = logging.getLogger(__name__)
+
+try:
+    import tqdm.autonotebook
+    _TQDM_FOUND_ = True
+except ModuleNotFoundError:
+    _TQDM_FOUND_ = False
+
+PathType = Union[pathlib.Path, str]
+
+class PoolTelemetry:
+    """Progress of a pool of sfbox jobs. Pass it to call.sfbox_calls_subprocess
+    and read snapshot() at any time, e.g. from another thread.
+    Optionally the metrics are written to a Prometheus text format file
+    every interval seconds and shown in a tqdm progress bar.
+
+    Example:
+        telemetry = PoolTelemetry(prometheus_file = "/var/lib/node_exporter/sfbox.prom")
+        sfbox_calls_subprocess(dir, telemetry = telemetry)
+
+    Args:
+        prometheus_file (PathType, optional): file to write the metrics to.
+            Defaults to None.
+        interval (float, optional): seconds between writes of the metrics file.
+            Defaults to 10.
+        progress_bar (bool, optional): show tqdm progress bar if tqdm is installed.
+            Defaults to True.
+        rate_window (float, optional): seconds over which completions per minute
+            are averaged. Defaults to 600.
+    """
+    def __init__(
+            self,
+            prometheus_file : Optional[PathType] = None,
+            interval : float = 10,
+            progress_bar : bool = True,
+            rate_window : float = 600,
+            ):
+        self.prometheus_file = None if prometheus_file is None else pathlib.Path(prometheus_file)
+        self.interval = interval
+        self.progress_bar = progress_bar and _TQDM_FOUND_
+        self.rate_window = rate_window
+        self.pbar = None
+        self.begin(0, 1)
+
+    def begin(self, total : int, cpu_count : int):
+        """Reset the counters at the start of a pool"""
+        self.total = total
+        self.cpu_count = cpu_count
+        self.queue_depth = total
+        #filename -> start time
+        self.running = {}
+        self.counts = {}
+        self.busy_time = 0.0
+        self.start_time = time.monotonic()
+        self.last_write = -float("inf")
+        self.completions = deque()
+        if self.progress_bar and total:
+            self.pbar = tqdm.autonotebook.tqdm(total = total, leave = True)
+
+    def started(self, filename):
+        self.queue_depth = self.queue_depth - 1
+        self.running[filename] = time.monotonic()
+
+    def finished(self, filename, status : str):
+        """Register a finished job, status is 'done', 'failed', 'timeout' or 'cached'"""
+        now = time.monotonic()
+        if filename in self.running:
+            self.busy_time = self.busy_time + now - self.running.pop(filename)
+        else:
+            #cached jobs are never started
+            self.queue_depth = self.queue_depth - 1
+        self.counts[status] = self.counts.get(status, 0) + 1
+        self.completions.append(now)
+        if self.pbar is not None:
+            self.pbar.update(1)
+            self.pbar.set_postfix(self.counts, refresh = False)
+
+    def requeued(self, filename):
+        """Register a job queued again for a retry"""
+        self.queue_depth = self.queue_depth + 1
+        self.total = self.total + 1
+        if self.pbar is not None:
+            self.pbar.total = self.total
+            self.pbar.refresh()
+
+    def snapshot(self) -> Dict:
+        """Current metrics
+
+        Returns:
+            dict: queue_depth, running, completed, failed (failed and timed out),
+                counts by status, completions_per_minute, eta (seconds or None),
+                core_utilization (busy core time over cpu_count*elapsed), elapsed
+        """
+        now = time.monotonic()
+        while self.completions and now - self.completions[0] > self.rate_window:
+            self.completions.popleft()
+        elapsed = now - self.start_time
+        window = min(elapsed, self.rate_window)
+        per_minute = 60*len(self.completions)/window if window > 0 else 0.0
+        remaining = self.queue_depth + len(self.running)
+        busy = self.busy_time + sum(now - t for t in self.running.values())
+        return dict(
+            queue_depth = self.queue_depth,
+            running = len(self.running),
+            completed = sum(self.counts.values()),
+            failed = self.counts.get("failed", 0) + self.counts.get("timeout", 0),
+            counts = dict(self.counts),
+            completions_per_minute = per_minute,
+            eta = 60*remaining/per_minute if per_minute > 0 else None,
+            core_utilization = busy/(self.cpu_count*elapsed) if elapsed > 0 else 0.0,
+            elapsed = elapsed,
+            )
+
+    def prometheus(self) -> str:
+        """Metrics in Prometheus text exposition format"""
+        snapshot = self.snapshot()
+        gauges = [
+            ("sfbox_queue_depth", "Jobs waiting to be started", snapshot["queue_depth"]),
+            ("sfbox_running_jobs", "Jobs running", snapshot["running"]),
+            ("sfbox_completions_per_minute", "Jobs finished per minute", snapshot["completions_per_minute"]),
+            ("sfbox_eta_seconds", "Estimated time to finish the pool", snapshot["eta"]),
+            ("sfbox_core_utilization", "Busy core time over available core time", snapshot["core_utilization"]),
+            ]
+        lines = []
+        for name, help, value in gauges:
+            if value is None:
+                continue
+            lines.append(f"# HELP {name} {help}")
+            lines.append(f"# TYPE {name} gauge")
+            lines.append(f"{name} {value}")
+        lines.append("# HELP sfbox_jobs_finished_total Jobs finished by status")
+        lines.append("# TYPE sfbox_jobs_finished_total counter")
+        for status, count in snapshot["counts"].items():
+            lines.append(f'sfbox_jobs_finished_total{{status="{status}"}} {count}')
+        return "\n".join(lines)+"\n"
+
+    def write_prometheus(self):
+        """Write the metrics file, atomically replacing the previous one"""
+        if self.prometheus_file is None:
+            return
+        tmp = self.prometheus_file.with_name(self.prometheus_file.name+".tmp")
+        tmp.write_text(self.prometheus())
+        os.replace(tmp, self.prometheus_file)
+
+    def tick(self):
+        """Called periodically by the pool, writes the metrics file every interval"""
+        now = time.monotonic()
+        if now - self.last_write >= self.interval:
+            self.last_write = now
+            self.write_prometheus()
+
+    def close(self):
+        """Write the final metrics and close the progress bar"""
+        self.write_prometheus()
+        if self.pbar is not None:
+            self.pbar.close()
+            self.pbar = None
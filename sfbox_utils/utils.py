@@ -1,14 +1,19 @@
 import numpy as np
-import functools
 from itertools import groupby
 import itertools
 import pathlib
 import subprocess
-from typing import Dict, List
+from typing import Dict, List, Optional
 
 def ld_to_dl(ld : list, keep_dim = True) -> dict:
-    # ist of dicts to dict of lists
-    dl = {k : [dic[k] for dic in ld if k in dic] for k in functools.reduce(set.union, [set(D.keys()) for D in ld])}
+    # list of dicts to dict of lists, in one pass over the dicts
+    dl = {}
+    for dic in ld:
+        for k, v in dic.items():
+            try:
+                dl[k].append(v)
+            except KeyError:
+                dl[k] = [v]
     if keep_dim:
         squeeze = lambda x: x[0] if len(x) == 1 else x
         dl = {k:squeeze(v) for k, v in dl.items()}
@@ -73,6 +78,16 @@ def check_homogeneous_dtype(iterable, dtype = None):
     else:
         return all_equal(map(lambda x: isinstance(x, dtype), iterable))
 
+def newton_names(fields : Dict, default : Optional[str] = None) -> List[str]:
+    """Names of the newton solvers set in the parameters of a calculation,
+    [default] if there is none and default is given"""
+    names = list(dict.fromkeys(
+        key.split(":")[1] for key in fields if key.startswith("newton:")
+        ))
+    if not names and default is not None:
+        names = [default]
+    return names
+
 def split_calculations(filename):
     # Output files from sfbox may contains results for multiple sequential
     # calculations divided by 'system delimiter' string. The scripts splits the file
@@ -99,8 +114,8 @@ def read_initial_guess_file(file, reshape = False) -> Dict:
     Function parses sfbox initial guess file into Python dict.
     Scalar parameters are translated into the minimal numeric type 
     float or integer or left as a string.
-    Vector parameters are translated into 1d or 2d list 
-    of minimal numeric types.
+    Vector parameters are translated into 1d or 2d numpy arrays,
+    the file is read at once and every state is converted in bulk.
 
     {   
         scalar_param : scalar_value, 
@@ -123,72 +138,76 @@ def read_initial_guess_file(file, reshape = False) -> Dict:
         dict: parsed initial guess file
     """
 
-    init_guess = open(file)
-    line = init_guess.readline().strip()
+    with open(file) as f:
+        lines = f.read().split("\n")
+    #position of the next line to read
+    i = 1
+
+    def readline():
+        nonlocal i
+        line = lines[i].strip() if i < len(lines) else ""
+        i = i + 1
+        return line
 
-    ngradients = int(init_guess.readline().strip())
+    ngradients = int(readline())
 
-    shape = int(init_guess.readline().strip()), int(init_guess.readline().strip())
+    shape = int(readline()), int(readline())
+    arr_size = shape[0]*shape[1]
 
     molecules = {}
-    line = init_guess.readline().strip()
+    line = readline()
     while line == "molecule":
-        header = [init_guess.readline().strip() for i in range(2)]
+        header = [readline() for _ in range(2)]
         if header != ['all', 'state']:
             raise NotImplementedError("not implemented")
-        molecule = init_guess.readline().strip()
-        arr_size = shape[0]*shape[1]
-        arr = [init_guess.readline().strip() for i in range(arr_size)]
+        molecule = readline()
+        arr = np.array(lines[i:i+arr_size], dtype = float)
+        if len(arr) != arr_size:
+            raise ValueError(f"state of {molecule} is incomplete")
+        i = i + arr_size
         if reshape:
-            arr = np.array(np.reshape(arr, shape), dtype = float)
-        else:
-            arr = np.array(arr, dtype = float)
+            arr = np.reshape(arr, shape)
         molecules.update({molecule:arr})
-        line = init_guess.readline().strip()
+        line = readline()
 
-    phibulk_solvent = float(init_guess.readline().strip())
+    phibulk_solvent = float(readline())
 
     alphabulks = {}
-    while line:
-        line = init_guess.readline().strip()
+    while i < len(lines):
+        line = readline()
         if line=="alphabulk":
-            molecule = init_guess.readline().strip()
-            val = float(init_guess.readline().strip())
+            molecule = readline()
+            val = float(readline())
             alphabulks.update({molecule:val})
             continue
         if line == "": continue
-        if line is not None:
-            raise ValueError("unexpected keyword")
+        raise ValueError("unexpected keyword")
 
     return_dict = {"state" : molecules, "phibulk solvent" : phibulk_solvent, "alphabulk" : alphabulks, "gradients" : (ngradients, *shape)}
 
     return return_dict
 
+def _format_values(values) -> str:
+    # one value per line, %.17g keeps every double exactly
+    values = np.ravel(values).tolist()
+    return ("%.17g\n"*len(values)) % tuple(values)
+
 def write_initial_guess(filename, initial_guess_dict : Dict):
-    """Writes sfbox initial guess file
+    """Writes sfbox initial guess file, every state is formatted at once
 
     Args:
         filename (FileDescriptorOrPath): target initial guess file
         initial_guess_dict (dict): initial guess data, provided as a dict
     """
 
-    f = open(filename, 'w')
-    def writeline(x):
-        f.write(str(x))
-        f.write("\n")
-    writeline("gradients")
-    [writeline(i) for i in initial_guess_dict["gradients"]]
+    chunks = ["gradients\n"]
+    chunks.extend(f"{i}\n" for i in initial_guess_dict["gradients"])
     for molecule, state in initial_guess_dict["state"].items():
-        writeline("molecule")
-        writeline("all")
-        writeline("state")
-        writeline(molecule)
-        vals = np.ravel(initial_guess_dict["state"][molecule])
-        [writeline(v) for v in vals]
-    writeline("phibulk solvent")
-    writeline(initial_guess_dict["phibulk solvent"])
+        chunks.append(f"molecule\nall\nstate\n{molecule}\n")
+        chunks.append(_format_values(state))
+    chunks.append(f"phibulk solvent\n{initial_guess_dict['phibulk solvent']}\n")
     for molecule, bulk in initial_guess_dict["alphabulk"].items():
-        writeline("alphabulk")
-        writeline(molecule)
-        writeline(bulk)
-    f.write("\n")
\ No newline at end of file
+        chunks.append(f"alphabulk\n{molecule}\n{bulk}\n")
+    chunks.append("\n")
+    with open(filename, 'w') as f:
+        f.writelines(chunks)
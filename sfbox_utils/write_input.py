@@ -6,7 +6,35 @@ logger = logging.getLogger(__name__)
 
 from .utils import dl_to_ld
 
-def write_input_file(filename : Union[str, pathlib.Path], data :  Union[Dict, List[Dict]], product = False) -> bool:
+def format_statements(key : str, value) -> str:
+    """Format a parameter as sfbox input statements,
+    one line per value if a list of values is given
+
+    Args:
+        key (str): parameter name, e.g. 'lat:1G:n_layers'
+        value: parameter value or a list of values
+
+    Returns:
+        str: statements
+    """
+    if not isinstance(value, list): value = [value]
+    s = []
+    for v_ in value:
+        #boolean to string
+        if v_ is False:
+            v_ = 'false'
+        elif v_ is True:
+            v_ = 'true'
+        s.append(f'{key}:{v_}\n')
+    return "".join(s)
+
+def write_input_file(
+        filename : Union[str, pathlib.Path],
+        data :  Union[Dict, List[Dict]],
+        product = False,
+        delta = False,
+        chunk_size = 1000,
+        ) -> bool:
     """Write input file with provided list of dicts or dict of lists. 
     Writes multiple calculations to one file. 
     One can define sequential calculations either providing list of dicts 
@@ -16,6 +44,12 @@ def write_input_file(filename : Union[str, pathlib.Path], data :  Union[Dict, Li
         filename (str | pathlib.Path): name of the file to be created
         data (dict | list[dict]): statements to write to the file
         product (bool, optional): if multiple elements in the data are list, write all the combinations possible
+        delta (bool, optional): sfbox keeps the settings from one calculation
+            to the next, if True only the statements that differ
+            from the settings in effect are written, the first calculation
+            is written in full. Defaults to False.
+        chunk_size (int, optional): number of calculations written at once.
+            Defaults to 1000.
 
     Returns:
         bool: True if successful
@@ -30,23 +64,28 @@ def write_input_file(filename : Union[str, pathlib.Path], data :  Union[Dict, Li
     logger.info(
                 f"File {filename} is opened to create an sfbox input")
     f = open(filename, mode='w')
-    
+
+    #statements in effect, used in delta mode
+    in_effect = {}
+    chunk = []
+    i = -1
     for i, d in enumerate(data):
-        for k,v in d.items():
-            if not isinstance(v, list): v = [v]
-            for v_ in v:
-                #boolean to string
-                if v_ is False:
-                    v_ = 'false'
-                elif v_ is True:
-                    v_ = 'true'
-                f.write(f'{k}:{v_}\n')
-                
-        f.write('start\n')
-        logger.info(
-            f"Calculation number {i} is appended to file {filename}")
+        for k, v in d.items():
+            statements = format_statements(k, v)
+            if delta:
+                if in_effect.get(k) == statements:
+                    continue
+                in_effect[k] = statements
+            chunk.append(statements)
+        chunk.append('start\n')
+        if (i + 1) % chunk_size == 0:
+            f.writelines(chunk)
+            chunk = []
+            logger.debug(
+                f"{i + 1} calculations are written to file {filename}")
+    f.writelines(chunk)
     logger.info(
-            f"File {filename} is closed")
+            f"File {filename} is closed, {i + 1} calculations are written")
     f.close()
 
     return True
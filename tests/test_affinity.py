@@ -0,0 +1,51 @@
+import os
+import subprocess
+import sys
+
+import pytest
+
+from sfbox_utils import affinity
+from sfbox_utils.affinity import CoreAllocator, _parse_cpu_list, pin_to
+
+def test_parse_cpu_list():
+    assert _parse_cpu_list("0-3,8,10-11\n") == {0, 1, 2, 3, 8, 10, 11}
+    assert _parse_cpu_list("") == set()
+
+def test_topology_covers_available_cpus():
+    cpus = affinity.available_cpus()
+    assert affinity.available_cpu_count() == len(cpus)
+    assert set().union(*affinity.numa_nodes()) == cpus
+    assert set().union(*affinity.physical_cores()) == cpus
+
+def test_invalid_pinning():
+    with pytest.raises(ValueError):
+        CoreAllocator("socket")
+
+def test_core_allocator(monkeypatch):
+    monkeypatch.setattr(affinity, "physical_cores", lambda: [{0, 4}, {1, 5}])
+    allocator = CoreAllocator("core")
+    first, second = allocator.acquire(), allocator.acquire()
+    assert [first, second] == [{0, 4}, {1, 5}]
+    #every core is occupied, the third child is not pinned
+    assert allocator.acquire() is None
+    allocator.release(None)
+    allocator.release(first)
+    assert allocator.acquire() == {0, 4}
+
+def test_numa_allocator_balances_nodes(monkeypatch):
+    monkeypatch.setattr(affinity, "numa_nodes", lambda: [{0, 1, 2, 3}, {4, 5}])
+    allocator = CoreAllocator("numa")
+    acquired = [allocator.acquire() for _ in range(3)]
+    assert acquired == [{0, 1, 2, 3}, {4, 5}, {0, 1, 2, 3}]
+    allocator.release(acquired[1])
+    assert allocator.occupied == [2, 0]
+
+@pytest.mark.skipif(not hasattr(os, "sched_setaffinity"), reason = "no CPU affinity on this platform")
+def test_pin_to():
+    assert pin_to(None) is None
+    cpu = min(affinity.available_cpus())
+    output = subprocess.run(
+        [sys.executable, "-c", "import os; print(sorted(os.sched_getaffinity(0)))"],
+        preexec_fn = pin_to({cpu}), capture_output = True, text = True, check = True,
+        ).stdout
+    assert output.strip() == f"[{cpu}]"
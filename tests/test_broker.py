@@ -0,0 +1,58 @@
+import pathlib
+import threading
+
+from sfbox_utils import call, synthetic
+from sfbox_utils.broker import Broker, run_agent
+
+FAKE_SFBOX = pathlib.Path(call.__file__).parent / "scripts" / "fake_sfbox.py"
+
+def make_inputs(dir, n):
+    dir.mkdir()
+    for i in range(n):
+        synthetic.write_synthetic_input(dir / f"job_{i}.in", n_calculations = 1, n_layers = 10)
+
+def run(tmp_path, **kwargs):
+    broker = Broker(tmp_path / "inputs", results_dir = tmp_path / "results", **kwargs)
+    broker.serve_in_thread()
+    agent = threading.Thread(target = run_agent, args = ("localhost", broker.port, tmp_path / "work", 2))
+    agent.start()
+    results = broker.wait(timeout = 60)
+    agent.join(60)
+    return results
+
+def test_broker_roundtrip(tmp_path, monkeypatch):
+    monkeypatch.setitem(call.conf, "exe_path", str(FAKE_SFBOX))
+    make_inputs(tmp_path / "inputs", 3)
+    (tmp_path / "results").mkdir()
+    assert run(tmp_path) == {f"job_{i}.in" : 0 for i in range(3)}
+    for i in range(3):
+        assert (tmp_path / "results" / f"job_{i}.out").is_file()
+    assert len((tmp_path / "results" / "sfbox_runs.jsonl").read_text().splitlines()) == 3
+    #the lease directories are removed
+    assert list((tmp_path / "work").iterdir()) == []
+
+def test_broker_job_error(tmp_path, monkeypatch):
+    monkeypatch.setitem(call.conf, "exe_path", str(tmp_path / "missing_sfbox"))
+    make_inputs(tmp_path / "inputs", 2)
+    (tmp_path / "results").mkdir()
+    assert run(tmp_path, max_attempts = 2) == {"job_0.in" : "error", "job_1.in" : "error"}
+
+def test_broker_wait_timeout(tmp_path, monkeypatch):
+    monkeypatch.setitem(call.conf, "exe_path", str(FAKE_SFBOX))
+    monkeypatch.setenv("FAKE_SFBOX_SLEEP", "2")
+    make_inputs(tmp_path / "inputs", 3)
+    broker = Broker(tmp_path / "inputs")
+    broker.serve_in_thread()
+    errors = []
+    def agent():
+        try:
+            run_agent("localhost", broker.port, tmp_path / "work", 1, poll_interval = 0.05)
+        except Exception as e:
+            errors.append(e)
+    thread = threading.Thread(target = agent)
+    thread.start()
+    #one job is leased, two are queued
+    assert broker.wait(timeout = 1) == {f"job_{i}.in" : "lost" for i in range(3)}
+    thread.join(30)
+    assert not thread.is_alive()
+    assert errors == []
@@ -0,0 +1,66 @@
+import pathlib
+
+from sfbox_utils import call, read_output, synthetic
+from sfbox_utils.cache import RunCache, input_hash
+from sfbox_utils.write_input import write_input_file
+
+FAKE_SFBOX = pathlib.Path(call.__file__).parent / "scripts" / "fake_sfbox.py"
+
+def make_job(dir, name, with_output = False):
+    filename = dir / f"{name}.in"
+    write_input_file(filename, [synthetic.synthetic_fields(0, n_layers = 10, name = name)])
+    if with_output:
+        synthetic.write_synthetic_output(dir / f"{name}.out", n_calculations = 1, n_layers = 10)
+        (dir / f"{name}.log").write_text("log\n")
+    return filename
+
+def test_renamed_input_has_the_same_hash(tmp_path):
+    assert input_hash(make_job(tmp_path, "job_1")) == input_hash(make_job(tmp_path, "job_3"))
+
+def test_fetch_renames_the_input_in_outputs(tmp_path):
+    cache = RunCache(tmp_path / "cache")
+    cache.store(make_job(tmp_path, "job_1", with_output = True))
+    job_3 = make_job(tmp_path, "job_3")
+    assert cache.fetch(job_3)
+    assert cache.stats()["hits"] == 1
+    fetched = list(read_output.parse_file(tmp_path / "job_3.out"))
+    original = list(read_output.parse_file(tmp_path / "job_1.out"))
+    assert fetched[0]["sys:noname:inputfile"] == "job_3.in"
+    assert original[0]["sys:noname:inputfile"] == "job_1.in"
+    fetched[0].pop("sys:noname:inputfile")
+    original[0].pop("sys:noname:inputfile")
+    assert fetched[0].keys() == original[0].keys()
+    assert (tmp_path / "job_3.log").read_text() == "log\n"
+
+def test_fetch_miss(tmp_path):
+    cache = RunCache(tmp_path / "cache")
+    assert not cache.fetch(make_job(tmp_path, "job_1"))
+    assert cache.stats()["misses"] == 1
+
+def test_run_without_outputs_is_not_cached(tmp_path):
+    cache = RunCache(tmp_path / "cache")
+    job_1 = make_job(tmp_path, "job_1")
+    (tmp_path / "job_1.log").write_text("log\n")
+    cache.store(job_1)
+    assert cache.stats()["entries"] == 0
+    #entries without outputs written before are misses
+    entry = tmp_path / "cache" / input_hash(job_1)
+    entry.mkdir()
+    (entry / "files.json").write_text("{}")
+    assert not cache.fetch(make_job(tmp_path, "job_3"))
+    assert cache.stats()["misses"] == 1
+
+def test_compressed_scratch_results(tmp_path, monkeypatch):
+    monkeypatch.setitem(call.conf, "exe_path", str(FAKE_SFBOX))
+    monkeypatch.setitem(call.conf, "ledger", None)
+    monkeypatch.setitem(call.conf, "scratch_dir", tmp_path / "scratch")
+    monkeypatch.setitem(call.conf, "scratch_compress", True)
+    monkeypatch.setitem(call.conf, "cache", RunCache(tmp_path / "cache"))
+    jobs = tmp_path / "jobs"
+    jobs.mkdir()
+    assert call.sfbox_call(make_job(jobs, "job_1")) == 0
+    assert call.sfbox_call(make_job(jobs, "job_3")) == 0
+    assert call.conf["cache"].stats()["hits"] == 1
+    fetched = list(read_output.parse_file(jobs / "job_3.out.gz"))
+    assert fetched[0]["sys:noname:inputfile"] == "job_3.in"
+    assert (jobs / "job_3.log.gz").is_file()
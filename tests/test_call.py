@@ -0,0 +1,111 @@
+import asyncio
+import pathlib
+import subprocess
+import time
+import uuid
+
+import pytest
+
+from sfbox_utils import affinity, call, synthetic
+
+FAKE_SFBOX = pathlib.Path(call.__file__).parent / "scripts" / "fake_sfbox.py"
+
+@pytest.fixture
+def fake_sfbox(monkeypatch):
+    monkeypatch.setitem(call.conf, "exe_path", str(FAKE_SFBOX))
+    monkeypatch.setitem(call.conf, "ledger", None)
+    monkeypatch.setenv("FAKE_SFBOX_OUTPUT", "0")
+
+def make_input(dir):
+    filename = dir / f"job_{uuid.uuid4().hex}.in"
+    synthetic.write_synthetic_input(filename, n_calculations = 1, n_layers = 10)
+    return filename
+
+def running(filename):
+    return subprocess.run(["pgrep", "-f", filename.name], stdout = subprocess.DEVNULL).returncode == 0
+
+def test_sfbox_call_async(tmp_path, fake_sfbox):
+    filename = make_input(tmp_path)
+    assert asyncio.run(call.sfbox_call_async(filename)) == 0
+    assert "fake_sfbox finished" in filename.with_suffix(".log").read_text()
+
+@pytest.mark.parametrize("log_lines", [None, lambda filename, line: None])
+def test_cancelled_sfbox_call_async_kills_sfbox(tmp_path, fake_sfbox, monkeypatch, log_lines):
+    monkeypatch.setenv("FAKE_SFBOX_SLEEP", "60")
+    filename = make_input(tmp_path)
+
+    async def cancel():
+        task = asyncio.ensure_future(call.sfbox_call_async(filename, log_lines = log_lines))
+        await asyncio.sleep(0.5)
+        assert running(filename)
+        task.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await task
+
+    start = time.monotonic()
+    asyncio.run(cancel())
+    assert time.monotonic() - start < 30
+    assert not running(filename)
+
+def test_timeout_kills_sfbox(tmp_path, fake_sfbox, monkeypatch):
+    monkeypatch.setenv("FAKE_SFBOX_SLEEP", "60")
+    monkeypatch.setitem(call.conf, "poll_interval", 0.01)
+    filename = make_input(tmp_path)
+    start = time.monotonic()
+    outcomes = call.sfbox_calls_subprocess(dir = tmp_path, timeout = 0.5)
+    assert time.monotonic() - start < 30
+    assert [outcome["status"] for outcome in outcomes] == ["timeout"]
+    time.sleep(0.1)
+    assert not running(filename)
+
+def test_sfbox_calls_subprocess(tmp_path, fake_sfbox, monkeypatch):
+    monkeypatch.setitem(call.conf, "poll_interval", 0.01)
+    for _ in range(3):
+        make_input(tmp_path)
+    outcomes = call.sfbox_calls_subprocess(dir = tmp_path)
+    assert [outcome["status"] for outcome in outcomes] == ["done"]*3
+
+def test_ingest_compressed_scratch_outputs(tmp_path, fake_sfbox, monkeypatch):
+    monkeypatch.setenv("FAKE_SFBOX_OUTPUT", "1")
+    monkeypatch.setitem(call.conf, "poll_interval", 0.01)
+    monkeypatch.setitem(call.conf, "scratch_dir", tmp_path / "scratch")
+    monkeypatch.setitem(call.conf, "scratch_compress", True)
+    jobs = tmp_path / "jobs"
+    jobs.mkdir()
+    h5_dir = tmp_path / "h5"
+    h5_dir.mkdir()
+    for _ in range(2):
+        make_input(jobs)
+    outcomes = call.sfbox_calls_subprocess(dir = jobs, ingest = dict(dir = h5_dir))
+    assert [outcome["status"] for outcome in outcomes] == ["done"]*2
+    assert len(list(jobs.glob("*.out.gz"))) == 2
+    assert len(list(h5_dir.glob("*.h5"))) == 2
+
+def job_times(dir):
+    times = []
+    for log in dir.glob("*.log"):
+        lines = log.read_text().splitlines()
+        times.append((float(lines[0].split()[-1]), float(lines[-1].split()[-1])))
+    return sorted(times)
+
+def test_core_pinning_limits_the_pool(tmp_path, fake_sfbox, monkeypatch):
+    cpu = min(affinity.available_cpus())
+    #two hyperthreads of one physical core
+    monkeypatch.setattr(affinity, "physical_cores", lambda: [{cpu}])
+    monkeypatch.setitem(call.conf, "pinning", "core")
+    monkeypatch.setitem(call.conf, "cpu_count", 2)
+    monkeypatch.setitem(call.conf, "poll_interval", 0.01)
+    monkeypatch.setenv("FAKE_SFBOX_SLEEP", "0.3")
+    for _ in range(2):
+        make_input(tmp_path)
+    outcomes = call.sfbox_calls_subprocess(dir = tmp_path)
+    assert [outcome["status"] for outcome in outcomes] == ["done"]*2
+    (_, first_end), (second_start, _) = job_times(tmp_path)
+    assert second_start >= first_end
+
+def test_sfbox_calls_returns_the_outcomes(tmp_path, fake_sfbox, monkeypatch):
+    monkeypatch.setitem(call.conf, "poll_interval", 0.01)
+    monkeypatch.setenv("FAKE_SFBOX_RETURNCODE", "1")
+    make_input(tmp_path)
+    outcomes = call.sfbox_calls("subprocess", dir = tmp_path)
+    assert [(o["status"], o["returncode"]) for o in outcomes] == [("failed", 1)]
@@ -0,0 +1,48 @@
+import pathlib
+import subprocess
+import sys
+
+import numpy as np
+
+from sfbox_utils import call, read_output, synthetic
+
+FAKE_SFBOX = pathlib.Path(call.__file__).parent / "scripts" / "fake_sfbox.py"
+
+def run_fake(dir, *args, **env):
+    return subprocess.run(
+        [sys.executable, str(FAKE_SFBOX), *args], cwd = dir,
+        env = {k : str(v) for k, v in env.items()}, capture_output = True, text = True,
+        )
+
+def test_usage(tmp_path):
+    assert run_fake(tmp_path).returncode == 2
+
+def test_delta_input(tmp_path):
+    synthetic.write_synthetic_input(tmp_path / "job.in", 3, n_layers = 10, delta = True)
+    result = run_fake(tmp_path, "job.in", FAKE_SFBOX_ITERATIONS = 4)
+    assert result.returncode == 0
+    lines = result.stdout.splitlines()
+    assert lines[0].startswith("fake_sfbox started")
+    assert lines[-1].startswith("fake_sfbox finished")
+    assert sum(line.startswith("i = ") for line in lines) == 3*4
+    calculations = list(read_output.parse_file(tmp_path / "job.out"))
+    assert len(calculations) == 3
+    #the statements of the first calculation are kept
+    assert all(c["lat:flat:n_layers"] == 10 for c in calculations)
+    assert [c["mol:P0:theta"] for c in calculations] == [1.0, 1.1, 1.2]
+    assert all(
+        v.shape == (12,) for c in calculations for v in c.values() if isinstance(v, np.ndarray)
+        )
+
+def test_environment(tmp_path):
+    synthetic.write_synthetic_input(tmp_path / "job.in", 1, n_layers = 10)
+    result = run_fake(tmp_path, "job.in", FAKE_SFBOX_RETURNCODE = 5, FAKE_SFBOX_OUTPUT = 0)
+    assert result.returncode == 5
+    assert not (tmp_path / "job.out").exists()
+
+def test_sleep_argument(tmp_path):
+    synthetic.write_synthetic_input(tmp_path / "job.in", 1, n_layers = 10)
+    result = run_fake(tmp_path, "--sleep", "0.3", "job.in", FAKE_SFBOX_SLEEP = 100)
+    lines = result.stdout.splitlines()
+    started, finished = float(lines[0].split()[-1]), float(lines[-1].split()[-1])
+    assert 0.3 <= finished - started < 10
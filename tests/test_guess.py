@@ -0,0 +1,85 @@
+import numpy as np
+import pytest
+
+from sfbox_utils import synthetic
+from sfbox_utils.guess import (
+    layer_volumes, lattice_shape, resample_guess, resample_state, resampling_guess_routine,
+    )
+from sfbox_utils.utils import read_initial_guess_file, write_initial_guess
+
+def linear_state(n):
+    # boundary layers set apart from the interior ramp
+    values = np.linspace(0, 1, n)
+    values[0], values[-1] = -1, 2
+    return values
+
+def test_same_shape_is_unchanged():
+    values = np.random.default_rng(0).random(12)
+    assert np.array_equal(resample_state(values, (12, 1), (12, 1)), values)
+
+def test_scale_keeps_a_linear_profile():
+    old = np.concatenate([[-1], np.arange(10, dtype = float), [2]])
+    new = resample_state(old, (12, 1), (22, 1))
+    assert len(new) == 22
+    #boundary layers are copied
+    assert (new[0], new[-1]) == (-1, 2)
+    positions = np.clip((np.arange(20) + 0.5)*10/20 - 0.5, 0, 9)
+    assert np.allclose(new[1:-1], positions)
+
+def test_extend_keeps_the_spacing():
+    old = linear_state(12)
+    cropped = resample_state(old, (12, 1), (7, 1), mode = "extend")
+    assert np.allclose(cropped[1:-1], old[1:6])
+    extended = resample_state(old, (12, 1), (16, 1), mode = "extend")
+    assert np.allclose(extended[1:11], old[1:11])
+    #the last layer is continued
+    assert np.allclose(extended[11:15], old[10])
+
+@pytest.mark.parametrize("geometry", ["flat", "cylindrical", "spherical"])
+def test_conserve_amount(geometry):
+    old = np.random.default_rng(1).random(22)
+    new = resample_state(old, (22, 1), (42, 1), conserve = True, geometry = geometry)
+    dimension = {"flat" : 1, "cylindrical" : 2, "spherical" : 3}[geometry]
+    amount_old = np.sum(old*layer_volumes(22, geometry))
+    amount_new = np.sum(new*layer_volumes(42, geometry))
+    assert amount_new == pytest.approx(amount_old*2**dimension)
+
+def test_two_gradients():
+    old = np.random.default_rng(2).random((12, 8))
+    new = resample_state(old, (12, 8), (22, 14), ngradients = 2)
+    assert new.shape == (22*14,)
+    with pytest.raises(ValueError):
+        resample_state(old[:, :1], (12, 1), (22, 3))
+
+def test_invalid_arguments():
+    with pytest.raises(ValueError):
+        resample_state(np.zeros(12), (12, 1), (22, 1), method = "cubic")
+    with pytest.raises(ValueError):
+        resample_state(np.zeros(12), (12, 1), (22, 1), mode = "stretch")
+    with pytest.raises(ValueError):
+        layer_volumes(10, "toroidal")
+
+def test_spline():
+    pytest.importorskip("scipy")
+    old = np.concatenate([[0], np.sin(np.linspace(0, 3, 20)), [0]])
+    new = resample_state(old, (22, 1), (42, 1), method = "spline")
+    #layer centers of the new lattice on the old index axis, constant outside
+    positions = np.clip((np.arange(40) + 0.5)*20/40 - 0.5, 0, 19)
+    assert np.abs(new[1:-1] - np.sin(positions*3/19)).max() < 1e-4
+
+def test_lattice_shape():
+    assert lattice_shape(synthetic.synthetic_fields(n_layers = 10)) == ((12, 1), "flat")
+    assert lattice_shape(synthetic.synthetic_fields(n_layers = 10, gradients = 2)) == ((12, 12), "flat")
+
+def test_guess_routine_roundtrip(tmp_path):
+    guess = synthetic.synthetic_initial_guess(n_layers = 10)
+    routine = resampling_guess_routine(conserve = ["S"])
+    assert routine(guess, synthetic.synthetic_fields(n_layers = 10)) is guess
+    resampled = routine(guess, synthetic.synthetic_fields(n_layers = 20))
+    assert resampled["gradients"] == (1, 22, 1)
+    assert resampled["phibulk solvent"] == guess["phibulk solvent"]
+    write_initial_guess(tmp_path / "resampled.ig", resampled)
+    read = read_initial_guess_file(tmp_path / "resampled.ig")
+    assert tuple(read["gradients"]) == (1, 22, 1)
+    for name, values in resampled["state"].items():
+        assert np.allclose(read["state"][name], values)
@@ -0,0 +1,57 @@
+import itertools
+
+from sfbox_utils import synthetic
+from sfbox_utils.input_class import InputItemClass, InputListClass, InputTemplate
+from sfbox_utils.read_input import parse_file, parse_file_resolved
+from sfbox_utils.write_input import write_input_file
+
+VARIABLES = ["mol:P0:theta", "mon:M0:chi_S", "sys:noname:overflow_protection"]
+
+def sweep_rows():
+    return itertools.product([1.0, 2.5], [0.1, 0.2, 0.3], [True, False])
+
+def sweep_blocks(base):
+    return [dict(base, **dict(zip(VARIABLES, row))) for row in sweep_rows()]
+
+def test_item_str_matches_write_input_file(tmp_path):
+    fields = synthetic.synthetic_fields(n_layers = 10)
+    write_input_file(tmp_path / "job.in", [fields])
+    items = InputListClass([fields])
+    assert str(items) == (tmp_path / "job.in").read_text()
+    items.writefile(tmp_path / "items.in")
+    assert (tmp_path / "items.in").read_text() == (tmp_path / "job.in").read_text()
+
+def test_item_properties():
+    item = InputItemClass({"lat:1G:n_layers" : 10}, {"n_layers" : "lat:1G:n_layers"})
+    other = InputItemClass({"lat:1G:n_layers" : 20}, {"n_layers" : "lat:1G:n_layers"})
+    item.n_layers = 30
+    assert item["lat:1G:n_layers"] == 30
+    assert other.n_layers == 20
+
+def test_template_matches_write_input_file(tmp_path):
+    base = synthetic.synthetic_fields(n_layers = 10)
+    #braces in a constant value are not format fields
+    base["mol:P1:composition"] = "(M1){2}"
+    template = InputTemplate(base, VARIABLES)
+    assert template.write(tmp_path / "template.in", sweep_rows(), chunk_size = 5) == 12
+    write_input_file(tmp_path / "reference.in", sweep_blocks(base))
+    assert (tmp_path / "template.in").read_text() == (tmp_path / "reference.in").read_text()
+    assert template.render(dict(zip(VARIABLES, next(sweep_rows())))) == \
+        template.render(next(sweep_rows()))
+
+def test_template_delta(tmp_path):
+    base = synthetic.synthetic_fields(n_layers = 10)
+    template = InputTemplate(base, VARIABLES)
+    template.write(tmp_path / "delta.in", sweep_rows(), delta = True, chunk_size = 5)
+    resolved = parse_file_resolved(tmp_path / "delta.in")
+    write_input_file(tmp_path / "reference.in", sweep_blocks(base))
+    assert [dict(r) for r in resolved] == parse_file(tmp_path / "reference.in")
+    #only the variables after the first block
+    assert set(resolved.changed(1)) == set(VARIABLES)
+
+def test_template_process_pool(tmp_path):
+    base = synthetic.synthetic_fields(n_layers = 10)
+    template = InputTemplate(base, VARIABLES)
+    template.write(tmp_path / "pool.in", sweep_rows(), delta = True, chunk_size = 3, processes = 2)
+    template.write(tmp_path / "serial.in", sweep_rows(), delta = True, chunk_size = 3)
+    assert (tmp_path / "pool.in").read_text() == (tmp_path / "serial.in").read_text()
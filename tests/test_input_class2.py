@@ -0,0 +1,74 @@
+import numpy as np
+
+from sfbox_utils.input_class2 import TaskClass
+from sfbox_utils.read_input import parse_file
+
+FIELDS = {
+    "lat:1G:n_layers" : "_",
+    "mon:A:chi - S" : "_",
+    "mon:B:chi - S" : "_",
+    "mol:P:composition" : "_",
+    }
+ALIASES = dict(n_layers = "lat:1G:n_layers", composition = "mol:P:composition")
+
+def make_rules():
+    #rules with the same name, e.g. made by a factory
+    def make_chi(monomer, scale):
+        def rule(_):
+            _[f"mon:{monomer}:chi - S"] = _.chi*scale
+        return rule
+    return [make_chi("A", 1.0), make_chi("B", 2.0)]
+
+def test_rules_with_the_same_name():
+    task = TaskClass(FIELDS, ALIASES)
+    for rule in make_rules():
+        task.add_dependency(rule)
+    task.add_dependency(lambda _: setattr(_, "composition", f"(A){_.N}(B){_.N}"))
+    task.add_dependency(lambda _: setattr(_, "n_layers", 2*_.N))
+    assert sorted(task.free_variables()) == ["N", "chi"]
+    evaluation = task.evaluate(chi = np.linspace(0, 1, 3), N = [10, 20])
+    assert evaluation.n == 6
+    np.testing.assert_allclose(evaluation.column("mon:B:chi - S"), 2*evaluation.column("mon:A:chi - S"))
+    assert list(evaluation.column("mol:P:composition")[:2]) == ["(A)10(B)10", "(A)20(B)20"]
+    np.testing.assert_array_equal(evaluation.column("lat:1G:n_layers")[:2], [20, 40])
+
+def test_order_follows_the_reads():
+    task = TaskClass({"mon:A:chi - S" : "_"}, {})
+    def second(_):
+        _["mon:A:chi - S"] = _.x + 1
+    def first(_):
+        _.x = 2*_.y
+    task.add_dependency(second)
+    task.add_dependency(first)
+    assert task.order() == [first, second]
+    np.testing.assert_array_equal(task.evaluate(y = [1, 2]).column("mon:A:chi - S"), [3, 5])
+
+def test_lambdas_are_ordered_by_their_own_reads():
+    task = TaskClass({"mon:A:chi - S" : "_"}, {})
+    task.add_dependency(lambda _: _.__setitem__("mon:A:chi - S", _.x + 1))
+    task.add_dependency(lambda _: setattr(_, "x", 2*_.y))
+    assert task.free_variables() == ["y"]
+    np.testing.assert_array_equal(task.evaluate(y = [1, 2]).column("mon:A:chi - S"), [3, 5])
+
+def test_lambdas_are_memoized_separately():
+    fields = {"mol:P:composition" : "_", "mol:Q:composition" : "_"}
+    task = TaskClass(fields, {})
+    task.add_dependency(lambda _: _.__setitem__("mol:P:composition", f"(A){_.N}"))
+    task.add_dependency(lambda _: _.__setitem__("mol:Q:composition", f"(B){_.N}"))
+    evaluation = task.evaluate(N = [10, 20])
+    assert list(evaluation.column("mol:P:composition")) == ["(A)10", "(A)20"]
+    assert list(evaluation.column("mol:Q:composition")) == ["(B)10", "(B)20"]
+
+def test_write_scalar_evaluation(tmp_path):
+    task = TaskClass(FIELDS, ALIASES)
+    for rule in make_rules():
+        task.add_dependency(rule)
+    task.add_dependency(lambda _: setattr(_, "composition", f"(A){_.N}(B){_.N}"))
+    task.add_dependency(lambda _: setattr(_, "n_layers", 2*_.N))
+    evaluation = task.evaluate(chi = 0.5, N = 10)
+    assert evaluation.write(tmp_path / "one.in") == 1
+    blocks = parse_file(tmp_path / "one.in")
+    assert len(blocks) == 1
+    assert blocks[0]["mon:B:chi - S"] == 1.0
+    assert blocks[0]["mol:P:composition"] == "(A)10(B)10"
+    assert list(evaluation.blocks()) == [blocks[0]]
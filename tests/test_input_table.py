@@ -0,0 +1,91 @@
+import itertools
+
+import numpy as np
+import pytest
+
+from sfbox_utils import synthetic
+from sfbox_utils.input_table import InputTable
+from sfbox_utils.read_input import parse_file, parse_file_resolved
+from sfbox_utils.utils import dl_to_ld
+from sfbox_utils.write_input import write_input_file
+
+def test_from_grid_product_order():
+    dl = {"lat:1G:n_layers" : [10, 20], "mol:pol:theta" : [1.0, 2.0, 3.0], "mon:W:freedom" : "free"}
+    table = InputTable.from_grid(dl)
+    assert len(table) == 6
+    assert table.varying() == ["lat:1G:n_layers", "mol:pol:theta"]
+    expected = [
+        {"lat:1G:n_layers" : n, "mol:pol:theta" : t, "mon:W:freedom" : "free"}
+        for n, t in itertools.product([10, 20], [1.0, 2.0, 3.0])
+        ]
+    assert table.to_records() == expected
+    assert type(table.to_records()[0]["lat:1G:n_layers"]) is int
+
+def test_from_records_constants_and_strings():
+    records = [synthetic.synthetic_fields(i, n_layers = 10) for i in range(4)]
+    table = InputTable.from_records(records)
+    assert "lat:flat:n_layers" in table.constants
+    assert "mol:P0:theta" in table.columns
+    assert table.to_records() == records
+    table["mon:M0:freedom"] = ["free", "frozen", "free", "frozen"]
+    column = table["mon:M0:freedom"]
+    assert column.dtype == object
+    #one object per unique string
+    assert column[0] is column[2]
+
+def test_rows_write_to_the_table():
+    table = InputTable({"mol:pol:theta" : [1, 2, 3], "mon:W:freedom" : "free"}, aliases = {"theta" : "mol:pol:theta"})
+    row = table[1]
+    row.theta = 2.5
+    row["mon:W:freedom"] = "frozen"
+    assert table["mol:pol:theta"].tolist() == [1, 2.5, 3]
+    assert table["mon:W:freedom"].tolist() == ["free", "frozen", "free"]
+    table[0]["sys:noname:overflow_protection"] = True
+    assert table.to_records()[0]["sys:noname:overflow_protection"] is True
+    assert table.to_records()[1]["sys:noname:overflow_protection"] is None
+    with pytest.raises(AttributeError):
+        row.chi = 1
+    with pytest.raises(IndexError):
+        table[3]
+
+def test_selection():
+    table = InputTable.from_grid({"lat:1G:n_layers" : [10, 20, 30], "mol:pol:theta" : [1.0, 2.0]})
+    large = table.filter(lambda t: t["lat:1G:n_layers"] > 10)
+    assert len(large) == 4
+    assert set(large["lat:1G:n_layers"]) == {20, 30}
+    assert len(table[::2]) == 3
+    assert table[[0, 5]].to_records() == [table.to_records()[0], table.to_records()[5]]
+
+def test_write_matches_write_input_file(tmp_path):
+    dl = {"lat:1G:n_layers" : [10, 20], "mol:pol:theta" : [1.0, 2.0], "mon:W:freedom" : "free"}
+    table = InputTable.from_grid(dl)
+    assert table.write(tmp_path / "table.in", delta = False) == 4
+    write_input_file(tmp_path / "reference.in", dl_to_ld(dl, product = True, repeat_keys = True))
+    assert parse_file(tmp_path / "table.in") == parse_file(tmp_path / "reference.in")
+
+def test_resolved_roundtrip(tmp_path):
+    data = [synthetic.synthetic_fields(i, n_layers = 10) for i in range(5)]
+    write_input_file(tmp_path / "sweep.in", data, delta = True)
+    table = InputTable.from_records(parse_file_resolved(tmp_path / "sweep.in"))
+    table.write(tmp_path / "copy.in")
+    assert [dict(r) for r in parse_file_resolved(tmp_path / "copy.in")] == \
+        [dict(r) for r in parse_file_resolved(tmp_path / "sweep.in")]
+
+def test_write_missing_values(tmp_path):
+    table = InputTable.from_records([{"mol:pol:theta" : 1}, {"mon:W:chi_S" : 0.5}])
+    with pytest.raises(ValueError):
+        table.write(tmp_path / "sweep.in")
+
+def test_memory_usage_shares_strings():
+    n = 1000
+    table = InputTable({"mon:W:freedom" : np.array(["free", "frozen"]*(n//2))})
+    assert table.memory_usage() < n*8 + 1000
+
+def test_write_constant_table(tmp_path):
+    table = InputTable({"lat:1G:n_layers" : 10, "mol:pol:theta" : 1.0})
+    assert table.write(tmp_path / "one.in") == 1
+    assert parse_file(tmp_path / "one.in") == [{"lat:1G:n_layers" : 10, "mol:pol:theta" : 1.0}]
+    records = [{"lat:1G:n_layers" : 10, "mol:pol:theta" : 1.0}]*3
+    table = InputTable.from_records(records)
+    assert table.write(tmp_path / "three.in", delta = False) == len(table) == 3
+    assert parse_file(tmp_path / "three.in") == records
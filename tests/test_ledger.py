@@ -0,0 +1,46 @@
+import pathlib
+
+import pytest
+
+from sfbox_utils import call, store, synthetic
+from sfbox_utils.ledger import ledger_fields, read_ledger
+
+FAKE_SFBOX = pathlib.Path(call.__file__).parent / "scripts" / "fake_sfbox.py"
+
+@pytest.fixture
+def fake_sfbox(monkeypatch):
+    monkeypatch.setitem(call.conf, "exe_path", str(FAKE_SFBOX))
+    monkeypatch.setitem(call.conf, "poll_interval", 0.01)
+
+def test_sfbox_call_records_the_run(tmp_path, fake_sfbox, monkeypatch):
+    monkeypatch.setenv("FAKE_SFBOX_RETURNCODE", "3")
+    filename = tmp_path / "job.in"
+    synthetic.write_synthetic_input(filename, n_calculations = 1, n_layers = 10)
+    assert call.sfbox_call(filename) == 3
+    records = read_ledger(tmp_path / call.conf["ledger"])
+    assert len(records) == 1
+    assert set(ledger_fields) <= set(records[0])
+    assert records[0]["input"] == "job.in"
+    assert records[0]["returncode"] == 3
+    assert records[0]["wall_time"] > 0
+
+def test_no_ledger(tmp_path, fake_sfbox, monkeypatch):
+    monkeypatch.setitem(call.conf, "ledger", None)
+    filename = tmp_path / "job.in"
+    synthetic.write_synthetic_input(filename, n_calculations = 1, n_layers = 10)
+    assert call.sfbox_call(filename) == 0
+    assert [f.name for f in tmp_path.glob("*.jsonl")] == []
+
+def test_join_ledger(tmp_path, fake_sfbox):
+    pytest.importorskip("pandas")
+    for i in range(2):
+        synthetic.write_synthetic_input(tmp_path / f"job_{i}.in", n_calculations = 1, n_layers = 10)
+    call.sfbox_calls_subprocess(dir = tmp_path)
+    h5_dir = tmp_path / "h5"
+    h5_dir.mkdir()
+    for i in range(2):
+        store.store_file_sequential(tmp_path / f"job_{i}.out", dir = h5_dir)
+    table = store.join_ledger(store.create_reference_table(h5_dir), tmp_path / call.conf["ledger"])
+    assert sorted(table["input"]) == ["job_0.in", "job_1.in"]
+    assert table["wall_time"].notna().all()
+    assert (table["returncode"] == 0).all()
@@ -0,0 +1,75 @@
+import pathlib
+import time
+
+import pytest
+
+from sfbox_utils import call, synthetic
+from sfbox_utils.monitor import LogMonitor, MonitorRules
+
+FAKE_SFBOX = pathlib.Path(call.__file__).parent / "scripts" / "fake_sfbox.py"
+
+def test_no_abort_before_min_iterations():
+    rules = MonitorRules(min_iterations = 50)
+    assert rules.check([]) is None
+    assert rules.check([(1, 1e-3), (2, 1e3)]) is None
+
+def test_max_iterations():
+    rules = MonitorRules(max_iterations = 10)
+    assert rules.check([(10, 1.0)]) is None
+    assert "exceeds" in rules.check([(11, 1.0)])
+
+def test_divergence():
+    rules = MonitorRules(divergence_factor = 100, min_iterations = 0, stagnation_iterations = None)
+    assert rules.check([(1, 1.0), (2, 1e-3), (3, 1e-2)]) is None
+    assert "diverged" in rules.check([(1, 1.0), (2, 1e-3), (3, -1.0)])
+
+def test_stagnation():
+    rules = MonitorRules(divergence_factor = None, stagnation_iterations = 10, stagnation_ratio = 0.5, min_iterations = 0)
+    improving = [(i, 10.0**(-i)) for i in range(20)]
+    assert rules.check(improving) is None
+    stagnating = [(i, 1.0 - 0.001*i) for i in range(20)]
+    assert "stagnates" in rules.check(stagnating)
+
+def test_log_monitor_reads_appended_lines(tmp_path):
+    log = tmp_path / "job.log"
+    monitor = LogMonitor(log, MonitorRules(max_iterations = 2, min_iterations = 0))
+    #the log is not created yet
+    assert monitor.poll() is None
+    with open(log, "w") as f:
+        f.write("fake_sfbox started 0\ni = 1 |g| = 1.0D-02\ni = 2 |g|")
+    assert monitor.poll() is None
+    assert monitor.history == [(1, 1e-2)]
+    with open(log, "a") as f:
+        f.write(" = 5.0e-03\nITER: 3 residual = 4e-3\n")
+    assert "exceeds" in monitor.poll()
+    assert monitor.history == [(1, 1e-2), (2, 5e-3), (3, 4e-3)]
+
+def test_pool_aborts_job(tmp_path, monkeypatch):
+    monkeypatch.setitem(call.conf, "exe_path", str(FAKE_SFBOX))
+    monkeypatch.setitem(call.conf, "ledger", None)
+    monkeypatch.setitem(call.conf, "poll_interval", 0.01)
+    monkeypatch.setenv("FAKE_SFBOX_ITERATIONS", "100")
+    monkeypatch.setenv("FAKE_SFBOX_SLEEP", "10")
+    synthetic.write_synthetic_input(tmp_path / "job.in", n_calculations = 1, n_layers = 10)
+    begin = time.monotonic()
+    outcomes = call.sfbox_calls_subprocess(
+        dir = tmp_path,
+        monitor = MonitorRules(max_iterations = 3, min_iterations = 0),
+        monitor_interval = 0.05,
+        )
+    assert time.monotonic() - begin < 5
+    assert [o["status"] for o in outcomes] == ["aborted"]
+
+def test_log_monitor_next_calculation(tmp_path):
+    log = tmp_path / "job.log"
+    monitor = LogMonitor(log, MonitorRules(min_iterations = 50))
+    with open(log, "w") as f:
+        #the first calculation converges deep, the second one starts from a large residual
+        for i in range(1, 81):
+            f.write(f"i = {i} |g| = {10.0**(-i/10):e}\n")
+        for i in range(1, 61):
+            f.write(f"i = {i} |g| = {10.0**(1 - i/25):e}\n")
+    assert monitor.poll() is None
+    assert monitor.history[0][0] == 1
+    assert monitor.history[0][1] == pytest.approx(10.0**(1 - 1/25), rel = 1e-5)
+    assert len(monitor.history) == 60
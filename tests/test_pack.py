@@ -0,0 +1,78 @@
+import pathlib
+
+import pytest
+
+from sfbox_utils import call, synthetic
+from sfbox_utils.pack import pack_jobs, sfbox_calls_packed, split_batch_output, write_batch
+from sfbox_utils.read_input import parse_file
+from sfbox_utils.schedule import estimate_cost
+from sfbox_utils.write_input import write_input_file
+
+def make_job(dir, name, n_layers = 10, n_calculations = 1, extra_outputs = ()):
+    filename = dir / f"{name}.in"
+    blocks = []
+    for i in range(n_calculations):
+        fields = synthetic.synthetic_fields(i, n_layers, name = name)
+        for suffix in extra_outputs:
+            fields[f"output:{name}{suffix}:type"] = suffix[1:]
+        blocks.append(fields)
+    write_input_file(filename, blocks)
+    return filename
+
+def test_pack_jobs_threshold(tmp_path):
+    small = [make_job(tmp_path, f"small_{i}") for i in range(6)]
+    large = make_job(tmp_path, "large", n_layers = 1000)
+    max_cost = estimate_cost(small[0])
+    batches = pack_jobs(small + [large], 2, max_cost = max_cost)
+    assert [large] in batches
+    assert sorted(len(b) for b in batches if b != [large]) == [3, 3]
+    assert len(pack_jobs(small + [large], 2)) == 2
+
+def test_write_batch_appends_every_output(tmp_path):
+    jobs = [make_job(tmp_path, f"job_{i}") for i in range(3)]
+    write_batch(jobs, tmp_path / "batch.in")
+    for block in parse_file(tmp_path / "batch.in"):
+        assert block["output:batch.out:append"] is True
+
+def test_split_every_output_type(tmp_path):
+    jobs = [
+        make_job(tmp_path, "job_0", n_calculations = 2, extra_outputs = [".kal"]),
+        make_job(tmp_path, "job_1", extra_outputs = [".kal", ".pro"]),
+        make_job(tmp_path, "job_2", n_calculations = 2, extra_outputs = [".kal", ".pro"]),
+        ]
+    manifest = write_batch(jobs, tmp_path / "batch.in")
+    #5 calculations, the profiles are written from job_1 on
+    (tmp_path / "batch.out").write_text("".join(f"calc {i}\nsystem delimiter\n" for i in range(5)))
+    (tmp_path / "batch.kal").write_text("header\n" + "".join(f"row {i}\n" for i in range(5)))
+    (tmp_path / "batch.pro").write_text("".join(f"x\tphi\n0\t{i}\n1\t{i}\n" for i in range(3)))
+    written = split_batch_output(manifest)
+    assert sorted(p.name for p in written) == sorted([
+        "job_0.out", "job_1.out", "job_2.out", "job_0.kal", "job_1.kal", "job_2.kal", "job_1.pro", "job_2.pro",
+        ])
+    assert (tmp_path / "job_2.out").read_text() == "calc 3\nsystem delimiter\ncalc 4\nsystem delimiter\n"
+    assert (tmp_path / "job_0.kal").read_text() == "header\nrow 0\nrow 1\n"
+    assert (tmp_path / "job_1.pro").read_text() == "x\tphi\n0\t0\n1\t0\n"
+    assert (tmp_path / "job_2.pro").read_text() == "x\tphi\n0\t1\n1\t1\nx\tphi\n0\t2\n1\t2\n"
+
+def test_sfbox_calls_packed(tmp_path, monkeypatch):
+    monkeypatch.setitem(call.conf, "exe_path", str(pathlib.Path(call.__file__).parent / "scripts" / "fake_sfbox.py"))
+    monkeypatch.setitem(call.conf, "ledger", None)
+    monkeypatch.setitem(call.conf, "poll_interval", 0.01)
+    for i in range(5):
+        make_job(tmp_path, f"job_{i}", n_calculations = 2)
+    outcomes = sfbox_calls_packed(dir = tmp_path, n_batches = 2)
+    assert sorted(o["input"] for o in outcomes) == [f"job_{i}.in" for i in range(5)]
+    assert all(o["status"] == "done" for o in outcomes)
+    for i in range(5):
+        assert (tmp_path / f"job_{i}.out").read_text().count("system delimiter") == 2
+
+def test_sfbox_calls_packed_again_with_fewer_batches(tmp_path, monkeypatch):
+    monkeypatch.setitem(call.conf, "exe_path", str(pathlib.Path(call.__file__).parent / "scripts" / "fake_sfbox.py"))
+    monkeypatch.setitem(call.conf, "ledger", None)
+    monkeypatch.setitem(call.conf, "poll_interval", 0.01)
+    for i in range(4):
+        make_job(tmp_path, f"job_{i}")
+    sfbox_calls_packed(dir = tmp_path, n_batches = 4)
+    outcomes = sfbox_calls_packed(dir = tmp_path, n_batches = 2)
+    assert sorted(o["batch"] for o in outcomes) == ["batch_0000.in"]*2 + ["batch_0001.in"]*2
+    assert sorted(f.name for f in (tmp_path / "batches").glob("*.in")) == ["batch_0000.in", "batch_0001.in"]
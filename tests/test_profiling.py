@@ -0,0 +1,55 @@
+from sfbox_utils import profiling, store, synthetic
+
+def test_disabled_stage_is_a_no_op():
+    assert not profiling.enabled()
+    with profiling.stage("parse") as s:
+        s.nbytes = 10
+    assert not s
+    assert list(profiling.timed_iter(range(3), "parse")) == [0, 1, 2]
+
+def test_profile_aggregates_events():
+    with profiling.profile(per_calculation = True) as p:
+        assert profiling.enabled()
+        profiling.set_calculation("a")
+        with profiling.stage("hdf5_write") as s:
+            s.nbytes = 100
+        profiling.record("hdf5_write", 0.5, 50)
+        profiling.record("parse", nbytes = 10, calls = 0)
+        profiling.set_calculation(None)
+        assert list(profiling.timed_iter("xy", "read", label = lambda i: f"row{i}")) == ["x", "y"]
+    assert not profiling.enabled()
+    stats = p.stats()
+    assert stats["hdf5_write"]["calls"] == 2
+    assert stats["hdf5_write"]["bytes"] == 150
+    assert stats["hdf5_write"]["max_seconds"] >= 0.5
+    assert stats["parse"]["calls"] == 0
+    assert stats["read"]["calls"] == 2
+    assert set(p.calculations) == {"a", "row0", "row1"}
+    report = p.report()
+    assert report.splitlines()[1].startswith("hdf5_write")
+
+def test_call_recorded_and_replay():
+    def work():
+        profiling.record("worker", 1.0, 5)
+        return 42
+    result, events = profiling.call_recorded(work)
+    assert result == 42
+    assert [e[0] for e in events] == ["worker"]
+    with profiling.profile() as p:
+        profiling.replay(events)
+    assert p.stats()["worker"] == dict(calls = 1, seconds = 1.0, bytes = 5, max_seconds = 1.0)
+
+def test_profile_store(tmp_path):
+    output = tmp_path / "synthetic.out"
+    synthetic.write_synthetic_output(output, 3, n_layers = 10)
+    for name, function in [("sequential", store.store_file_sequential), ("parallel", store.store_file_parallel)]:
+        dir = tmp_path / name
+        dir.mkdir()
+        with profiling.profile(per_calculation = True) as p:
+            function(output, dir = dir)
+        stats = p.stats()
+        assert stats["parse"]["calls"] == 3, name
+        #the split pieces do not include the delimiter lines
+        assert 0 < stats["parse"]["bytes"] <= output.stat().st_size, name
+        assert stats["hdf5_write"]["calls"] == 3, name
+        assert stats["hdf5_write"]["bytes"] > 0, name
@@ -0,0 +1,61 @@
+import pytest
+
+from sfbox_utils import synthetic
+from sfbox_utils.read_input import output_files, parse_file_resolved
+from sfbox_utils.write_input import write_input_file
+
+def test_output_files_declared(tmp_path):
+    filename = tmp_path / "job.in"
+    fields = synthetic.synthetic_fields(name = "result")
+    fields["output:result.pro:type"] = "pro"
+    write_input_file(filename, [fields])
+    assert output_files(filename) == [tmp_path / "result.out"]
+    assert output_files(filename, None) == [tmp_path / "result.out", tmp_path / "result.pro"]
+
+def test_output_files_default(tmp_path):
+    filename = tmp_path / "job.in"
+    fields = synthetic.synthetic_fields()
+    fields = {k : v for k, v in fields.items() if not k.startswith("output:")}
+    write_input_file(filename, [fields])
+    assert output_files(filename) == [tmp_path / "job.out"]
+    assert output_files(filename, ["pro"]) == []
+
+def test_resolved_input(tmp_path):
+    filename = tmp_path / "sweep.in"
+    write_input_file(filename, [
+        {"lat:1G:n_layers" : 10, "mol:pol:theta" : 1},
+        {"mol:pol:theta" : 2},
+        {"mon:W:chi_S" : 0.5},
+        {"lat:1G:n_layers" : 20},
+        {},
+        ])
+    resolved = parse_file_resolved(filename)
+    assert len(resolved) == 5
+    assert dict(resolved[2]) == {"lat:1G:n_layers" : 10, "mol:pol:theta" : 2, "mon:W:chi_S" : 0.5}
+    assert dict(resolved[-1]) == {"lat:1G:n_layers" : 20, "mol:pol:theta" : 2, "mon:W:chi_S" : 0.5}
+    assert [r["lat:1G:n_layers"] for r in resolved[1:4]] == [10, 10, 20]
+    assert resolved.changed(3) == {"lat:1G:n_layers" : 20}
+    #only the changes are indexed, nothing is copied per calculation
+    assert resolved.changes == {"lat:1G:n_layers" : [0, 3], "mol:pol:theta" : [0, 1], "mon:W:chi_S" : [2]}
+    assert len(resolved[1]) == 2
+    assert resolved.keys() == ["lat:1G:n_layers", "mol:pol:theta", "mon:W:chi_S"]
+    with pytest.raises(IndexError):
+        resolved[5]
+
+def test_resolved_input_writes_are_not_shared(tmp_path):
+    filename = tmp_path / "sweep.in"
+    write_input_file(filename, [{"mol:pol:theta" : 1}, {"mol:pol:theta" : 2}])
+    resolved = parse_file_resolved(filename)
+    resolved[1]["mol:pol:theta"] = 3
+    assert resolved[1]["mol:pol:theta"] == 2
+    assert resolved[0]["mol:pol:theta"] == 1
+
+def test_resolved_input_columns(tmp_path):
+    filename = tmp_path / "sweep.in"
+    write_input_file(filename, [{"mol:pol:theta" : 1}, {"mon:W:chi_S" : 0.5}, {"mol:pol:theta" : 2}])
+    resolved = parse_file_resolved(filename)
+    assert resolved.columns() == {"mol:pol:theta" : [1, 1, 2], "mon:W:chi_S" : [None, 0.5, 0.5]}
+    pd = pytest.importorskip("pandas")
+    df = resolved.to_dataframe(["mon:W:chi_S", "sys:noname:overflow_protection"])
+    assert list(df.columns) == ["mon:W:chi_S", "sys:noname:overflow_protection"]
+    assert df["sys:noname:overflow_protection"].isna().all()
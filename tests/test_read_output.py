@@ -0,0 +1,46 @@
+import numpy as np
+
+from sfbox_utils import read_output, synthetic
+from sfbox_utils.read_output import _ColumnBuffer
+
+def column(values):
+    buffer = _ColumnBuffer()
+    for row, value in enumerate(values):
+        buffer.append(row, value)
+    return buffer.finish(len(values))
+
+def test_column_buffer_dtypes():
+    assert column([1, 2, 3]).dtype == np.int64
+    assert column([1.5, 2.5]).dtype == float
+    assert column([1, 2.5, 3]).dtype == float
+    np.testing.assert_array_equal(column([1.5, 0, 1]), [1.5, 0.0, 1.0])
+    assert column(["a", 1]).dtype == object
+    assert column([True, False]).dtype == bool
+
+def test_column_buffer_missing_rows():
+    buffer = _ColumnBuffer()
+    buffer.append(0, 1)
+    buffer.append(2, 3)
+    data = buffer.finish(4)
+    assert data.dtype == float
+    np.testing.assert_array_equal(np.isnan(data), [False, True, False, True])
+
+def test_column_buffer_int_into_float_does_not_copy():
+    buffer = _ColumnBuffer()
+    buffer.append(0, 0.5)
+    data = buffer.data
+    for row in range(1, 10):
+        buffer.append(row, row % 2)
+    assert buffer.data is data
+    assert buffer.finish(10).dtype == float
+
+def test_parse_to_columns_roundtrip(tmp_path):
+    output = tmp_path / "synthetic.out"
+    synthetic.write_synthetic_output(output, n_calculations = 4, n_layers = 10)
+    calculations = list(read_output.parse_file(output))
+    columns, profiles = read_output.parse_to_columns(output)
+    assert len(columns["sys:noname:calculation"]) == len(calculations)
+    np.testing.assert_allclose(
+        columns["sys:noname:free energy"],
+        [c["sys:noname:free energy"] for c in calculations],
+        )
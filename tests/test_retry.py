@@ -0,0 +1,46 @@
+import numpy as np
+
+from sfbox_utils import synthetic
+from sfbox_utils.read_input import parse_file
+from sfbox_utils.retry import neighbour_guess, relax_newton, rewrite_for_retry
+from sfbox_utils.utils import write_initial_guess
+from sfbox_utils.write_input import write_input_file
+
+def make_converged(dir, name, index, n_layers):
+    filename = dir / f"{name}.in"
+    write_input_file(filename, [synthetic.synthetic_fields(index, n_layers, name = name)])
+    guess = synthetic.synthetic_initial_guess(n_layers, seed = index)
+    write_initial_guess(dir / f"{name}.ig", guess)
+    return filename, guess
+
+def test_neighbour_guess_matches_the_lattice(tmp_path):
+    near, near_guess = make_converged(tmp_path, "near", 1, 20)
+    far, far_guess = make_converged(tmp_path, "far", 9, 10)
+    target = tmp_path / "target.in"
+    write_input_file(target, [synthetic.synthetic_fields(0, 10, name = "target")])
+    guess = neighbour_guess(target, [near, far])
+    assert guess is not None
+    assert tuple(guess["gradients"]) == (1, 12, 1)
+    np.testing.assert_allclose(np.ravel(guess["state"]["S"]), far_guess["state"]["S"])
+
+def test_neighbour_guess_closest_point(tmp_path):
+    near, near_guess = make_converged(tmp_path, "near", 1, 10)
+    far, far_guess = make_converged(tmp_path, "far", 9, 10)
+    target = tmp_path / "target.in"
+    write_input_file(target, [synthetic.synthetic_fields(0, 10, name = "target")])
+    guess = neighbour_guess(target, [far, near])
+    np.testing.assert_allclose(np.ravel(guess["state"]["S"]), near_guess["state"]["S"])
+
+def test_neighbour_guess_no_lattice_match(tmp_path):
+    near, _ = make_converged(tmp_path, "near", 1, 20)
+    target = tmp_path / "target.in"
+    write_input_file(target, [synthetic.synthetic_fields(0, 10, name = "target")])
+    assert neighbour_guess(target, [near]) is None
+
+def test_rewrite_for_retry(tmp_path):
+    filename, guess = make_converged(tmp_path, "job", 0, 10)
+    rewrite_for_retry(filename, 1, relax_newton, guess)
+    assert (tmp_path / "job.in.orig").is_file()
+    block = parse_file(filename)[0]
+    assert block["newton:isaac:tolerance"] == 1e-6
+    assert block["newton:isaac:initial_guess_input_file"] == "job.retry.ig"
@@ -0,0 +1,58 @@
+import pytest
+
+from sfbox_utils import call, synthetic
+from sfbox_utils.schedule import RuntimeHistory, composition_length, estimate_cost, order_longest_first
+from sfbox_utils.write_input import write_input_file
+
+@pytest.mark.parametrize("composition, n", [
+    ("(pae)1(pa)98(pao)1", 100),
+    ("((A)1(B)2)10", 30),
+    ("S", 0),
+    ("(S)1", 1),
+    ])
+def test_composition_length(composition, n):
+    assert composition_length(composition) == n
+
+def test_composition_length_unbalanced():
+    with pytest.raises(ValueError):
+        composition_length("(A)1)2")
+
+def make_job(dir, name, n_layers):
+    filename = dir / f"{name}.in"
+    write_input_file(filename, [synthetic.synthetic_fields(0, n_layers, name = name)])
+    return filename
+
+def test_estimate_cost_scales_with_the_lattice(tmp_path):
+    assert estimate_cost(make_job(tmp_path, "large", 200)) == 2*estimate_cost(make_job(tmp_path, "small", 100))
+
+def test_runtime_history_fit_and_persistence(tmp_path):
+    history = RuntimeHistory(tmp_path / "history.jsonl")
+    for cost in [1e2, 1e3, 1e4]:
+        history.record(f"job_{cost:g}", cost, 1e-3*cost**1.5)
+    a, b = history.fit()
+    assert b == pytest.approx(1.5)
+    assert history.predict("new", 1e5) == pytest.approx(1e-3*1e5**1.5)
+    reloaded = RuntimeHistory(tmp_path / "history.jsonl")
+    assert reloaded.predict("job_100", 0) == pytest.approx(1e-3*100**1.5)
+
+def test_order_longest_first(tmp_path):
+    files = [make_job(tmp_path, f"job_{n}", n) for n in [50, 200, 100]]
+    broken = tmp_path / "broken.in"
+    broken.write_text("lat : flat : n_layers : many\nstart\n")
+    order = order_longest_first(files + [broken])
+    assert [f.name for f in order] == ["broken.in", "job_200.in", "job_100.in", "job_50.in"]
+
+def test_sh_pool_with_schedule(tmp_path, monkeypatch):
+    monkeypatch.setitem(call.conf, "exe_path", str(call.pathlib.Path(call.__file__).parent / "scripts" / "fake_sfbox.py"))
+    monkeypatch.setitem(call.conf, "cpu_count", 1)
+    for n in [20, 40]:
+        make_job(tmp_path, f"job_{n}", n)
+    call.sfbox_calls_sh(dir = tmp_path, schedule = "longest_first")
+    started = {}
+    for n in [20, 40]:
+        lines = (tmp_path / f"job_{n}.log").read_text().splitlines()
+        assert lines[-1].startswith("fake_sfbox finished")
+        started[n] = float(lines[0].split()[-1])
+    assert started[40] < started[20]
+    #the queue is not left in the input directory
+    assert sorted(f.suffix for f in tmp_path.iterdir()) == [".in", ".in", ".log", ".log", ".out", ".out"]
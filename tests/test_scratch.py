@@ -0,0 +1,63 @@
+import gzip
+import pathlib
+
+import pytest
+
+from sfbox_utils import call, read_output, synthetic
+from sfbox_utils.scratch import ScratchDir
+from sfbox_utils.utils import write_initial_guess
+from sfbox_utils.write_input import write_input_file
+
+FAKE_SFBOX = pathlib.Path(call.__file__).parent / "scripts" / "fake_sfbox.py"
+
+def write_job(dir):
+    dir.mkdir(exist_ok = True)
+    fields = synthetic.synthetic_fields(n_layers = 10, name = "job")
+    fields["newton:isaac:initial_guess"] = "file"
+    fields["newton:isaac:initial_guess_input_file"] = "start.ig"
+    write_input_file(dir / "job.in", [fields])
+    write_initial_guess(dir / "start.ig", synthetic.synthetic_initial_guess(n_layers = 10))
+    return dir / "job.in"
+
+def test_stage_in_and_out(tmp_path):
+    filename = write_job(tmp_path / "jobs")
+    with ScratchDir(filename, tmp_path / "scratch") as scratch:
+        assert scratch.input.parent.parent == tmp_path / "scratch"
+        assert sorted(f.name for f in scratch.dir.iterdir()) == ["job.in", "start.ig"]
+        (scratch.dir / "job.out").write_text("created\n")
+        scratch_dir = scratch.dir
+    assert not scratch_dir.exists()
+    assert (tmp_path / "jobs" / "job.out").read_text() == "created\n"
+    #the staged inputs are not copied back
+    assert sorted(f.name for f in (tmp_path / "jobs").iterdir()) == ["job.in", "job.out", "start.ig"]
+
+def test_stage_out_compressed(tmp_path):
+    filename = write_job(tmp_path)
+    with ScratchDir(filename, tmp_path / "scratch", compress = True) as scratch:
+        (scratch.dir / "job.out").write_text("created\n")
+        (scratch.dir / "job.ig").write_text("guess\n")
+    with gzip.open(tmp_path / "job.out.gz", "rt") as f:
+        assert f.read() == "created\n"
+    assert not (tmp_path / "job.out").exists()
+    #initial guesses are read by the next runs as they are
+    assert (tmp_path / "job.ig").read_text() == "guess\n"
+
+def test_cleanup_after_error(tmp_path):
+    filename = write_job(tmp_path)
+    with pytest.raises(RuntimeError):
+        with ScratchDir(filename, tmp_path / "scratch") as scratch:
+            (scratch.dir / "job.log").write_text("partial\n")
+            raise RuntimeError
+    assert (tmp_path / "job.log").read_text() == "partial\n"
+    assert list((tmp_path / "scratch").iterdir()) == []
+
+def test_sfbox_call_in_scratch(tmp_path, monkeypatch):
+    monkeypatch.setitem(call.conf, "exe_path", str(FAKE_SFBOX))
+    monkeypatch.setitem(call.conf, "ledger", None)
+    monkeypatch.setitem(call.conf, "scratch_dir", tmp_path / "scratch")
+    monkeypatch.setitem(call.conf, "scratch_compress", True)
+    filename = write_job(tmp_path / "jobs")
+    assert call.sfbox_call(filename) == 0
+    calculations = list(read_output.parse_file(tmp_path / "jobs" / "job.out.gz"))
+    assert len(calculations) == 1
+    assert list((tmp_path / "scratch").iterdir()) == []
@@ -0,0 +1,76 @@
+import h5py
+import numpy as np
+import pytest
+
+from sfbox_utils import read_output, store, synthetic
+from sfbox_utils.utils import read_initial_guess_file, write_initial_guess
+
+N_CALCULATIONS = 3
+
+@pytest.fixture
+def output_with_guess(tmp_path):
+    output = tmp_path / "synthetic.out"
+    synthetic.write_synthetic_output(output, N_CALCULATIONS, n_layers = 10)
+    guess = synthetic.synthetic_initial_guess(n_layers = 10)
+    write_initial_guess(tmp_path / "synthetic.ig", guess)
+    return output, guess
+
+def stored_guesses(dir):
+    guesses = []
+    for h5 in sorted(dir.glob("*.h5")):
+        with h5py.File(h5, "r") as f:
+            if "initial_guess" in f:
+                guesses.append(store.load_initial_guess(f))
+    return guesses
+
+@pytest.mark.parametrize("mode", ["sequential", "parallel"])
+def test_store_guess_roundtrip(tmp_path, output_with_guess, mode):
+    output, guess = output_with_guess
+    dir = tmp_path / "h5"
+    dir.mkdir()
+    if mode == "sequential":
+        store.store_file_sequential(output, dir = dir, store_guess = True)
+    else:
+        store.store_file_parallel(output, dir = dir, n_jobs = 2, store_guess = True)
+    assert len(list(dir.glob("*.h5"))) == N_CALCULATIONS
+    guesses = stored_guesses(dir)
+    assert len(guesses) == 1
+    for molecule, values in guess["state"].items():
+        np.testing.assert_allclose(np.ravel(guesses[0]["state"][molecule]), values)
+    assert not (tmp_path / "synthetic_tmp").exists()
+
+def test_store_file_parallel_guess_dir(tmp_path, output_with_guess):
+    output, guess = output_with_guess
+    guess_dir = tmp_path / "guesses"
+    guess_dir.mkdir()
+    (tmp_path / "synthetic.ig").rename(guess_dir / "synthetic.ig")
+    dir = tmp_path / "h5"
+    dir.mkdir()
+    store.store_file_parallel(output, dir = dir, n_jobs = 2, store_guess = True, guess_dir = guess_dir)
+    assert len(stored_guesses(dir)) == 1
+
+def test_initial_guess_file_roundtrip(tmp_path):
+    guess = synthetic.synthetic_initial_guess(n_layers = 12, gradients = 2)
+    write_initial_guess(tmp_path / "guess.ig", guess)
+    read = read_initial_guess_file(tmp_path / "guess.ig")
+    assert tuple(read["gradients"]) == tuple(guess["gradients"])
+    for molecule, values in guess["state"].items():
+        np.testing.assert_allclose(np.ravel(read["state"][molecule]), values)
+
+def test_store_file_parallel_guess_goes_to_the_last_piece(tmp_path, monkeypatch):
+    #more than 1000 pieces, the numbers outgrow the 3 digit format
+    output = tmp_path / "synthetic.out"
+    synthetic.write_synthetic_output(output, 1002, n_layers = 1, n_vectors = 0)
+    stored = {}
+    def store_files_parallel(files, **kwargs):
+        stored["parallel"] = [read_output_calculation(f) for f in files]
+    def store_file_sequential(file, **kwargs):
+        stored["guess"] = read_output_calculation(file)
+    monkeypatch.setattr(store, "store_files_parallel", store_files_parallel)
+    monkeypatch.setattr(store, "store_file_sequential", store_file_sequential)
+    store.store_file_parallel(output, dir = tmp_path, store_guess = True)
+    assert stored["parallel"] == list(range(1001))
+    assert stored["guess"] == 1001
+
+def read_output_calculation(file):
+    return next(read_output.parse_file(file))["sys:noname:calculation"]
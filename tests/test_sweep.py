@@ -0,0 +1,112 @@
+import json
+
+import pytest
+
+from sfbox_utils import call, read_input, sweep, synthetic
+from sfbox_utils.guess import resampling_guess_routine
+from sfbox_utils.scratch import ScratchDir
+from sfbox_utils.sweep import (
+    continuation_sweep, iter_sweep, locate_in_sweep, run_chain, split_path,
+    sweep_point, sweep_size, write_sweep,
+    )
+from sfbox_utils.utils import read_initial_guess_file, write_initial_guess
+
+DL = {
+    "lat:flat:n_layers" : 50,
+    "mon:A:chi_S" : [0.0, 0.5, 1.0],
+    "mol:P:theta" : [1.0, 2.0],
+    "mol:P:composition" : ["(A)10", "(A)20"],
+    }
+
+def test_sweep_point_matches_iter_sweep():
+    points = list(iter_sweep(DL))
+    assert len(points) == sweep_size(DL) == 12
+    assert [sweep_point(DL, i) for i in range(len(points))] == points
+    assert list(iter_sweep(DL, [3, 7])) == [points[3], points[7]]
+
+@pytest.mark.parametrize("layout", ["contiguous", "interleaved"])
+@pytest.mark.parametrize("n_files", [1, 3, 5, 20])
+@pytest.mark.parametrize("delta", [True, False])
+def test_write_sweep_shards_cover_the_sweep(tmp_path, layout, n_files, delta):
+    points = list(iter_sweep(DL))
+    index = write_sweep(tmp_path / "sweep", DL, n_files, layout = layout, delta = delta)
+    assert json.loads((tmp_path / "sweep_index.json").read_text()) == index
+    assert sum(index["counts"]) == len(points)
+    written = {
+        name : list(read_input.parse_file_resolved(tmp_path / name))
+        for name in index["files"]
+        }
+    assert sorted(len(blocks) for blocks in written.values()) == sorted(index["counts"])
+    for point in points:
+        name, block = locate_in_sweep(index, point)
+        assert dict(written[name][block]) == point
+
+def test_split_path():
+    assert split_path(list(range(7)), 3) == [[0, 1, 2], [3, 4], [5, 6]]
+    assert split_path([0, 1], 4) == [[0], [1]]
+
+@pytest.fixture
+def fake_run(monkeypatch):
+    # writes the guess the input asks for, thetas in failing do not converge,
+    # the jobs are staged to conf['scratch_dir'] as sfbox_call does
+    failing = set()
+    calls = []
+    def run(filename):
+        fields = read_input.parse_file(filename)[0]
+        calls.append(fields)
+        if fields["mol:P:theta"] in failing:
+            return 1
+        guess = synthetic.synthetic_initial_guess(n_layers = fields["lat:flat:n_layers"], n_molecules = 1)
+        guess["phibulk solvent"] = fields["mol:P:theta"]
+        write_initial_guess(filename.parent / fields["newton:isaac:initial_guess_output_file"], guess)
+        return 0
+    def fake_sfbox_call(filename, cpus = None):
+        if call.conf["scratch_dir"] is None:
+            return run(filename)
+        with ScratchDir(filename, call.conf["scratch_dir"], call.conf["scratch_compress"]) as scratch:
+            return run(scratch.input)
+    monkeypatch.setattr(sweep, "sfbox_call", fake_sfbox_call)
+    return failing, calls
+
+def test_continuation_sweep_warm_starts(tmp_path, fake_run):
+    failing, calls = fake_run
+    failing.add(3.0)
+    base = synthetic.synthetic_fields(n_layers = 10)
+    base = {k : v for k, v in base.items() if not k.startswith(("mol:P", "mon:M"))}
+    path = [{"mol:P:theta" : float(theta), "lat:flat:n_layers" : 10} for theta in range(1, 7)]
+    results = continuation_sweep(base, path, n_chains = 2, dir = tmp_path)
+    assert [r["index"] for r in results] == list(range(6))
+    assert [r["warm_start"] for r in results] == [False, True, True, False, True, True]
+    assert [r["returncode"] for r in results] == [0, 0, 1, 0, 0, 0]
+    #the point after a failed one starts from the last converged point
+    guess = read_initial_guess_file(tmp_path / "sweep_00002_in.ig")
+    assert guess["phibulk solvent"] == 2.0
+    fields = read_input.parse_file(tmp_path / "sweep_00001.in")[0]
+    assert fields["newton:isaac:initial_guess_input_file"] == "sweep_00001_in.ig"
+    assert fields["output:sweep_00001.out:type"] == "ana"
+    assert not any(k.startswith("output:synthetic") for k in fields)
+
+def test_run_chain_resamples_the_guess(tmp_path, fake_run):
+    base = {"newton:isaac:method" : "pseudohessian", "mol:P:theta" : 1.0}
+    chain = [{"lat:flat:n_layers" : 10}, {"lat:flat:n_layers" : 20}]
+    run_chain(base, chain, tmp_path, guess_routine = resampling_guess_routine())
+    guess = read_initial_guess_file(tmp_path / "sweep_00001_in.ig")
+    assert tuple(guess["gradients"]) == (1, 22, 1)
+
+def test_run_chain_in_compressed_scratch(tmp_path, fake_run, monkeypatch):
+    monkeypatch.setitem(call.conf, "scratch_dir", tmp_path / "scratch")
+    monkeypatch.setitem(call.conf, "scratch_compress", True)
+    base = {"newton:isaac:method" : "pseudohessian", "lat:flat:n_layers" : 10}
+    chain = [{"mol:P:theta" : 1.0}, {"mol:P:theta" : 2.0}]
+    results = run_chain(base, chain, tmp_path)
+    assert [r["warm_start"] for r in results] == [False, True]
+    assert read_initial_guess_file(tmp_path / "sweep_00001_in.ig")["phibulk solvent"] == 1.0
+
+def test_run_chain_warns_about_a_missing_guess(tmp_path, monkeypatch, caplog):
+    #converges without writing the guess
+    monkeypatch.setattr(sweep, "sfbox_call", lambda filename, cpus = None: 0)
+    base = {"newton:isaac:method" : "pseudohessian", "lat:flat:n_layers" : 10}
+    chain = [{"mol:P:theta" : 1.0}, {"mol:P:theta" : 2.0}]
+    results = run_chain(base, chain, tmp_path)
+    assert [r["warm_start"] for r in results] == [False, False]
+    assert "did not write sweep_00000.ig" in caplog.text
@@ -0,0 +1,44 @@
+import numpy as np
+
+from sfbox_utils import read_output, synthetic
+from sfbox_utils.read_input import parse_file
+from sfbox_utils.utils import read_initial_guess_file, write_initial_guess
+
+def test_output_parses(tmp_path):
+    output = tmp_path / "synthetic.out"
+    nbytes = synthetic.write_synthetic_output(output, 4, n_layers = 10, gradients = 2, n_vectors = 3)
+    assert nbytes == output.stat().st_size
+    calculations = list(read_output.parse_file(output))
+    assert len(calculations) == 4
+    assert [c["sys:noname:calculation"] for c in calculations] == [0, 1, 2, 3]
+    assert calculations[0]["sys:noname:inputfile"] == "synthetic.in"
+    profiles = [k for k, v in calculations[0].items() if isinstance(v, np.ndarray)]
+    assert len(profiles) == 3
+    assert all(calculations[0][k].shape == (12*12,) for k in profiles)
+
+def test_output_is_reproducible(tmp_path):
+    for seed in ["1", "1_again", "2"]:
+        (tmp_path / seed).mkdir()
+        synthetic.write_synthetic_output(tmp_path / seed / "job.out", 2, n_layers = 10, seed = int(seed[0]))
+    text = {seed : (tmp_path / seed / "job.out").read_text() for seed in ["1", "1_again", "2"]}
+    assert text["1"] == text["1_again"]
+    assert text["1"] != text["2"]
+
+def test_input(tmp_path):
+    filename = tmp_path / "sweep.in"
+    full = synthetic.write_synthetic_input(filename, 5, n_layers = 10)
+    blocks = parse_file(filename)
+    assert len(blocks) == 5
+    assert blocks[0]["output:sweep.out:type"] == "ana"
+    assert [b["mol:P0:theta"] for b in blocks] == [1.0, 1.1, 1.2, 1.3, 1.4]
+    assert synthetic.write_synthetic_input(tmp_path / "delta.in", 5, n_layers = 10, delta = True) < full
+
+def test_initial_guess_roundtrip(tmp_path):
+    guess = synthetic.synthetic_initial_guess(n_layers = 10, gradients = 2, n_molecules = 1)
+    assert guess["gradients"] == (2, 12, 12)
+    assert sorted(guess["state"]) == ["M0", "S"]
+    write_initial_guess(tmp_path / "guess.ig", guess)
+    read = read_initial_guess_file(tmp_path / "guess.ig")
+    assert tuple(read["gradients"]) == guess["gradients"]
+    for name, values in guess["state"].items():
+        assert np.allclose(read["state"][name], values)
@@ -0,0 +1,60 @@
+import pathlib
+
+from sfbox_utils import call, synthetic
+from sfbox_utils.telemetry import PoolTelemetry
+
+FAKE_SFBOX = pathlib.Path(call.__file__).parent / "scripts" / "fake_sfbox.py"
+
+def test_counters():
+    telemetry = PoolTelemetry(progress_bar = False)
+    telemetry.begin(4, 2)
+    telemetry.started("a.in")
+    telemetry.started("b.in")
+    telemetry.finished("a.in", "done")
+    telemetry.finished("c.in", "cached")
+    telemetry.finished("b.in", "timeout")
+    telemetry.requeued("b.in")
+    snapshot = telemetry.snapshot()
+    assert snapshot["queue_depth"] == 2
+    assert snapshot["running"] == 0
+    assert snapshot["completed"] == 3
+    assert snapshot["failed"] == 1
+    assert snapshot["counts"] == {"done" : 1, "cached" : 1, "timeout" : 1}
+    assert snapshot["completions_per_minute"] > 0
+    assert snapshot["eta"] > 0
+    assert 0 <= snapshot["core_utilization"] <= 1
+
+def test_prometheus_file(tmp_path):
+    telemetry = PoolTelemetry(prometheus_file = tmp_path / "sfbox.prom", interval = 3600, progress_bar = False)
+    telemetry.begin(1, 1)
+    telemetry.tick()
+    text = (tmp_path / "sfbox.prom").read_text()
+    assert "sfbox_queue_depth 1\n" in text
+    #no completions yet, no ETA
+    assert "sfbox_eta_seconds" not in text
+    telemetry.started("a.in")
+    telemetry.finished("a.in", "done")
+    #the interval has not passed
+    telemetry.tick()
+    assert (tmp_path / "sfbox.prom").read_text() == text
+    telemetry.close()
+    text = (tmp_path / "sfbox.prom").read_text()
+    assert 'sfbox_jobs_finished_total{status="done"} 1\n' in text
+    assert "# TYPE sfbox_jobs_finished_total counter" in text
+    assert not (tmp_path / "sfbox.prom.tmp").exists()
+
+def test_pool_telemetry(tmp_path, monkeypatch):
+    monkeypatch.setitem(call.conf, "exe_path", str(FAKE_SFBOX))
+    monkeypatch.setitem(call.conf, "ledger", None)
+    monkeypatch.setitem(call.conf, "poll_interval", 0.01)
+    monkeypatch.setitem(call.conf, "cpu_count", 2)
+    for i in range(3):
+        synthetic.write_synthetic_input(tmp_path / f"job_{i}.in", n_calculations = 1, n_layers = 10)
+    telemetry = PoolTelemetry(prometheus_file = tmp_path / "sfbox.prom", progress_bar = False)
+    call.sfbox_calls_subprocess(dir = tmp_path, telemetry = telemetry)
+    snapshot = telemetry.snapshot()
+    assert snapshot["counts"] == {"done" : 3}
+    assert snapshot["queue_depth"] == 0
+    assert snapshot["running"] == 0
+    assert snapshot["core_utilization"] > 0
+    assert "sfbox_queue_depth 0\n" in (tmp_path / "sfbox.prom").read_text()
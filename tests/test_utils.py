@@ -0,0 +1,12 @@
+from sfbox_utils.utils import ld_to_dl, newton_names
+
+def test_newton_names():
+    fields = {"newton:a:tolerance" : 1e-7, "newton:b:method" : "x", "newton:a:deltamax" : 0.1, "lat:l:n_layers" : 10}
+    assert newton_names(fields) == ["a", "b"]
+    assert newton_names(fields, "isaac") == ["a", "b"]
+    assert newton_names({"lat:l:n_layers" : 10}) == []
+    assert newton_names({"lat:l:n_layers" : 10}, "isaac") == ["isaac"]
+
+def test_ld_to_dl():
+    assert ld_to_dl([{"a" : 1, "b" : 2}, {"a" : 3}]) == {"a" : [1, 3], "b" : 2}
+    assert ld_to_dl([{"a" : 1}, {"a" : 3}], keep_dim = False) == {"a" : [1, 3]}
@@ -0,0 +1,37 @@
+from sfbox_utils import synthetic
+from sfbox_utils.read_input import parse_file, parse_file_resolved
+from sfbox_utils.write_input import format_statements, write_input_file
+
+def test_format_statements():
+    assert format_statements("mon:W:freedom", "free") == "mon:W:freedom:free\n"
+    assert format_statements("sys:noname:overflow_protection", True) == "sys:noname:overflow_protection:true\n"
+    assert format_statements("mol:pol:theta", [1, 2]) == "mol:pol:theta:1\nmol:pol:theta:2\n"
+
+def test_delta_writes_changes_only(tmp_path):
+    data = [
+        {"lat:1G:n_layers" : 100, "mol:pol:theta" : 1.0, "mon:W:freedom" : "free"},
+        {"lat:1G:n_layers" : 100, "mol:pol:theta" : 2.0, "mon:W:freedom" : "free"},
+        {"lat:1G:n_layers" : 100, "mol:pol:theta" : 2.0, "mon:W:freedom" : "free"},
+        ]
+    write_input_file(tmp_path / "delta.in", data, delta = True)
+    assert (tmp_path / "delta.in").read_text() == (
+        "lat:1G:n_layers:100\nmol:pol:theta:1.0\nmon:W:freedom:free\nstart\n"
+        "mol:pol:theta:2.0\nstart\n"
+        "start\n"
+        )
+
+def test_delta_resolves_to_full(tmp_path):
+    data = [synthetic.synthetic_fields(i % 3, n_layers = 10) for i in range(7)]
+    write_input_file(tmp_path / "full.in", data)
+    write_input_file(tmp_path / "delta.in", data, delta = True)
+    assert (tmp_path / "delta.in").stat().st_size < (tmp_path / "full.in").stat().st_size
+    full = parse_file(tmp_path / "full.in")
+    resolved = parse_file_resolved(tmp_path / "delta.in")
+    assert [dict(r) for r in resolved] == full
+
+def test_chunk_size_does_not_change_the_file(tmp_path):
+    data = [synthetic.synthetic_fields(i, n_layers = 10) for i in range(5)]
+    write_input_file(tmp_path / "one.in", data, chunk_size = 1)
+    write_input_file(tmp_path / "all.in", iter(data))
+    assert (tmp_path / "one.in").read_text() == (tmp_path / "all.in").read_text()
+    assert len(parse_file(tmp_path / "one.in")) == 5